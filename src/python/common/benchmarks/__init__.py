@@ -0,0 +1,63 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Micro-benchmarks for the enrichment package.
+Run them from the common directory, e.g. python -m benchmarks.timeline_index
+"""
+import os
+import timeit
+
+VI_INSIGHTS_SAMPLE = os.path.join(os.path.dirname(__file__), '..', '..', 'functions', 'func_dataproc', 'tests', 'vi_insights.json')
+
+
+def best_of(func, repeat: int = 5, number: int = 1) -> float:
+    """Returns the best wall time in seconds of `number` calls to func over `repeat` runs."""
+    return min(timeit.repeat(func, repeat=repeat, number=number)) / number
+
+
+def report(name: str, seconds: float, baseline: float = None):
+    """Prints a single benchmark result, with the speedup over the baseline if any."""
+    line = f"{name:<45} {seconds * 1000:>10.3f} ms"
+    if baseline is not None and seconds > 0:
+        line += f"  x{baseline / seconds:.1f}"
+    print(line)
+
+
+def seconds_to_vi_time(seconds: float) -> str:
+    """Formats seconds the way Video Indexer does, H:MM:SS.fff"""
+    minutes, secs = divmod(round(seconds, 3), 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours}:{minutes:02d}:{secs:06.3f}"
+
+
+def synthetic_vi_insights(duration: int = 7200, shots: int = 1500, items_per_key: int = 300,
+                          instances_per_item: int = 5, max_span: int = 600, seed: int = 0) -> dict:
+    """
+    Generates a large Video Indexer insights document: `shots` equal shots over `duration` seconds
+    and, for every splittable key, items with random instances lasting up to `max_span` seconds.
+    """
+    import random
+    rng = random.Random(seed)
+    shot_length = duration / shots
+    insights = {
+        "version": "1.0.0.0",
+        "languages": ["en-US"],
+        "shots": [{"id": i, "instances": [{"start": seconds_to_vi_time(i * shot_length),
+                                           "end": seconds_to_vi_time((i + 1) * shot_length)}]}
+                  for i in range(shots)],
+    }
+    for key in ("transcript", "ocr", "keywords", "topics", "labels", "faces", "namedPeople"):
+        items = []
+        for item_id in range(items_per_key):
+            instances = []
+            for _ in range(instances_per_item):
+                start = rng.uniform(0, duration - 1)
+                end = min(duration, start + rng.uniform(0, max_span))
+                instances.append({"start": seconds_to_vi_time(start), "end": seconds_to_vi_time(end)})
+            items.append({"id": item_id, "name": f"{key} {item_id}", "instances": instances})
+        insights[key] = items
+    insights["scenes"] = insights["shots"][::10]
+    return {"id": "synthetic", "name": "synthetic.mp4", "durationInSeconds": duration,
+            "summarizedInsights": {"name": "synthetic.mp4", "id": "synthetic"},
+            "videos": [{"id": "synthetic", "insights": insights}], "videosRanges": []}
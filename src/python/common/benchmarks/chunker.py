@@ -0,0 +1,33 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Compares the TextWrapper previously used to split the NER input against TextChunker on a long transcript.
+"""
+import random
+import sys
+from textwrap import TextWrapper
+from benchmarks import best_of, report
+from enrichment.entity_extractor.chunker import TextChunker
+
+WORDS = ["the", "president", "of", "France", "met", "Microsoft", "in", "Paris", "on", "Monday", "and", "talked",
+         "about", "United", "Nations", "climate", "summit", "with", "journalists"]
+
+
+def transcript_lines(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 25))) + rng.choice([".", "?", "!", ""])
+            for _ in range(count)]
+
+
+def main(count: int, max_length: int = 5120):
+    lines = transcript_lines(count)
+    wrapper = TextWrapper(width=max_length)
+    chunker = TextChunker(max_length)
+    baseline = best_of(lambda: wrapper.wrap(" ".join(lines)), repeat=3)
+    report(f'TextWrapper, {count} lines, {len(wrapper.wrap(" ".join(lines)))} chunks', baseline)
+    report(f'TextChunker, {len(chunker.chunk(lines))} chunks', best_of(lambda: chunker.chunk(lines), repeat=3), baseline)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
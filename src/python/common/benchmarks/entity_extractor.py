@@ -0,0 +1,63 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Runs the whole NER pipeline offline, over a GazetteerBackend answering every request in a fixed latency,
+to compare the extraction strategies: one document at a time, concurrent batches, extract_entities_many and a warm cache.
+"""
+import random
+import sys
+from benchmarks import best_of, report
+from enrichment.entity_extractor.entity_extractor import EntityExtractor, EntityTypeConfig
+from enrichment.entity_extractor.ner_backend import GazetteerBackend
+from enrichment.entity_extractor.ner_cache import NerCache
+
+PEOPLE = ["Alice Smith", "Bob Jones", "Carol White", "Dan Brown"]
+PLACES = ["Paris", "New York", "Tokyo", "Lagos"]
+FILLER = ["the", "meeting", "was", "held", "in", "with", "officials", "from", "the", "NATO", "and", "NASA"]
+
+
+def metadata_documents(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        sentences = [" ".join([rng.choice(PEOPLE)] + rng.sample(FILLER, 6) + [rng.choice(PLACES)]) + "."
+                     for _ in range(rng.randint(5, 60))]
+        documents.append({"video_description": " ".join(sentences)})
+    return documents
+
+
+def extractor(latency: float, max_concurrency: int, ner_cache: NerCache = None) -> EntityExtractor:
+    gazetteer = {name: "Person" for name in PEOPLE}
+    gazetteer.update({name: "Location" for name in PLACES})
+    ner_extractor = EntityExtractor()
+    ner_extractor.initialize_client(None, None, max_concurrency=max_concurrency,
+                                    backend=GazetteerBackend.from_assets(gazetteer, latency=latency))
+    ner_extractor.initialize_entity_type_configs([EntityTypeConfig("Person", threshold=0.85, remove_substrings=True),
+                                                  EntityTypeConfig("Location", threshold=0.9, remove_substrings=True),
+                                                  EntityTypeConfig("Organization", threshold=0.85)])
+    if ner_cache is not None:
+        ner_extractor.initialize_cache(ner_cache)
+    return ner_extractor
+
+
+def main(count: int, latency: float = 0.02):
+    documents = metadata_documents(count)
+    sequential = extractor(latency, max_concurrency=1)
+    baseline = best_of(lambda: [sequential.extract_entities(document) for document in documents], repeat=1)
+    report(f'extract_entities, {count} documents', baseline)
+
+    concurrent = extractor(latency, max_concurrency=4)
+    report('extract_entities, max_concurrency=4',
+           best_of(lambda: [concurrent.extract_entities(document) for document in documents], repeat=1), baseline)
+    report('extract_entities_many, max_concurrency=4',
+           best_of(lambda: list(concurrent.extract_entities_many(documents)), repeat=1), baseline)
+
+    cached = extractor(latency, max_concurrency=4, ner_cache=NerCache())
+    list(cached.extract_entities_many(documents))
+    report('extract_entities_many, warm cache',
+           best_of(lambda: list(cached.extract_entities_many(documents)), repeat=3), baseline)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,81 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Compares attaching thousands of metadata entities to a document with a deep copy of DEFAULT_STRUCTURE per entity,
+the correct version of the shallow copy the combiner used to share its appearances with, against the records
+built from a template with the whole-video appearance computed once.
+Then compares de-duplicating metadata entities against the Video Indexer ones by scanning the entities, against the
+index by normalized name of the combiner.
+"""
+import sys
+from copy import deepcopy
+from benchmarks import best_of, report
+from enrichment.insights_combiner.configuration_variables import (DEFAULT_STRUCTURE, METADATA_LOCATION_KEY,
+                                                                  METADATA_ORG_KEY)
+from enrichment.insights_combiner.insights_combiner import InsightsCombiner, normalize_entity_name
+from enrichment.insights_splitter.time_parser import TimeParser
+
+
+def deepcopy_default_timestamps(combiner: InsightsCombiner, value_to_attach: str) -> dict:
+    video_duration = combiner.vi_insights.get("duration_in_seconds", 0)
+    structured_string = deepcopy(DEFAULT_STRUCTURE)
+    structured_string["name"] = value_to_attach
+    structured_string["appearances"][0]["endTime"] = TimeParser.seconds_to_time_string(video_duration)
+    structured_string["appearances"][0]["endSeconds"] = video_duration
+    return structured_string
+
+
+def attach_deepcopy(combiner: InsightsCombiner, metadata: dict) -> dict:
+    document = {"named_locations": [], "named_organizations": []}
+    for location in metadata[METADATA_LOCATION_KEY]:
+        document["named_locations"].append(deepcopy_default_timestamps(combiner, location))
+    for org in metadata[METADATA_ORG_KEY]:
+        document["named_organizations"].append(deepcopy_default_timestamps(combiner, org))
+    return document
+
+
+def attach_template(combiner: InsightsCombiner, metadata: dict) -> dict:
+    document = {"named_locations": [], "named_organizations": []}
+    combiner.metadata = dict(metadata)
+    return combiner.attach_metadata_to_document(document)
+
+
+def attach_scanning(combiner: InsightsCombiner, vi_locations: list, metadata: dict) -> dict:
+    document = {"named_locations": list(vi_locations), "named_organizations": []}
+    for record in combiner._return_default_timestamps_many(metadata[METADATA_LOCATION_KEY]):
+        key = normalize_entity_name(record["name"])
+        if all(normalize_entity_name(entity["name"]) != key for entity in document["named_locations"]):
+            document["named_locations"].append(record)
+    return document
+
+
+def attach_indexed(combiner: InsightsCombiner, vi_locations: list, metadata: dict) -> dict:
+    document = {"named_locations": list(vi_locations), "named_organizations": []}
+    combiner.metadata = {METADATA_LOCATION_KEY: metadata[METADATA_LOCATION_KEY]}
+    return combiner.attach_metadata_to_document(document)
+
+
+def main(count: int):
+    combiner = InsightsCombiner()
+    combiner.vi_insights = {"duration_in_seconds": 5400, "videoId": "abc123"}
+    metadata = {METADATA_LOCATION_KEY: [f"Location {i}" for i in range(count)],
+                METADATA_ORG_KEY: [f"Organization {i}" for i in range(count)]}
+    assert attach_deepcopy(combiner, metadata) == attach_template(combiner, metadata)
+
+    baseline = best_of(lambda: attach_deepcopy(combiner, metadata), repeat=3)
+    report(f'deepcopy per entity, {2 * count} entities', baseline)
+    report('template, whole-video appearance once', best_of(lambda: attach_template(combiner, metadata), repeat=5),
+           baseline)
+
+    # half of the metadata locations are already found by Video Indexer, with another case
+    vi_locations = [{"name": f"LOCATION {i}"} for i in range(0, count, 2)]
+    assert attach_scanning(combiner, vi_locations, metadata) == attach_indexed(combiner, vi_locations, metadata)
+    baseline = best_of(lambda: attach_scanning(combiner, vi_locations, metadata), repeat=1)
+    report(f'dedupe scanning, {count} + {len(vi_locations)} entities', baseline)
+    indexed = best_of(lambda: attach_indexed(combiner, vi_locations, metadata), repeat=5)
+    report('dedupe with the normalized name index', indexed, baseline)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
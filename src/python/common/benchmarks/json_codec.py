@@ -0,0 +1,47 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Throughput of the backends of json_codec against json.loads and json.dumps(value, default=str) on the sample
+Video Indexer insights and on the merged document built from them.
+"""
+import json
+from benchmarks import VI_INSIGHTS_SAMPLE, best_of
+from enrichment import json_codec
+from enrichment.insights_combiner.insights_combiner import InsightsCombiner
+from enrichment.vi_insights_parser.vi_insights_parser import ViInsightsParser
+
+NUMBER = 200
+
+
+def report_throughput(name: str, seconds: float, size: int, baseline: float = None):
+    line = f"{name:<45} {size / seconds / 2 ** 20:>8.1f} MB/s"
+    if baseline is not None:
+        line += f"  x{baseline / seconds:.1f}"
+    print(line)
+
+
+def main():
+    with open(VI_INSIGHTS_SAMPLE, "rb") as f:
+        document = f.read()
+    vi_insights = json.loads(document)
+    merged = InsightsCombiner().combine_insights(vi_insights=ViInsightsParser().parse_vi_insights(vi_insights),
+                                                 ner_insights={"Person": {"Alice Smith"}, "Location": {"Paris"}})
+
+    print(f"VI insights, {len(document) / 1024:.0f} KB")
+    baseline = best_of(lambda: json.loads(document), number=NUMBER)
+    report_throughput("json.loads", baseline, len(document))
+    for name, (loads, _) in json_codec.BACKENDS.items():
+        report_throughput(f"{name} loads", best_of(lambda: loads(document), number=NUMBER), len(document), baseline)
+
+    for label, value in (("VI insights", vi_insights), ("merged document", merged)):
+        size = len(json.dumps(value, default=str))
+        print(f"{label}, {size / 1024:.0f} KB")
+        baseline = best_of(lambda: json.dumps(value, default=str).encode("utf-8"), number=NUMBER)
+        report_throughput("json.dumps(default=str)", baseline, size)
+        for name, (_, dumps) in json_codec.BACKENDS.items():
+            report_throughput(f"{name} dumps", best_of(lambda: dumps(value), number=NUMBER), size, baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Compares the original quadratic remove_substring_elements against the current one on entity names
+built from a small vocabulary, so that many of them contain others.
+"""
+import random
+import sys
+from benchmarks import best_of, report
+from enrichment.entity_extractor.utils import remove_substring_elements
+
+WORDS = ["united", "nations", "bank", "of", "america", "new", "york", "city", "north", "south", "group",
+         "international", "holdings", "airlines", "ministry", "defense", "national", "museum", "east", "west"]
+
+
+def quadratic_remove_substring_elements(elements):
+    sorted_elements = sorted(elements, key=lambda elem: (len(elem), elem))
+    return set(
+        [
+            j
+            for i, j in enumerate(sorted_elements)
+            if all(j not in k for k in sorted_elements[i + 1:])
+        ]
+    )
+
+
+def entity_names(count: int, seed: int = 0) -> set:
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + f" {rng.randint(0, count)}" * rng.randint(0, 1))
+    return names
+
+
+def main(count: int):
+    elements = entity_names(count)
+    assert remove_substring_elements(elements) == quadratic_remove_substring_elements(elements)
+    baseline = best_of(lambda: quadratic_remove_substring_elements(elements), repeat=1)
+    report(f'quadratic, {count} entities', baseline)
+    report('remove_substring_elements', best_of(lambda: remove_substring_elements(elements), repeat=3), baseline)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
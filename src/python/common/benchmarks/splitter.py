@@ -0,0 +1,93 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Splits the insights of a large synthetic video (two hours, 1,500 shots).
+
+- Assignment: batched NumPy assignment against the previous per-instance bisect assignment.
+  Timestamps are parsed once beforehand, only the assignment is measured.
+- Memory: peak traced memory of split_vi_insights against consuming iter_segments one segment
+  at a time.
+"""
+import bisect
+import json
+import logging
+import os
+import tracemalloc
+from collections import OrderedDict
+from benchmarks import best_of, report, synthetic_vi_insights
+from enrichment.insights_splitter.insights_to_segments_splitter import VIinsightsToSegmentsSplitter
+from enrichment.insights_splitter.timeline_index import TimelineIndex
+
+CONFIGURATION = os.path.join(os.path.dirname(__file__), '..', 'enrichment', 'insights_splitter', 'splitter_configuration.jsonc')
+
+
+def bisect_split(splitter, vi_insights, segment_type, keys_to_extract, timeline):
+    """Previous assignment strategy: one bisect and four dictionary lookups per instance"""
+    mutual_insights = splitter._attach_mutual_info_to_segments(vi_insights)
+    segments = OrderedDict((start, splitter._new_segment(mutual_insights))
+                           for start in splitter._segment_starts(vi_insights, segment_type, timeline))
+    segment_keys = list(segments.keys())
+    for key in keys_to_extract:
+        insights_collection = vi_insights['videos'][0]['insights'].get(key, None)
+        if insights_collection is None:
+            continue
+        starts = timeline.starts(key)
+        ends = timeline.ends(key)
+        for index, item_index in enumerate(timeline.items(key)):
+            info_piece = insights_collection[item_index]
+            first = bisect.bisect_right(segment_keys, starts[index]) - 1
+            last = first
+            if splitter.overlap == 'duplicate':
+                last = bisect.bisect_right(segment_keys, ends[index]) - 1
+            for bin_index in range(first, last + 1):
+                if key not in segments[segment_keys[bin_index]]['videos'][0]['insights']:
+                    segments[segment_keys[bin_index]]['videos'][0]['insights'][key] = list()
+                segments[segment_keys[bin_index]]['videos'][0]['insights'][key].append(info_piece)
+    return segments
+
+
+def batched_split(splitter, vi_insights, segment_type, keys_to_extract, timeline):
+    return OrderedDict(splitter._iter_segments(vi_insights, segment_type, keys_to_extract, timeline))
+
+
+def peak_memory(func) -> int:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    logging.disable(logging.WARNING)
+    with open(CONFIGURATION, 'r') as f:
+        configuration = json.load(f)
+    keys_to_extract = configuration["INSIGHTS_TO_PARSE"]
+    vi_insights = synthetic_vi_insights()
+    timeline = TimelineIndex(vi_insights)
+
+    for segment_type, interval_duration in (('shots', 10), ('interval', 10), ('interval', 1)):
+        for overlap in ('first', 'duplicate'):
+            splitter = VIinsightsToSegmentsSplitter(configuration)
+            splitter.overlap = overlap
+            splitter.interval_duration = interval_duration
+            args = (splitter, vi_insights, segment_type, keys_to_extract, timeline)
+
+            name = f'{segment_type} ({interval_duration}s) {overlap}'
+            baseline = best_of(lambda: bisect_split(*args), repeat=3)
+            report(f'{name}, bisect', baseline)
+            report(f'{name}, searchsorted', best_of(lambda: batched_split(*args), repeat=3), baseline)
+
+    # segments are consumed and dropped one at a time when streaming
+    splitter = VIinsightsToSegmentsSplitter(configuration)
+    for overlap in ('first', 'duplicate'):
+        kwargs = dict(overlap=overlap, interval_duration=1)
+        eager = peak_memory(lambda: splitter.split_vi_insights(vi_insights, 'interval', **kwargs))
+        streaming = peak_memory(lambda: sum(1 for _ in splitter.iter_segments(vi_insights, 'interval', **kwargs)))
+        print(f"peak memory, interval (1s) {overlap}: split_vi_insights {eager / 1e6:.1f} MB, "
+              f"iter_segments {streaming / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Compares parsing a million timestamps with datetime.strptime, as TimeParser.string_time_to_seconds
+used to, against parse_many with a cold and a warm cache.
+"""
+import random
+import sys
+from datetime import datetime
+from benchmarks import best_of, report, seconds_to_vi_time
+from enrichment.insights_splitter.time_parser import parse_many, parse_time_string
+
+
+def strptime_seconds(string_time: str) -> float:
+    string_time = string_time.split(".")[0]
+    return (datetime.strptime(string_time, "%H:%M:%S") - datetime(1900, 1, 1)).total_seconds()
+
+
+def cold_parse_many(string_times: list, fractional: bool = False):
+    parse_time_string.cache_clear()
+    return parse_many(string_times, fractional)
+
+
+def main(count: int):
+    rng = random.Random(0)
+    # a 3 hours video with millisecond timestamps, so that most strings are distinct
+    string_times = [seconds_to_vi_time(rng.uniform(0, 3 * 3600)) for _ in range(count)]
+
+    baseline = best_of(lambda: [strptime_seconds(string_time) for string_time in string_times], repeat=1)
+    report(f'strptime, {count} timestamps', baseline)
+    report('parse_many, cold cache', best_of(lambda: cold_parse_many(string_times), repeat=3), baseline)
+    report('parse_many fractional, cold cache', best_of(lambda: cold_parse_many(string_times, True), repeat=3), baseline)
+    parse_time_string.cache_clear()
+    repeated = string_times[:10000] * (count // 10000)
+    report('parse_many, repeated timestamps', best_of(lambda: parse_many(repeated), repeat=3), baseline)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
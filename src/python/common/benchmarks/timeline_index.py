@@ -0,0 +1,40 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Compares parsing every instance timestamp with datetime.strptime against building a TimelineIndex over the same insights.
+"""
+import json
+import sys
+from benchmarks.time_parser import strptime_seconds
+from benchmarks import VI_INSIGHTS_SAMPLE, best_of, report
+from enrichment.insights_splitter.time_parser import parse_time_string
+from enrichment.insights_splitter.timeline_index import TimelineIndex
+
+
+def parse_with_strptime(vi_insights: dict):
+    seconds = []
+    for collection in vi_insights['videos'][0]['insights'].values():
+        if not isinstance(collection, list):
+            continue
+        for info_piece in collection:
+            if not isinstance(info_piece, dict):
+                continue
+            for instance in info_piece.get('instances', []):
+                seconds.append(strptime_seconds(instance['start']))
+                seconds.append(strptime_seconds(instance['end']))
+    return seconds
+
+
+def main(path: str):
+    with open(path, 'r') as f:
+        vi_insights = json.load(f)
+
+    baseline = best_of(lambda: parse_with_strptime(vi_insights), repeat=20)
+    parse_time_string.cache_clear()
+    report('strptime, every instance', baseline)
+    report('TimelineIndex build', best_of(lambda: TimelineIndex(vi_insights), repeat=20), baseline)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else VI_INSIGHTS_SAMPLE)
@@ -0,0 +1,50 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Compares json.loads of a large Video Indexer insights document against its selective load, which decodes only
+what parse_vi_insights needs. Peak memory is measured with tracemalloc in a separate run.
+"""
+import json
+import sys
+import tracemalloc
+from benchmarks import best_of, report, synthetic_vi_insights
+from enrichment.vi_insights_parser.vi_insights_parser import ViInsightsParser
+
+
+def heavy_vi_insights(shots: int) -> str:
+    """Synthetic insights with face thumbnails, shot key frames and visual content moderation, as JSON"""
+    raw_insights = synthetic_vi_insights(shots=shots, items_per_key=1000)
+    insights = raw_insights["videos"][0]["insights"]
+    for face in insights["faces"]:
+        face["thumbnails"] = [{"id": f"thumbnail-{face['id']}-{i}", "fileName": f"FaceInstanceThumbnail_{i}.jpg",
+                               "instances": face["instances"]} for i in range(20)]
+    for shot in insights["shots"]:
+        shot["keyFrames"] = [{"id": i, "instances": [dict(instance, thumbnailId=f"keyframe-{shot['id']}-{i}")
+                                                     for instance in shot["instances"]]} for i in range(10)]
+    insights["visualContentModeration"] = [{"id": i, "adultScore": 0.0, "racyScore": 0.01, "instances": insights["shots"][i]["instances"]}
+                                           for i in range(shots)]
+    return json.dumps(raw_insights, indent=2)
+
+
+def peak_memory(func) -> float:
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def main(shots: int):
+    document = heavy_vi_insights(shots)
+    parser = ViInsightsParser()
+    assert parser.parse_vi_insights(ViInsightsParser.loads_vi_insights(document, selective=True)) == parser.parse_vi_insights(json.loads(document))
+    print(f"document of {len(document) / 2 ** 20:.1f} MB")
+    baseline = best_of(lambda: json.loads(document), repeat=3)
+    report(f'json.loads, peak {peak_memory(lambda: json.loads(document)):.0f} MB', baseline)
+    selective = best_of(lambda: ViInsightsParser.loads_vi_insights(document, selective=True), repeat=3)
+    report(f'selective, peak {peak_memory(lambda: ViInsightsParser.loads_vi_insights(document, selective=True)):.0f} MB', selective, baseline)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,167 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import bisect
+import re
+from dataclasses import dataclass, field
+from typing import Hashable, Iterator, List, Optional, Sequence, Tuple
+
+# Whitespace following the end of a sentence, possibly closed by quotes or brackets
+_SENTENCE_BOUNDARY = re.compile(r"[.!?。]+[\"'”’)\]]*(\s+)")
+_WORD = re.compile(r"\S+")
+
+
+@dataclass(frozen=True)
+class ChunkSpan:
+    """
+    Part of a chunk copied as-is from a source text.
+    - source identifies the source text, e.g. the metadata field it comes from.
+    - source_offset is the position of the span in the source text.
+    - chunk_offset is the position of the span in the chunk.
+    - length is the number of characters of the span.
+    """
+    source: Hashable
+    source_offset: int
+    chunk_offset: int
+    length: int
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """Text sent to the NER client at once, made of spans of the source texts joined by a space."""
+    text: str
+    spans: Tuple[ChunkSpan, ...]
+    # chunk offsets of the spans, bisected by to_source
+    _offsets: Tuple[int, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "_offsets", tuple(span.chunk_offset for span in self.spans))
+
+    def to_source(self, offset: int) -> Tuple[Hashable, int]:
+        """Maps a position in the chunk, e.g. the offset of an entity, to its source text and position in it.
+
+        Args:
+            offset (int): position in the chunk.
+
+        Returns:
+            Tuple[Hashable, int]: source of the span containing the position and the position in the source.
+        """
+        index = bisect.bisect_right(self._offsets, offset) - 1
+        span = self.spans[max(index, 0)]
+        return span.source, span.source_offset + offset - span.chunk_offset
+
+    def span_containing(self, offset: int, length: int) -> Optional[ChunkSpan]:
+        """Finds the span a part of the chunk, e.g. an entity, is copied from.
+
+        Args:
+            offset (int): position of the part in the chunk.
+            length (int): number of characters of the part.
+
+        Returns:
+            Optional[ChunkSpan]: span containing the whole part, None when the part crosses the space joining two spans.
+        """
+        index = bisect.bisect_right(self._offsets, offset) - 1
+        if index < 0:
+            return None
+        span = self.spans[index]
+        if offset + length > span.chunk_offset + span.length:
+            return None
+        return span
+
+
+class TextChunker:
+    """
+    Packs texts into as few chunks of at most max_length characters as possible, in linear time.
+    Whole sentences are packed greedily, sentences longer than max_length are split between words and
+    words longer than max_length are split anywhere.
+    """
+
+    def __init__(self, max_length: int):
+        if max_length < 1:
+            raise Exception(f"Invalid chunk length {max_length}")
+        self.max_length = max_length
+
+    def chunk(self, texts: Sequence[str], sources: Sequence[Hashable] = None) -> List[Chunk]:
+        """Splits the texts into chunks.
+
+        Args:
+            texts (Sequence[str]): texts to split, None elements are ignored.
+            sources (Sequence[Hashable], optional): identifier of every text. Defaults to the index of the text.
+
+        Returns:
+            List[Chunk]: chunks of at most max_length characters, in the order of the texts.
+        """
+        if sources is None:
+            sources = range(len(texts))
+        chunks = []
+        # spans of the chunk being packed: [index of the text, source, start, end] in the text
+        spans = []
+        length = 0
+        for index, (source, text) in enumerate(zip(sources, texts)):
+            if text is None:
+                continue
+            for start, end in self._units(text):
+                if spans and spans[-1][0] == index:
+                    # consecutive units of a text are kept with the original characters between them
+                    added = end - spans[-1][3]
+                else:
+                    added = end - start + (1 if spans else 0)
+                if spans and length + added > self.max_length:
+                    chunks.append(TextChunker._build_chunk(texts, spans))
+                    spans, length = [], 0
+                    added = end - start
+                if spans and spans[-1][0] == index:
+                    spans[-1][3] = end
+                else:
+                    spans.append([index, source, start, end])
+                length += added
+        if spans:
+            chunks.append(TextChunker._build_chunk(texts, spans))
+        return chunks
+
+    def _units(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yields the (start, end) positions of the sentences of a text, sentences too long being split."""
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(text):
+            yield from self._fitting_units(text, start, match.start(1))
+            start = match.end(1)
+        yield from self._fitting_units(text, start, len(text))
+
+    def _fitting_units(self, text: str, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        """Yields a sentence without its surrounding whitespace, split between words when too long."""
+        words = [word.span() for word in _WORD.finditer(text, start, end)]
+        if not words:
+            return
+        start, end = words[0][0], words[-1][1]
+        if end - start <= self.max_length:
+            yield start, end
+            return
+
+        piece_start, piece_end = None, None
+        for word_start, word_end in words:
+            if piece_start is not None and word_end - piece_start <= self.max_length:
+                piece_end = word_end
+                continue
+            if piece_start is not None:
+                yield piece_start, piece_end
+            # words longer than a chunk are split anywhere
+            while word_end - word_start > self.max_length:
+                yield word_start, word_start + self.max_length
+                word_start += self.max_length
+            piece_start, piece_end = word_start, word_end
+        yield piece_start, piece_end
+
+    @staticmethod
+    def _build_chunk(texts: Sequence[str], spans: list) -> Chunk:
+        parts = []
+        chunk_spans = []
+        offset = 0
+        for index, source, start, end in spans:
+            if parts:
+                parts.append(" ")
+                offset += 1
+            parts.append(texts[index][start:end])
+            chunk_spans.append(ChunkSpan(source=source, source_offset=start, chunk_offset=offset, length=end - start))
+            offset += end - start
+        return Chunk(text="".join(parts), spans=tuple(chunk_spans))
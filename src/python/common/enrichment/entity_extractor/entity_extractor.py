@@ -2,14 +2,18 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
-from textwrap import TextWrapper
-import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import logging as log
-from typing import List, Union
+from typing import Dict, Hashable, Iterable, Iterator, List, Set, Tuple
 from azure.ai.textanalytics import TextAnalyticsClient
 from azure.core.credentials import AzureKeyCredential
 from azure.ai.textanalytics import CategorizedEntity
 import enrichment.entity_extractor.utils as entity_extractor_utils
+from enrichment.entity_extractor.chunker import Chunk, TextChunker
+from enrichment.entity_extractor.ner_backend import NerBackend
+from enrichment.entity_extractor.ner_cache import NerCache
+from enrichment.entity_extractor.throttling import RateLimiter, call_with_retry
 import os
 log_text = os.getenv("LOG_PREFIX")
 
@@ -44,22 +48,36 @@ class EntityExtractor:
     """
     Class wrapping the named entity extraction client and its utility functions.
     It contains:
-    - client is the NER extraction engine that will be used.
+    - client is the NER extraction engine that will be used, a TextAnalyticsClient or another NerBackend.
     - client_max_processes is the max number of parallel processes the client supports.
     - client_max_string_length is the max number of characters a query to the client can have.
+    - max_concurrency is the max number of queries to the client in flight at the same time.
+    - rate_limiter is the rate budget of the queries to the client.
+    - max_retries is the number of times a query throttled by the client (HTTP 429) is retried.
+    - retry_backoff_seconds is the first delay before retrying a throttled query, doubled on every retry.
+    - model_version is the model version of the NER extraction engine, None for the latest one.
+    - ner_cache is the optional cache of the named entities found in every string sent to the client.
     - entity_type_configs is an array of the configs for the different named entities to be extracted.
-    - text_wrapper is a helper object to make sure no query to the client is longer than the max number of characters.
+    - text_chunker is a helper object to make sure no query to the client is longer than the max number of characters.
     """
 
     def __init__(self):
         self.client = None
         self.client_max_processes = 0
         self.client_max_string_length = 0
+        self.max_concurrency = 1
+        self.rate_limiter = RateLimiter()
+        self.max_retries = 3
+        self.retry_backoff_seconds = 1.0
+        self.model_version = None
+        self.ner_cache = None
         self.entity_type_configs = []
-        self.text_wrapper = None
+        self.text_chunker = None
 
     def initialize_client(
-        self, endpoint: str, key: str, max_processes=5, max_string_length=5120
+        self, endpoint: str, key: str, max_processes=5, max_string_length=5120,
+        max_concurrency=1, requests_per_second: float = None, max_retries=3, model_version: str = None,
+        transport=None, backend: NerBackend = None
     ):
         """Initializes the NER extraction engine and its associated parameters.
 
@@ -69,13 +87,45 @@ class EntityExtractor:
             max_processes (int, optional): maximum number of parallel processes the NER extraction engine can handle. Defaults to 5.
             max_string_length (int, optional): maximum number of characters per query the NER extraction engine can handle.
                 Defaults to 5120, which is the maximum Azure TextAnalyticsClient can handle per process.
+            max_concurrency (int, optional): maximum number of queries in flight at the same time. Defaults to 1, one query after another.
+            requests_per_second (float, optional): rate budget of the queries. Defaults to None, no budget.
+            max_retries (int, optional): number of retries of a query throttled by the NER extraction engine, or failing with a
+                transient error. The client does not retry the queries on its own. Defaults to 3.
+            model_version (str, optional): model version of the NER extraction engine. Defaults to None, the latest one.
+            transport (HttpTransport, optional): HTTP transport of the client, e.g. shared by several clients to reuse
+                their connections. Defaults to None, a transport of its own.
+            backend (NerBackend, optional): NER extraction engine to use instead of a TextAnalyticsClient of the endpoint, e.g. a
+                GazetteerBackend to run offline. Defaults to None.
         """
-        if key is not None and endpoint is not None:
+        if backend is not None:
+            self.client = backend
+        elif key is not None and endpoint is not None:
             credential = AzureKeyCredential(key)
-            self.client = TextAnalyticsClient(endpoint=endpoint, credential=credential)
+            # call_with_retry is the only retry layer of the queries: retries of the client pipeline would multiply
+            # the attempts and the backoff of every query
+            client_options = {"retry_total": 0}
+            if transport is not None:
+                client_options["transport"] = transport
+            self.client = TextAnalyticsClient(endpoint=endpoint, credential=credential, **client_options)
         self.client_max_processes = max_processes
         self.client_max_string_length = max_string_length
-        self.text_wrapper = TextWrapper(width=self.client_max_string_length)
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_second)
+        self.max_retries = max_retries
+        self.model_version = model_version
+        self.text_chunker = TextChunker(max_length=self.client_max_string_length)
+
+    def initialize_cache(self, ner_cache: NerCache):
+        """Initializes the cache of the named entities found in every string sent to the NER extraction engine.
+        Strings found in the cache are not sent again.
+
+        Args:
+            ner_cache (NerCache): cache, possibly shared by several extractors. A cache with a persistent tier requires the
+                model version of the client to be set.
+        """
+        if ner_cache.persistent is not None and self.model_version is None:
+            raise Exception("A persistent NER cache requires the model version of the NER client")
+        self.ner_cache = ner_cache
 
     def initialize_entity_type_configs(
         self, entity_type_configs: List[EntityTypeConfig]
@@ -105,106 +155,264 @@ class EntityExtractor:
         Returns:
             dict: Dictionary where each entry is a pair (named entity id, list of named entities found and postprocessed according to the config)
         """
-        data = EntityExtractor._obtain_data_from_parsed_metadata(parsed_metadata, interesting_fields)
-        data = self._prepare_data_for_ner_client(data)
-        entities = self._extract_all_entities(data, language)
+        fields = EntityExtractor._obtain_fields_from_parsed_metadata(parsed_metadata, interesting_fields)
+        chunks = self._prepare_chunks_for_ner_client([content for _, content in fields], [source for source, _ in fields])
+        entities = self._extract_all_entities([chunk.text for chunk in chunks], language)
         return self._select_interesting_entities(parsed_metadata, entities)
 
+    def extract_entities_many(
+        self,
+        parsed_metadata_documents: Iterable[dict],
+        interesting_fields=[
+            "video_description",
+        ],
+        language="en",
+    ) -> Iterator[dict]:
+        """Finds the named entities in the relevant fields of many metadata documents, e.g. to backfill an archive.
+        The chunks of consecutive documents are packed into full batches of client_max_processes chunks and sent as soon as
+        they fill max_concurrency batches, instead of sending the one or two chunks of every document on their own.
+
+        Args:
+            parsed_metadata_documents (Iterable[dict]): Dictionaries representing parsed metadata JSON files, consumed lazily.
+            interesting_fields (list, optional): List of interesting fields in the parsed metadata to search for the named entities. Defaults to ['video_description'].
+            language (str, optional): language of the text in the metadata files. Defaults to 'en'.
+
+        Yields:
+            dict: For every document, in order, the same dictionary as extract_entities.
+        """
+        window = self.client_max_processes * max(self.max_concurrency, 1)
+        # documents waiting for the named entities of their chunks, with their number of chunks
+        pending_documents = deque()
+        pending_chunks = []
+        # named entities of the chunks sent, not yet handed to their document
+        chunk_entities = deque()
+        for parsed_metadata in parsed_metadata_documents:
+            fields = EntityExtractor._obtain_fields_from_parsed_metadata(parsed_metadata, interesting_fields)
+            chunks = self._prepare_chunks_for_ner_client([content for _, content in fields], [source for source, _ in fields])
+            pending_documents.append((parsed_metadata, len(chunks)))
+            pending_chunks.extend(chunk.text for chunk in chunks)
+            if len(pending_chunks) >= window:
+                # send whole windows only, the remaining chunks are packed with the ones of the next documents
+                sent = len(pending_chunks) - len(pending_chunks) % window
+                chunk_entities.extend(self._extract_entities_per_string(pending_chunks[:sent], language))
+                del pending_chunks[:sent]
+            yield from self._select_ready_documents(pending_documents, chunk_entities)
+        chunk_entities.extend(self._extract_entities_per_string(pending_chunks, language))
+        yield from self._select_ready_documents(pending_documents, chunk_entities)
+
+    def _select_ready_documents(self, pending_documents: deque, chunk_entities: deque) -> Iterator[dict]:
+        """Hands the named entities of the chunks sent to the documents they come from, in order.
+
+        Args:
+            pending_documents (deque): (parsed metadata, number of chunks) of the documents waiting for their named entities.
+            chunk_entities (deque): named entities of the chunks sent, in the order of the documents.
+
+        Yields:
+            dict: For every document whose chunks were all sent, the same dictionary as extract_entities.
+        """
+        while pending_documents and len(chunk_entities) >= pending_documents[0][1]:
+            parsed_metadata, chunk_count = pending_documents.popleft()
+            entities = [entity for _ in range(chunk_count) for entity in chunk_entities.popleft()]
+            yield self._select_interesting_entities(parsed_metadata, entities)
+
+    def extract_timed_entities(self, lines: Iterable[dict], language="en") -> Dict[str, Dict[str, Set[Tuple[str, str]]]]:
+        """Finds the named entities in timed lines of text, e.g. the transcript and OCR of the parsed Video Indexer insights,
+        with the time ranges they appear in.
+        Lines are streamed: a line is sent to the NER client only the first time it is seen, and the new lines are packed
+        into chunks and sent as soon as they fill max_concurrency batches of client_max_processes chunks.
+
+        Args:
+            lines (Iterable[dict]): lines with a 'text' and the 'instances' it appears in, each with a 'start' and an 'end' timestamp.
+            language (str, optional): language of the text of the lines. Defaults to 'en'.
+
+        Returns:
+            dict: Dictionary where each entry is a pair (named entity id, dictionary of the named entities found and postprocessed
+                according to the config, with the set of (start, end) timestamps of the lines they appear in).
+        """
+        instances_per_text = {}
+        entities_per_text = {}
+        pending = []
+        pending_length = 0
+        window = self.client_max_string_length * self.client_max_processes * max(self.max_concurrency, 1)
+        for line in lines:
+            # lines differing only by their whitespace are the same for the NER client
+            text = " ".join((line.get("text") or "").split())
+            if not text:
+                continue
+            instances = instances_per_text.get(text)
+            if instances is None:
+                instances = instances_per_text[text] = set()
+                pending.append(text)
+                pending_length += len(text) + 1
+                if pending_length >= window:
+                    entities_per_text.update(self._extract_entities_per_text(pending, language))
+                    pending, pending_length = [], 0
+            instances.update((instance["start"], instance["end"]) for instance in line.get("instances", []))
+        if pending:
+            entities_per_text.update(self._extract_entities_per_text(pending, language))
+
+        timed_entities = {}
+        for config in self.entity_type_configs:
+            appearances = {}
+            for text, entities in entities_per_text.items():
+                for entity in entities:
+                    if entity.category == config.id_string and entity.confidence_score >= config.threshold:
+                        appearances.setdefault(entity.text.lower(), set()).update(instances_per_text[text])
+            names = set(appearances)
+            if config.remove_substrings:
+                names = entity_extractor_utils.remove_substring_elements(names)
+            capitalize = entity_extractor_utils.get_capitalizer().capitalize if config.capitalize_propernouns else str
+            timed_entities[config.id_string] = {capitalize(name): appearances[name] for name in names}
+        return timed_entities
+
+    def _extract_entities_per_text(self, texts: List[str], language: str) -> Dict[str, List[CategorizedEntity]]:
+        """Packs the texts into chunks and finds the named entities of every text, mapped back from their chunk.
+        Entities crossing the space joining two texts in a chunk belong to neither text and are dropped.
+
+        Args:
+            texts (List[str]): distinct texts in which named entities will be searched.
+            language (str): language of the text.
+
+        Returns:
+            Dict[str, List[CategorizedEntity]]: named entities of every text.
+        """
+        entities_per_text = {text: [] for text in texts}
+        chunks = self._prepare_chunks_for_ner_client(texts)
+        for chunk, entities in zip(chunks, self._extract_entities_per_string([chunk.text for chunk in chunks], language)):
+            for entity in entities:
+                length = entity.length if entity.length is not None else len(entity.text)
+                span = chunk.span_containing(entity.offset, length)
+                if span is None:
+                    log.debug(f"{log_text} Entity across texts dropped: {entity.text}")
+                    continue
+                entities_per_text[texts[span.source]].append(entity)
+        return entities_per_text
+
     @staticmethod
-    def _obtain_data_from_parsed_metadata(
+    def _obtain_fields_from_parsed_metadata(
         parsed_metadata: dict, interesting_fields: List[str]
-    ) -> List[str]:
-        """Obtain the content from the metadata file that is relevant for the search of named entities.
+    ) -> List[Tuple[str, str]]:
+        """Obtain the content from the metadata file that is relevant for the search of named entities, with the field it comes from.
 
         Args:
             parsed_metadata (dict): dictionary with a parsed metadata file.
             interesting_fields (List[str]): list of relevant fields for the search of named entities.
 
         Returns:
-            List[str]: list with strings from the parsed metadata file over which to perform the search for named entities.
+            List[Tuple[str, str]]: list of (source, string) pairs, the source being the name of the field, followed by the index
+                of the string for fields containing lists. Ex. ('video_description', ...), ('keywords[1]', ...)
         """
-        raw_data = []
+        fields = []
         for field in interesting_fields:
             if field in parsed_metadata:
-                raw_data.append(parsed_metadata[field])
-        # Since some of the content added to raw_data may be lists, flatten the list.
-        raw_data = [[elem] if isinstance(elem, str) else elem for elem in raw_data]
-        return list(itertools.chain.from_iterable(raw_data))
+                content = parsed_metadata[field]
+                # Some of the content may be lists, flatten them.
+                if isinstance(content, list):
+                    fields.extend((f"{field}[{i}]", elem) for i, elem in enumerate(content))
+                else:
+                    fields.append((field, content))
+        return fields
 
-    @staticmethod
-    def _clean_data(data: List[str]) -> List[str]:
-        """Remove None elements (potentially other ways to clean the data could be included here).
+    def _prepare_chunks_for_ner_client(self, data: List[str], sources: List[Hashable] = None) -> List[Chunk]:
+        """Pack the strings into chunks with at most the maximum width accepted by the NER engine. Whole sentences are packed greedily,
+        only sentences longer than the maximum width are split between words.
 
         Args:
-            data (List[str]): list of strings containing potentially useful content for the search of named entities.
+            data (List[str]): strings in which named entities will be searched, None elements are ignored.
+            sources (List[Hashable], optional): identifier of every string, e.g. its metadata field. Defaults to the index of the string.
 
         Returns:
-            List[str]: list of strings with only those strings that will be searched for named entities.
+            List[Chunk]: chunks of the strings, with the source and offset of their parts.
         """
-        return [content for content in data if content is not None]
+        return self.text_chunker.chunk(data, sources)
 
-    def _prepare_data_for_ner_client(self, data: Union[str, List[str]]) -> List[str]:
-        """Considering all the lines in the input data as a 'paragraph', split it into lines with at most the maximum width accepted by the NER engine.
+    def _extract_all_entities(
+        self, data: List[str], language: str
+    ) -> List[CategorizedEntity]:
+        """Extract all named entities in the provided list of strings (data) by calling the NER client.
+        The strings are sent in batches of client_max_processes, up to max_concurrency batches at the same time,
+        and the named entities are returned in the order of the strings.
+        Strings found in ner_cache are not sent to the client, the named entities of the others are cached.
 
         Args:
-            data (Union): paragraph with one or more strings representing the content in which named entities will be searched.
+            data (List[str]): where to search for the named entities.
+            language (str): language of the text.
 
         Returns:
-            List[str]: list of strings, each with at most as many characters as the max allowed by the client, in which the named entities will be searched.
+            List[CategorizedEntity]: List of named entities in the provided text as recognized by the NER client.
         """
-        data = EntityExtractor._clean_data(data)
-        if len(data) == 0:
-            return []
-        elif len(data) == 1:
-            data = data[0]
-        elif len(data) > 1:
-            data = " ".join(data)
-        prepared_data = self.text_wrapper.wrap(text=data)
-        return prepared_data
-
-    # TODO: This method is not tested for now because we'd need to mock the NER client.
-    def _extract_all_entities(
+        return [entity for entities in self._extract_entities_per_string(data, language) for entity in entities]
+
+    def _extract_entities_per_string(
         self, data: List[str], language: str
-    ) -> List[CategorizedEntity]:
-        """Extract all named entities in the provided list of strings (data) by calling the NER client.
+    ) -> List[List[CategorizedEntity]]:
+        """Same as _extract_all_entities, with the named entities of every string kept apart.
 
         Args:
             data (List[str]): where to search for the named entities.
             language (str): language of the text.
 
         Returns:
-            List[CategorizedEntity]: List of named entities in the provided text as recognized by the NER client.
+            List[List[CategorizedEntity]]: named entities of every string, empty for the strings the NER client failed on.
         """
         if self.client is None:
             log.warning(f"P{log_text} NER client is not initialized")
-            return []
-        returned_entities = []
-        for i in range(0, len(data), self.client_max_processes):
-            returned_entities.extend(
-                self.client.recognize_entities(
-                    data[i: i + self.client_max_processes], language=language
-                )
-            )
-        all_entities = []
-        for elem in returned_entities:
-            if not elem.is_error:
-                all_entities.extend(elem.entities)
-        return all_entities
+            return [[] for _ in data]
+        entities_per_string = [None] * len(data)
+        missing = []
+        for i, string in enumerate(data):
+            if self.ner_cache is not None:
+                entities_per_string[i] = self.ner_cache.get(string, language, self.model_version)
+            if entities_per_string[i] is None:
+                missing.append(i)
 
-    @staticmethod
-    def _remove_entities_below_threshold(
-        entities: List[CategorizedEntity], threshold: float
-    ) -> List[CategorizedEntity]:
-        """Remove from the provided list those named entities which confidence score is below the provided threshold.
+        results = self._recognize_all([data[i] for i in missing], language)
+        # the client returns one result per string, in order
+        for i, result in zip(missing, results):
+            if not result.is_error:
+                entities_per_string[i] = result.entities
+                if self.ner_cache is not None:
+                    self.ner_cache.put(data[i], language, result.entities, self.model_version)
+
+        if self.ner_cache is not None:
+            log.debug(f"{log_text} NER cache {self.ner_cache.stats()}")
+        return [entities or [] for entities in entities_per_string]
+
+    def _recognize_all(self, data: List[str], language: str) -> list:
+        """Send the strings to the NER client in batches of client_max_processes, up to max_concurrency batches at the same time.
+
+        Args:
+            data (List[str]): strings to send.
+            language (str): language of the text.
+
+        Returns:
+            list: results of the NER client for every string, in order.
+        """
+        batches = [data[i: i + self.client_max_processes] for i in range(0, len(data), self.client_max_processes)]
+        workers = min(self.max_concurrency, len(batches))
+        if workers <= 1:
+            batch_results = [self._recognize_batch(batch, language) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map returns the results in the order of the batches
+                batch_results = list(executor.map(lambda batch: self._recognize_batch(batch, language), batches))
+        return [result for results in batch_results for result in results]
+
+    def _recognize_batch(self, batch: List[str], language: str) -> list:
+        """Send a single batch of strings to the NER client, within the rate budget and retrying throttled queries.
 
         Args:
-            entities (List[CategorizedEntity]): list of named entities to be filtered.
-            threshold (float): minimum value of the confidence score for a named entity to be returned.
+            batch (List[str]): at most client_max_processes strings.
+            language (str): language of the text.
 
         Returns:
-            List[CategorizedEntity]: list of filtered named entities according to the threshold.
+            list: results of the NER client for every string of the batch.
         """
-        return [entity for entity in entities if entity.confidence_score >= threshold]
+        kwargs = {} if self.model_version is None else {"model_version": self.model_version}
+        return call_with_retry(lambda: self.client.recognize_entities(batch, language=language, **kwargs),
+                               rate_limiter=self.rate_limiter,
+                               max_retries=self.max_retries,
+                               backoff_seconds=self.retry_backoff_seconds)
 
     def _select_interesting_entities(
         self, parsed_metadata: dict, entities: List[CategorizedEntity]
@@ -218,28 +426,38 @@ class EntityExtractor:
         Returns:
             dict: Dictionary where each entry is a pair (named entity id, list of named entities found and postprocessed according to the config).
         """
+        # Bucket the entities by category in a single pass, with the best confidence score of every lowercase text.
+        # Normalize to lowercase to remove duplicates.
+        # This means that by default named entities will be returned in lowercase.
+        # Entities below the lowest threshold of the configs of their category are never selected.
+        min_thresholds = {}
+        for config in self.entity_type_configs:
+            min_thresholds[config.id_string] = min(config.threshold, min_thresholds.get(config.id_string, config.threshold))
+        best_scores = {category: {} for category in min_thresholds}
+        for entity in entities:
+            min_threshold = min_thresholds.get(entity.category)
+            if min_threshold is not None and entity.confidence_score >= min_threshold:
+                scores = best_scores[entity.category]
+                text = entity.text.lower()
+                score = scores.get(text)
+                if score is None or entity.confidence_score > score:
+                    scores[text] = entity.confidence_score
+
+        # Lowercase content of the metadata fields, shared by the configs adding the same fields
+        metadata_entities = {}
         interesting_entities = {}
         for config in self.entity_type_configs:
-            filtered_entities = EntityExtractor._remove_entities_below_threshold(
-                entities, config.threshold
-            )
-            # Normalize to lowercase to remove duplicates.
-            # This means that by default named entities will be returned in lowercase.
-            text_filtered_entities = set(
-                [
-                    x.text.lower()
-                    for x in filtered_entities
-                    if x.category == config.id_string
-                ]
-            )
+            text_filtered_entities = {
+                text for text, score in best_scores[config.id_string].items() if score >= config.threshold
+            }
             for field in config.add_from_metadata:
                 if field in parsed_metadata:
-                    content = parsed_metadata[field]
-                    if isinstance(content, str):
-                        content = [content]
-                    text_filtered_entities = text_filtered_entities.union(
-                        set([x.lower() for x in content])
-                    )
+                    if field not in metadata_entities:
+                        content = parsed_metadata[field]
+                        if isinstance(content, str):
+                            content = [content]
+                        metadata_entities[field] = {x.lower() for x in content}
+                    text_filtered_entities |= metadata_entities[field]
             if config.remove_substrings:
                 text_filtered_entities = (
                     entity_extractor_utils.remove_substring_elements(
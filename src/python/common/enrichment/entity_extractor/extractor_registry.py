@@ -0,0 +1,84 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Process wide registry of initialized EntityExtractors, so that invocations of a function in the same worker
+reuse a warm NER client. All the clients share a single HTTP transport and its connection pool.
+"""
+import threading
+from typing import List
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from requests.adapters import HTTPAdapter
+from enrichment.entity_extractor.entity_extractor import EntityExtractor, EntityTypeConfig
+from enrichment.entity_extractor.ner_cache import NerCache
+
+# Connections kept open per host, enough for concurrent activity executions with concurrent NER batches
+CONNECTION_POOL_SIZE = 32
+
+_transport = None
+_transport_lock = threading.Lock()
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+
+def get_shared_transport() -> RequestsTransport:
+    """
+        Returns the HTTP transport shared by the NER clients of the process, created on the first call
+    Returns:
+        RequestsTransport: transport over a single requests session
+    """
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=CONNECTION_POOL_SIZE, pool_maxsize=CONNECTION_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                # the clients must not close the session they share
+                _transport = RequestsTransport(session=session, session_owner=False)
+    return _transport
+
+
+def _config_key(config: EntityTypeConfig) -> tuple:
+    return (config.id_string, config.threshold, tuple(config.add_from_metadata), config.remove_substrings,
+            config.capitalize_propernouns)
+
+
+def get_entity_extractor(endpoint: str, key: str, entity_type_configs: List[EntityTypeConfig],
+                         ner_cache: NerCache = None, **client_options) -> EntityExtractor:
+    """
+        Returns the extractor of the process for an endpoint and a set of configurations, initializing it on
+        the first call. Extractors are safe to use from concurrent executions.
+    Args:
+        endpoint (str): endpoint of the NER extraction engine.
+        key (str): key to access the NER extraction engine.
+        entity_type_configs (List[EntityTypeConfig]): configurations of the named entity types to be extracted.
+        ner_cache (NerCache, optional): cache of the named entities. Defaults to None, no cache.
+        client_options: other arguments of EntityExtractor.initialize_client.
+
+    Returns:
+        EntityExtractor: initialized extractor
+    """
+    registry_key = (endpoint, key, tuple(_config_key(config) for config in entity_type_configs), ner_cache,
+                    tuple(sorted(client_options.items())))
+    extractor = _extractors.get(registry_key)
+    if extractor is None:
+        transport = get_shared_transport()
+        with _extractors_lock:
+            extractor = _extractors.get(registry_key)
+            if extractor is None:
+                extractor = EntityExtractor()
+                extractor.initialize_client(endpoint, key, transport=transport, **client_options)
+                extractor.initialize_entity_type_configs(list(entity_type_configs))
+                if ner_cache is not None:
+                    extractor.initialize_cache(ner_cache)
+                _extractors[registry_key] = extractor
+    return extractor
+
+
+def clear_entity_extractors():
+    """Forgets the registered extractors, e.g. after a key rotation. The shared transport is kept."""
+    with _extractors_lock:
+        _extractors.clear()
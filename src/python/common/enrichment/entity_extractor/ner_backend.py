@@ -0,0 +1,134 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+NER extraction engines of EntityExtractor. Any object with the recognize_entities method of TextAnalyticsClient
+can be used, e.g. GazetteerBackend to run the whole NER pipeline offline, for tests and benchmarks.
+"""
+from abc import ABC, abstractmethod
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, List, Mapping, Union
+from azure.ai.textanalytics import CategorizedEntity, DocumentError, RecognizeEntitiesResult, TextAnalyticsError
+from azure.core.exceptions import HttpResponseError
+from enrichment.entity_extractor.utils import ACRONYMS_PATH
+
+
+def throttled_error(retry_after: str = None) -> HttpResponseError:
+    """HTTP 429 error as raised by TextAnalyticsClient, with the Retry-After header when given"""
+    error = HttpResponseError(message="Too Many Requests")
+    error.status_code = 429
+    if retry_after is not None:
+        error.response = SimpleNamespace(headers={"Retry-After": retry_after})
+    return error
+
+
+class NerBackend(ABC):
+    """Interface of the NER extraction engines, the one of TextAnalyticsClient.recognize_entities"""
+
+    @abstractmethod
+    def recognize_entities(self, documents: List[str], language: str = "en", **kwargs) -> list:
+        """Returns a RecognizeEntitiesResult, or a DocumentError, for every document, in order."""
+
+
+class GazetteerBackend(NerBackend):
+    """
+    Deterministic local NER extraction engine, recognizing the names of a gazetteer in the documents.
+    - gazetteer maps the names to recognize, matched case sensitively on whole words, to their category.
+      The longest name is recognized where several of them start at the same word.
+    - latency is the time every request takes, a number of seconds or a callable receiving the documents.
+    - confidence_score is the confidence score of every entity.
+    - throttle(documents, attempt) tells if the attempt number attempt (from 1) to send the same documents is throttled,
+      raising an HTTP 429 error with the Retry-After header retry_after.
+    - calls records the documents of every request, throttled_calls counts the throttled ones, and max_in_flight is
+      the most requests processed at the same time.
+    """
+
+    WORD_PATTERN = re.compile(r"[\w'\-]+")
+
+    # key of the trie nodes where a name ends
+    _NAME = ''
+
+    def __init__(self, gazetteer: Mapping[str, str], latency: Union[float, Callable[[List[str]], float]] = 0.0,
+                 confidence_score: float = 1.0, throttle: Callable[[List[str], int], bool] = None, retry_after: str = None):
+        self.latency = latency
+        self.confidence_score = confidence_score
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.calls = []
+        self.throttled_calls = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._trie = {}
+        for name, category in gazetteer.items():
+            words = self.WORD_PATTERN.findall(name)
+            if not words:
+                continue
+            node = self._trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[self._NAME] = category
+
+    @classmethod
+    def from_assets(cls, gazetteer: Mapping[str, str] = None, acronyms_path: str = ACRONYMS_PATH,
+                    acronyms_category: str = "Organization", **kwargs) -> "GazetteerBackend":
+        """Builds a GazetteerBackend recognizing the bundled Library of Congress acronyms, plus the names of gazetteer.
+
+        Args:
+            gazetteer (Mapping[str, str], optional): other names to recognize, with their category. Defaults to None.
+            acronyms_path (str, optional): acronyms file, mapping lower case acronyms to their capitalization.
+            acronyms_category (str, optional): category of the acronyms. Defaults to 'Organization'.
+            kwargs: other arguments of GazetteerBackend.
+
+        Returns:
+            GazetteerBackend: the backend
+        """
+        with open(acronyms_path) as acronyms_file:
+            names = {acronym: acronyms_category for acronym in json.load(acronyms_file).values()}
+        names.update(gazetteer or {})
+        return cls(names, **kwargs)
+
+    def recognize_entities(self, documents: List[str], language: str = "en", **kwargs) -> list:
+        with self._lock:
+            self.calls.append(list(documents))
+            attempt = self.calls.count(self.calls[-1]) if self.throttle is not None else 1
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            time.sleep(self.latency(documents) if callable(self.latency) else self.latency)
+            if self.throttle is not None and self.throttle(documents, attempt):
+                with self._lock:
+                    self.throttled_calls += 1
+                raise throttled_error(self.retry_after)
+            return [self._recognize(str(i), document) for i, document in enumerate(documents)]
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _recognize(self, document_id: str, document: str):
+        if not document or document.isspace():
+            error = TextAnalyticsError(code="InvalidDocument", message="Document text is empty.")
+            return DocumentError(id=document_id, error=error, is_error=True)
+        words = list(self.WORD_PATTERN.finditer(document))
+        entities = []
+        position = 0
+        while position < len(words):
+            node = self._trie
+            category, name_end = None, position + 1
+            for end in range(position, len(words)):
+                node = node.get(words[end].group(0))
+                if node is None:
+                    break
+                if self._NAME in node:
+                    category, name_end = node[self._NAME], end + 1
+            if category is not None:
+                offset = words[position].start()
+                length = words[name_end - 1].end() - offset
+                entities.append(CategorizedEntity(text=document[offset:offset + length], category=category,
+                                                  confidence_score=self.confidence_score, offset=offset, length=length))
+            position = name_end
+        return RecognizeEntitiesResult(id=document_id, entities=entities, warnings=[], is_error=False)
@@ -0,0 +1,221 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Content addressed cache of the named entities recognized in text chunks.
+Entries are keyed by a hash of (text chunk, language, model version): an in-process LRU tier is
+checked first, then an optional persistent tier (e.g. SqliteStore), whose hits are promoted.
+Entries of the latest model (no model version) are only invalidated by their TTL, so a persistent tier requires an
+explicit model version: its entries would otherwise keep being served after an update of the model.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Optional
+from azure.ai.textanalytics import CategorizedEntity
+
+DEFAULT_MODEL_VERSION = "latest"
+
+
+def cache_key(chunk: str, language: str, model_version: str = None) -> str:
+    """
+        Hash of a text chunk sent to the NER client with its parameters
+    Args:
+        chunk (str): Text chunk
+        language (str): Language of the text
+        model_version (str, optional): Model version of the NER client. Defaults to the latest model.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    payload = json.dumps([chunk, language, model_version or DEFAULT_MODEL_VERSION], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def serialize_entities(entities: List[CategorizedEntity]) -> str:
+    return json.dumps([{"text": entity.text,
+                        "category": entity.category,
+                        "subcategory": entity.subcategory,
+                        "length": entity.length,
+                        "offset": entity.offset,
+                        "confidence_score": entity.confidence_score} for entity in entities])
+
+
+def deserialize_entities(value: str) -> List[CategorizedEntity]:
+    return [CategorizedEntity(**entity) for entity in json.loads(value)]
+
+
+class NerCacheStore(ABC):
+    """Interface of the tiers of NerCache"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[List[CategorizedEntity]]:
+        """Returns the entities stored for key, None when missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, entities: List[CategorizedEntity]):
+        """Stores the entities of key, evicting entries when full."""
+
+
+class LruStore(NerCacheStore):
+    """Thread safe in-process tier, evicting the least recently used entries"""
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[List[CategorizedEntity]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            created, entities = entry
+            if self.ttl_seconds is not None and time.time() - created > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entities
+
+    def set(self, key: str, entities: List[CategorizedEntity]):
+        with self._lock:
+            self._entries[key] = (time.time(), entities)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SqliteStore(NerCacheStore):
+    """
+    Persistent tier in a SQLite database on local disk, evicting the least recently used entries.
+    The number of entries is counted once when the database is opened, then kept up to date by the inserts and
+    deletes of the store, so that inserting an entry doesn't count the rows of the table. Entries inserted by another
+    process sharing the database are only counted when it is opened again.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl_seconds: float = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS ner_cache "
+                "(key TEXT PRIMARY KEY, entities TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS ner_cache_accessed ON ner_cache (accessed)")
+            self._count = self._connection.execute("SELECT COUNT(*) FROM ner_cache").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM ner_cache").fetchone()[0]
+
+    def get(self, key: str) -> Optional[List[CategorizedEntity]]:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT entities, created FROM ner_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            entities, created = row
+            if self.ttl_seconds is not None and now - created > self.ttl_seconds:
+                self._count -= self._connection.execute("DELETE FROM ner_cache WHERE key = ?", (key,)).rowcount
+                return None
+            self._connection.execute("UPDATE ner_cache SET accessed = ? WHERE key = ?", (now, key))
+        return deserialize_entities(entities)
+
+    def set(self, key: str, entities: List[CategorizedEntity]):
+        now = time.time()
+        value = serialize_entities(entities)
+        with self._lock, self._connection:
+            updated = self._connection.execute(
+                "UPDATE ner_cache SET entities = ?, created = ?, accessed = ? WHERE key = ?", (value, now, now, key))
+            if updated.rowcount == 0:
+                self._connection.execute("INSERT OR REPLACE INTO ner_cache VALUES (?, ?, ?, ?)", (key, value, now, now))
+                self._count += 1
+            if self._count > self.max_entries:
+                evicted = self._connection.execute(
+                    "DELETE FROM ner_cache WHERE key IN (SELECT key FROM ner_cache ORDER BY accessed LIMIT ?)",
+                    (self._count - self.max_entries,))
+                self._count -= evicted.rowcount
+
+    def close(self):
+        self._connection.close()
+
+
+class NerCache:
+    """
+    Two tier cache of the named entities recognized in text chunks, with hit rate metrics.
+    - memory is the in-process LRU tier.
+    - persistent is the optional persistent tier, checked on misses of the memory tier. Lookups and updates of a cache
+      with a persistent tier require a model version.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: float = None, persistent: NerCacheStore = None):
+        self.memory = LruStore(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.persistent = persistent
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of the lookups found in the cache, 0 before the first lookup"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
+
+    def _key(self, chunk: str, language: str, model_version: str = None) -> str:
+        if model_version is None and self.persistent is not None:
+            raise Exception("A model version is required by a persistent NER cache, "
+                            "entries of the latest model would outlive its updates")
+        return cache_key(chunk, language, model_version)
+
+    def get(self, chunk: str, language: str, model_version: str = None) -> Optional[List[CategorizedEntity]]:
+        """
+            Looks up the entities of a text chunk
+        Args:
+            chunk (str): Text chunk
+            language (str): Language of the text
+            model_version (str, optional): Model version of the NER client. Defaults to the latest model, only without
+                persistent tier.
+
+        Returns:
+            Optional[List[CategorizedEntity]]: Entities of the chunk, None on a miss
+        """
+        key = self._key(chunk, language, model_version)
+        entities = self.memory.get(key)
+        if entities is None and self.persistent is not None:
+            entities = self.persistent.get(key)
+            if entities is not None:
+                self.memory.set(key, entities)
+        with self._lock:
+            if entities is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entities
+
+    def put(self, chunk: str, language: str, entities: List[CategorizedEntity], model_version: str = None):
+        """
+            Stores the entities of a text chunk in every tier
+        Args:
+            chunk (str): Text chunk
+            language (str): Language of the text
+            entities (List[CategorizedEntity]): Entities recognized in the chunk
+            model_version (str, optional): Model version of the NER client. Defaults to the latest model, only without
+                persistent tier.
+        """
+        key = self._key(chunk, language, model_version)
+        entities = list(entities)
+        self.memory.set(key, entities)
+        if self.persistent is not None:
+            self.persistent.set(key, entities)
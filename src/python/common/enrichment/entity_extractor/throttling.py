@@ -0,0 +1,83 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import logging as log
+import os
+import threading
+import time
+from typing import Callable, TypeVar
+from azure.core.exceptions import HttpResponseError, ServiceRequestError
+log_text = os.getenv("LOG_PREFIX")
+
+T = TypeVar("T")
+
+TOO_MANY_REQUESTS = 429
+# Transient failures retried by the azure-core RetryPolicy, which is disabled on the clients using call_with_retry
+TRANSIENT_STATUS_CODES = frozenset({408, TOO_MANY_REQUESTS, 500, 502, 503, 504})
+
+
+class RateLimiter:
+    """
+    Thread safe rate budget: spaces the start of the requests so that at most requests_per_second
+    of them start every second. A limiter without budget (None) never waits.
+    """
+
+    def __init__(self, requests_per_second: float = None):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Waits until a request can start within the budget."""
+        if self.interval == 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _retry_after_seconds(error: HttpResponseError) -> float:
+    """Returns the delay requested by the Retry-After header of a throttled response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retry(func: Callable[[], T], rate_limiter: RateLimiter = None, max_retries: int = 3,
+                    backoff_seconds: float = 1.0) -> T:
+    """Calls func within the rate budget, retrying when the service throttles the call (HTTP 429), fails with another
+    transient error (see TRANSIENT_STATUS_CODES) or cannot be reached. It replaces the retries of the azure-core
+    pipeline, so the client must be created with retry_total=0.
+
+    Args:
+        func (Callable): call to the service.
+        rate_limiter (RateLimiter, optional): rate budget shared by the calls. Defaults to no budget.
+        max_retries (int, optional): number of retries of a call. Defaults to 3.
+        backoff_seconds (float, optional): first delay before retrying, doubled on every retry, unless the response
+            has a Retry-After header. Defaults to 1.
+
+    Returns:
+        The result of func.
+    """
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return func()
+        except (HttpResponseError, ServiceRequestError) as error:
+            status_code = getattr(error, "status_code", None)
+            if (isinstance(error, HttpResponseError) and status_code not in TRANSIENT_STATUS_CODES) or attempt >= max_retries:
+                raise
+            delay = _retry_after_seconds(error)
+            if delay is None:
+                delay = backoff_seconds * 2 ** attempt
+            log.warning(f"{log_text} NER request failed ({status_code or type(error).__name__}), retrying in {delay} seconds")
+            time.sleep(delay)
+            attempt += 1
@@ -2,14 +2,23 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
-from typing import Set
+from collections import deque
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, Set
 import json
 import re
 import os
+import threading
+
+
+# Below this number of items, scanning every pair is faster than building an Aho-Corasick automaton
+AHO_CORASICK_MIN_ELEMENTS = 256
 
 
 def remove_substring_elements(elements: Set[str]) -> Set[str]:
     """Remove those items from the set passed as parameter that are substrings of another item in the set.
+    Large sets are handled by an Aho-Corasick automaton, in time linear in the total length of the items.
 
     Args:
         elements (Set[str]): original set of strings.
@@ -17,6 +26,13 @@ def remove_substring_elements(elements: Set[str]) -> Set[str]:
     Returns:
         Set[str]: set of strings with no item that is a substring of another item.
     """
+    if len(elements) < AHO_CORASICK_MIN_ELEMENTS:
+        return _remove_substring_elements_by_scan(elements)
+    return _remove_substring_elements_by_automaton(elements)
+
+
+def _remove_substring_elements_by_scan(elements: Set[str]) -> Set[str]:
+    """Searches every item in all the longer ones."""
     sorted_elements = sorted(elements, key=lambda elem: (len(elem), elem))
     return set(
         [
@@ -27,6 +43,127 @@ def remove_substring_elements(elements: Set[str]) -> Set[str]:
     )
 
 
+def _remove_substring_elements_by_automaton(elements: Set[str]) -> Set[str]:
+    """Searches all the items in each other at once with an Aho-Corasick automaton."""
+    patterns = [element for element in set(elements) if element != ""]
+    if not patterns:
+        # the empty string is a substring of any other item
+        return set(elements)
+
+    # Trie of the items, pattern_nodes[i] being the node where patterns[i] ends
+    children = [{}]
+    is_pattern = [False]
+    pattern_nodes = []
+    for pattern in patterns:
+        node = 0
+        for char in pattern:
+            child = children[node].get(char)
+            if child is None:
+                child = len(children)
+                children[node][char] = child
+                children.append({})
+                is_pattern.append(False)
+            node = child
+        is_pattern[node] = True
+        pattern_nodes.append(node)
+
+    # Failure links, breadth first, and dictionary links: the node of the longest item which is a proper
+    # suffix of the string of a node, -1 if none
+    fail = [0] * len(children)
+    dictionary_link = [-1] * len(children)
+    queue = deque(children[0].values())
+    while queue:
+        node = queue.popleft()
+        for char, child in children[node].items():
+            suffix = fail[node]
+            while suffix and char not in children[suffix]:
+                suffix = fail[suffix]
+            suffix = children[suffix].get(char, 0)
+            fail[child] = suffix
+            dictionary_link[child] = suffix if is_pattern[suffix] else dictionary_link[suffix]
+            queue.append(child)
+
+    # Every item is in the trie, so matching an item against the automaton just follows its own path:
+    # the items found at each position are the node of the prefix itself (unless it is the whole item)
+    # and its chain of dictionary links. The chain of a node marked as contained is already marked.
+    contained = [False] * len(children)
+    for pattern_node, pattern in zip(pattern_nodes, patterns):
+        node = 0
+        for char in pattern:
+            node = children[node][char]
+            found = node if node != pattern_node and is_pattern[node] else dictionary_link[node]
+            while found != -1 and not contained[found]:
+                contained[found] = True
+                found = dictionary_link[found]
+
+    return set(pattern for pattern_node, pattern in zip(pattern_nodes, patterns) if not contained[pattern_node])
+
+
+ACRONYMS_PATH = f"{os.path.dirname(__file__)}/assets/acromyns_lib_congress.json"
+CAPS_EXCEPTIONS_PATH = f"{os.path.dirname(__file__)}/assets/caps_exeptions.json"
+
+
+class Capitalizer:
+    """
+    Capitalizes proper nouns (NEs), see perform_capitalize_propernouns.
+    It contains:
+    - acronyms maps lower case acronyms to their capitalization.
+    - exceptions are the words which are never capitalized.
+    - capitalize(text) is memoized, entity strings repeat a lot across videos of the same source.
+    """
+
+    WORD_PATTERN = re.compile(r"[\w'\-\_]+")
+
+    def __init__(self, acronyms: Mapping[str, str], exceptions: Iterable[str], cache_size: int = 8192):
+        self.acronyms = MappingProxyType(dict(acronyms))
+        self.exceptions = frozenset(exceptions)
+        self.capitalize = lru_cache(maxsize=cache_size)(self._capitalize)
+
+    @classmethod
+    def from_assets(cls, acronyms_path: str = ACRONYMS_PATH, exceptions_path: str = CAPS_EXCEPTIONS_PATH) -> "Capitalizer":
+        """Builds a Capitalizer from the Library of Congress acronyms and the capitalization exceptions."""
+        with open(acronyms_path) as acronyms_file:
+            acronyms = json.load(acronyms_file)
+        with open(exceptions_path) as exceptions_file:
+            exceptions = json.load(exceptions_file)
+        return cls(acronyms, exceptions)
+
+    def _capitalize_word(self, match) -> str:
+        """This is a callback function for the regular expression
+        in charge of doing the capitalization of a word.
+        """
+        word = match.group(0)
+        if word.isupper() or word in self.exceptions:
+            return word
+        acronym = self.acronyms.get(word)
+        if acronym is not None:
+            return acronym
+        return word.capitalize()
+
+    def _capitalize(self, text: str) -> str:
+        """This function converts a NER into a capitalized version of itself."""
+        return self.WORD_PATTERN.sub(self._capitalize_word, text)
+
+    def capitalize_many(self, texts: Iterable[str]) -> List[str]:
+        """Capitalizes every text, in order."""
+        capitalize = self.capitalize
+        return [capitalize(text) for text in texts]
+
+
+_capitalizer = None
+_capitalizer_lock = threading.Lock()
+
+
+def get_capitalizer() -> Capitalizer:
+    """Returns the Capitalizer of the process, loading the assets on the first call only."""
+    global _capitalizer
+    if _capitalizer is None:
+        with _capitalizer_lock:
+            if _capitalizer is None:
+                _capitalizer = Capitalizer.from_assets()
+    return _capitalizer
+
+
 def perform_capitalize_propernouns(elements: Set[str]) -> Set[str]:
     """Capitalize the proper nouns (NEs).
 
@@ -45,32 +182,4 @@ def perform_capitalize_propernouns(elements: Set[str]) -> Set[str]:
         - Acronym: nato --> NATO (acronyms from LibCongress are capitalized according to the provided rules)
         - Complex: ministry of defense --> Ministry of Defense
     """
-
-    with open(
-        f"{os.path.dirname(__file__)}/assets/acromyns_lib_congress.json"
-    ) as acronyms_file:
-        acronyms = json.load(acronyms_file)
-
-    with open(
-        f"{os.path.dirname(__file__)}/assets/caps_exeptions.json"
-    ) as caps_exeptions:
-        preps_articles = json.load(caps_exeptions)
-
-    def _word_callback(match):
-        """This is a callback function for the regular expression
-        in charge of doing the capitalization of a word.
-        """
-        word = match.group(0)
-
-        if word.isupper() or word in preps_articles:
-            return word
-        if word in acronyms.keys():
-            return acronyms[word]
-        else:
-            return word.capitalize()
-
-    def capwords(data):
-        """This function converts a NER into a capitalized version of itself."""
-        return re.sub(r"[\w'\-\_]+", _word_callback, data)
-
-    return set([capwords(i) for i in elements])
+    return set(get_capitalizer().capitalize_many(elements))
@@ -26,6 +26,7 @@ DEFAULT_STRUCTURE = {
 VI_INSIGHTS = "vi_insights"
 METADATA = "metadata"
 NER_INSIGHTS = "ner_insights"
+NER_APPEARANCES = "ner_appearances"
 
 # Video Indexer mutual field names
 VI_PEOPLE = "named_people"
@@ -5,12 +5,30 @@ Licensed under the MIT license.
 # tell flake8 to ignore specific errors in this file
 # noqa: F403,F405
 
-from enrichment.insights_splitter.time_parser import TimeParser
+from enrichment.insights_splitter.time_parser import TimeParser, parse_time_string
 from enrichment.insights_combiner.configuration_variables import *
 import logging as log
 import os
+import unicodedata
+from typing import Iterable, List, Optional
 log_text = os.getenv("LOG_PREFIX")
 
+# Fields of the structures attached to the document, except their appearances which every structure owns
+_STRUCTURE_TEMPLATE = {key: value for key, value in DEFAULT_STRUCTURE.items() if key != "appearances"}
+
+# Fields of the document whose entities are de-duplicated by name
+ENTITY_FIELDS = (VI_PEOPLE, VI_LOCATIONS, VI_ORGS)
+
+
+def normalize_entity_name(name) -> Optional[str]:
+    """
+    Returns the key identifying an entity name, the same for names differing only by case, whitespace or
+    unicode compatibility forms, e.g. ' new  York' and 'New York'. Returns None for names which are not strings.
+    """
+    if not isinstance(name, str):
+        return None
+    return " ".join(unicodedata.normalize("NFKC", name).split()).casefold()
+
 
 class InsightsCombiner:
     """
@@ -24,6 +42,11 @@ class InsightsCombiner:
         self.vi_insights = {}
         self.metadata = {}
         self.ner_insights = {}
+        self.ner_appearances = {}
+        # (video duration, appearance covering the whole video)
+        self._default_appearance = None
+        # (document, {entity field: {normalized name: entity}}) of the document being combined
+        self._entity_index = None
 
     def combine_insights(self, vi_insights, **kwargs) -> dict:
         """
@@ -34,8 +57,11 @@ class InsightsCombiner:
         additional enrichments may be:
         metadata - contains a parsed metadata JSON file
         ner_insights - contains a JSON with additional parsed named entities
+        ner_appearances - contains named entities with the (start, end) timestamps they appear at,
+                          as returned by EntityExtractor.extract_timed_entities
 
-        All values with matching field names will be merged into a single list.
+        All values with matching field names will be merged into a single list, an entity whose normalized name
+        is already in the list being merged into the existing entity instead of being added again.
         For insights with no attached timestamp, a default timestamp will be attached
         where start = video start, end = video end
         """
@@ -50,8 +76,11 @@ class InsightsCombiner:
             self.metadata = kwargs[METADATA]
             final_document = self.attach_metadata_to_document(final_document)
 
-        if NER_INSIGHTS in kwargs:
-            self.ner_insights = kwargs[NER_INSIGHTS]
+        if NER_APPEARANCES in kwargs:
+            self.ner_appearances = kwargs[NER_APPEARANCES]
+
+        if NER_INSIGHTS in kwargs or NER_APPEARANCES in kwargs:
+            self.ner_insights = kwargs.get(NER_INSIGHTS, {})
             final_document = self.attach_ner_to_document(final_document)
 
         log.info(f"{log_text} insights for video {video_id} were combined successfully")
@@ -67,13 +96,13 @@ class InsightsCombiner:
             dict: The final document structure with additional metadata related fields
         """
 
-        # Append values of locations to existing document
-        for location in self.metadata.get(METADATA_LOCATION_KEY, []):
-            document[VI_LOCATIONS].append(self._return_default_timestamps(location))
+        # Add values of locations to existing document
+        self._add_entities(document, VI_LOCATIONS,
+                           self._return_default_timestamps_many(self.metadata.get(METADATA_LOCATION_KEY, [])))
 
-        # Append values of organizations to existing document
-        for org in self.metadata.get(METADATA_ORG_KEY, []):
-            document[VI_ORGS].append(self._return_default_timestamps(org))
+        # Add values of organizations to existing document
+        self._add_entities(document, VI_ORGS,
+                           self._return_default_timestamps_many(self.metadata.get(METADATA_ORG_KEY, [])))
 
         # remove the keys to avoid duplications in the document
         self.metadata.pop(METADATA_LOCATION_KEY, None)
@@ -97,16 +126,119 @@ class InsightsCombiner:
             dict: he combined document to save data
         """
 
-        for location in list(self.ner_insights.get(NER_LOCATION_KEY, [])):
-            document[VI_LOCATIONS].append(self._return_default_timestamps(location))
+        for ner_key, document_key in [(NER_LOCATION_KEY, VI_LOCATIONS), (NER_PERSON_KEY, VI_PEOPLE), (NER_ORG_KEY, VI_ORGS)]:
+            appearances = self.ner_appearances.get(ner_key, {})
+            names = list(self.ner_insights.get(ner_key, []))
+            known_names = set(names)
+            names.extend(name for name in appearances if name not in known_names)
+            default_appearance = self._whole_video_appearance()
+            self._add_entities(document, document_key, (
+                self._return_timed_appearances(name, appearances[name]) if appearances.get(name)
+                else InsightsCombiner._new_structure(name, [dict(default_appearance)])
+                for name in names
+            ))
+
+        return document
+
+    def _add_entities(self, document: dict, field: str, entities: Iterable[dict]):
+        """
+        Adds entities to a field of the document, in constant time per entity. An entity whose normalized name is
+        already in the field is merged into the existing entity, otherwise it is appended, and its name is appended
+        to the field + "_names" list if the document has one.
+        Timed appearances replace the default whole-video appearance, or are merged with the other timed appearances,
+        those of a Video Indexer entity without appearances being the ones of its instances. The instances of a Video
+        Indexer entity are then rebuilt from the merged appearances, so that both fields keep matching.
+        An entity appearing in the whole video leaves the existing entity unchanged.
+
+        Args:
+            document (dict): the final document structure
+            field (str): the entity field, one of ENTITY_FIELDS
+            entities (Iterable[dict]): entities structured for Azure search
+        """
+        index = self._get_entity_index(document)[field]
+        document_entities = document[field]
+        names = document.get(f"{field}_names")
+        default_appearances = [self._whole_video_appearance()]
+        for entity in entities:
+            key = normalize_entity_name(entity["name"])
+            existing = index.get(key) if key is not None else None
+            if existing is None:
+                document_entities.append(entity)
+                if key is not None:
+                    index[key] = entity
+                    if isinstance(names, list):
+                        names.append(entity["name"])
+                continue
+            if entity["appearances"] == default_appearances:
+                continue
+            appearances = existing.get("appearances")
+            if not appearances and existing.get("instances"):
+                appearances = InsightsCombiner._instances_to_appearances(existing["instances"])
+            if not appearances or appearances == default_appearances:
+                existing["appearances"] = entity["appearances"]
+            else:
+                existing["appearances"] = InsightsCombiner._merge_appearances(appearances + entity["appearances"])
+            if "instances" in existing:
+                existing["instances"] = [
+                    {"adjustedStart": appearance["startTime"], "adjustedEnd": appearance["endTime"],
+                     "start": appearance["startTime"], "end": appearance["endTime"]}
+                    for appearance in existing["appearances"]
+                ]
 
-        for person in list(self.ner_insights.get(NER_PERSON_KEY, [])):
-            document[VI_PEOPLE].append(self._return_default_timestamps(person))
+    def _get_entity_index(self, document: dict) -> dict:
+        """
+        Returns the index of the entities of the document by normalized name, built once per document.
+        Entities which are not dictionaries, or without a string name, are not indexed.
+        """
+        if self._entity_index is None or self._entity_index[0] is not document:
+            index = {}
+            for field in ENTITY_FIELDS:
+                field_index = index[field] = {}
+                for entity in document.get(field, []):
+                    key = normalize_entity_name(entity.get("name")) if isinstance(entity, dict) else None
+                    if key is not None:
+                        field_index.setdefault(key, entity)
+            self._entity_index = (document, index)
+        return self._entity_index[1]
 
-        for org in list(self.ner_insights.get(NER_ORG_KEY, [])):
-            document[VI_ORGS].append(self._return_default_timestamps(org))
+    def _return_timed_appearances(self, value_to_attach: str, timestamps) -> dict:
+        """
+        Sets the value_to_attach to the format for azure search, with the time ranges it appears in
 
-        return document
+        Args:
+            value_to_attach (str): A new value we want to attach to the instances
+            timestamps: (start, end) Video Indexer timestamps of the appearances, overlapping ones are merged
+        Returns:
+            dict: Structure to index in Azure search
+        """
+        appearances = [
+            {"startTime": start, "endTime": end, "startSeconds": parse_time_string(start, True),
+             "endSeconds": parse_time_string(end, True)}
+            for start, end in timestamps
+        ]
+        return InsightsCombiner._new_structure(value_to_attach, InsightsCombiner._merge_appearances(appearances))
+
+    @staticmethod
+    def _instances_to_appearances(instances: List[dict]) -> List[dict]:
+        """Returns the appearances of the instances of a Video Indexer entity, the overlapping ones being merged"""
+        return InsightsCombiner._merge_appearances([
+            {"startTime": instance["start"], "endTime": instance["end"], "startSeconds": parse_time_string(instance["start"], True),
+             "endSeconds": parse_time_string(instance["end"], True)}
+            for instance in instances if isinstance(instance, dict) and "start" in instance and "end" in instance
+        ])
+
+    @staticmethod
+    def _merge_appearances(appearances: List[dict]) -> List[dict]:
+        """Returns new appearances sorted by start, the overlapping ones being merged"""
+        merged = []
+        for appearance in sorted(appearances, key=lambda appearance: appearance["startSeconds"]):
+            if merged and appearance["startSeconds"] <= merged[-1]["endSeconds"]:
+                if appearance["endSeconds"] > merged[-1]["endSeconds"]:
+                    merged[-1]["endTime"] = appearance["endTime"]
+                    merged[-1]["endSeconds"] = appearance["endSeconds"]
+                continue
+            merged.append(dict(appearance))
+        return merged
 
     def _return_default_timestamps(self, value_to_attach: str) -> dict:
         """
@@ -117,14 +249,39 @@ class InsightsCombiner:
         Returns:
             dict: Structure to index in Azure search
         """
+        return self._return_default_timestamps_many([value_to_attach])[0]
+
+    def _return_default_timestamps_many(self, values_to_attach: Iterable[str]) -> List[dict]:
+        """
+        Sets every value_to_attach to a default format for azure search, appearing in the whole video.
+        Every structure owns its appearances, the appearance covering the whole video is computed once.
+
+        Args:
+            values_to_attach (Iterable[str]): New values we want to attach to the instances
+        Returns:
+            List[dict]: Structures to index in Azure search
+        """
+        default_appearance = self._whole_video_appearance()
+        return [InsightsCombiner._new_structure(value, [dict(default_appearance)]) for value in values_to_attach]
+
+    def _whole_video_appearance(self) -> dict:
+        """
+        Returns the appearance covering the whole video, computed once per video duration. It must not be modified.
+        """
         video_duration = self.vi_insights.get("duration_in_seconds", 0)
-        structured_string = DEFAULT_STRUCTURE.copy()
-        structured_string["name"] = value_to_attach
-        structured_string["appearances"][0][
-            "endTime"
-        ] = TimeParser.seconds_to_time_string(video_duration)
-        structured_string["appearances"][0]["endSeconds"] = video_duration
+        if self._default_appearance is None or self._default_appearance[0] != video_duration:
+            appearance = dict(DEFAULT_STRUCTURE["appearances"][0])
+            appearance["endTime"] = TimeParser.seconds_to_time_string(video_duration)
+            appearance["endSeconds"] = video_duration
+            self._default_appearance = (video_duration, appearance)
+        return self._default_appearance[1]
 
+    @staticmethod
+    def _new_structure(value_to_attach: str, appearances: List[dict]) -> dict:
+        """Returns a new structure to index in Azure search for value_to_attach, with its appearances"""
+        structured_string = dict(_STRUCTURE_TEMPLATE)
+        structured_string["name"] = value_to_attach
+        structured_string["appearances"] = appearances
         return structured_string
 
     def _init_document(self) -> dict:
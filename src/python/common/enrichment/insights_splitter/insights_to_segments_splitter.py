@@ -4,8 +4,10 @@ Licensed under the MIT license.
 """
 import bisect
 import logging as log
-from enrichment.insights_splitter.time_parser import TimeParser
+import numpy as np
+from enrichment.insights_splitter.timeline_index import TimelineIndex
 from collections import OrderedDict
+from typing import Iterator, Tuple
 import copy
 
 import os
@@ -52,6 +54,22 @@ class VIinsightsToSegmentsSplitter():
         Returns:
             OrderedDict: Segments including VI insights assigned based on timestamp.
             Each Dictionary key represents the segment start time in seconds.
+            Segments share their static fields with the original insights, use materialize()
+            to obtain a fully independent segment.
+        """
+        return OrderedDict(self.iter_segments(vi_insights, segment_type, **kwargs))
+
+    def iter_segments(self, vi_insights: dict, segment_type: str, **kwargs) -> Iterator[Tuple[float, dict]]:
+        """
+            Streaming version of split_vi_insights: yields the segments one at a time, in time
+            order, so that only a single populated segment has to be held in memory.
+            Accepts the same arguments as split_vi_insights.
+        Args:
+            vi_insights (dict): raw VI  insights JSON file
+            segment_type (str): "scenes", "shots" or "interval"
+
+        Yields:
+            Tuple[float, dict]: The segment start time in seconds and the segment content
         """
         # initialize configuration variables
         self.overlap = kwargs.pop('overlap', self.configuration["DEFAULT_OVERLAP"])
@@ -59,50 +77,69 @@ class VIinsightsToSegmentsSplitter():
         int_dur = self.configuration["DEFAULT_INTERVAL_DURATION"]
         self.interval_duration = kwargs.pop('interval_duration', int_dur)
 
-        # initialize segments based on parameters
-        segments = self._initialize_segments(vi_insights, segment_type)
+        # parse every timestamp once
+        timeline = TimelineIndex(vi_insights, keys=VIinsightsToSegmentsSplitter._keys_to_index(segment_type, keys_to_extract))
+        return self._iter_segments(vi_insights, segment_type, keys_to_extract, timeline)
 
-        # assign information based on overlap strategy
-        final_segments = self._assign_segment_information(segments, vi_insights, keys_to_extract)
-        return final_segments
+    @staticmethod
+    def _keys_to_index(segment_type: str, keys_to_extract: list) -> list:
+        """
+            Returns the insight keys which timestamps are needed to split the insights
+        """
+        keys = list(keys_to_extract)
+        if segment_type in ('scenes', 'shots') and segment_type not in keys:
+            keys.append(segment_type)
+        return keys
 
-    def _assign_segment_information(self, segments: OrderedDict, vi_insights: dict, keys_to_extract: list):
+    def _iter_segments(self, vi_insights: dict, segment_type: str, keys_to_extract: list,
+                       timeline: TimelineIndex) -> Iterator[Tuple[float, dict]]:
         """
             Assigns information from vi_insights into the relevant segment based on the
-            overlap strategy
+            overlap strategy. The assignments of every key are indexed by segment first, then the
+            segments are built with a single sweep in time order.
         Args:
-            segments (OrderedDict): initialized segments
-        Returns:
-            OrderedDict: Segments including VI insights assigned based on timestamp
+            vi_insights (dict): raw VI  insights JSON file
+            segment_type (str): "scenes", "shots" or "interval"
+            keys_to_extract (list): List of keys to be parsed to individual segments
+            timeline (TimelineIndex): Parsed timestamps of vi_insights
+
+        Yields:
+            Tuple[float, dict]: The segment start time in seconds and the segment content
         """
+        segment_starts = self._segment_starts(vi_insights, segment_type, timeline)
+        mutual_insights = self._attach_mutual_info_to_segments(vi_insights)
 
+        assignments = []
         for key in keys_to_extract:
             log.debug(f"splitting key {key} using overlap {self.overlap}")
-            segments = self._split_key_insights(segments, vi_insights, key)
-        return segments
-
-    def _initialize_segments(self, vi_insights: dict, segment_type: str) -> OrderedDict:
+            pieces_in_segment = self._index_key_assignments(vi_insights, key, segment_starts, timeline)
+            if pieces_in_segment is not None:
+                assignments.append((key, pieces_in_segment))
+
+        for bin_index, segment_start in enumerate(segment_starts):
+            segment = self._new_segment(mutual_insights)
+            insights = segment['videos'][0]['insights']
+            for key, pieces_in_segment in assignments:
+                info_pieces = pieces_in_segment(bin_index)
+                if info_pieces:
+                    if key not in insights:
+                        insights[key] = list()
+                    insights[key].extend(info_pieces)
+            yield segment_start, segment
+
+    def _segment_starts(self, vi_insights: dict, segment_type: str, timeline: TimelineIndex = None) -> list:
         """
-            Execute splitting strategy based on passed parameters
-
+            Returns the sorted start times in seconds of the segments, without duplicates
         Args:
             vi_insights (dict): raw VI  insights JSON file
-            segment_type (str): "scenes": splits insights into varying lengths based on VI scenes.
-                                "shots" : splits insights into varying lengths based on VI shots.
-                                "interval": splits insights into equal length segments sized n
-                                seconds (last segment may be shorter, dependent on video length)
-        Returns:
-            dict: A dictionary of segments, each key contains the segment start time in seconds
-                  and the relevant content
+            segment_type (str): "scenes", "shots" or "interval"
+            timeline (TimelineIndex, optional): Parsed timestamps of vi_insights
         """
-
         if segment_type in ('scenes', 'shots'):
-            segments = self._initialize_shot_scene_segments(vi_insights, look_at=segment_type)
-        else:
-            segments = self._initialize_interval_segments(vi_insights)
-        return segments
+            return self._shot_scene_segment_starts(vi_insights, look_at=segment_type, timeline=timeline)
+        return self._interval_segment_starts(vi_insights)
 
-    def _initialize_interval_segments(self, vi_insights: dict):
+    def _interval_segment_starts(self, vi_insights: dict) -> list:
         """
         Args:
             vi_insights (dict): raw VI  insights JSON file
@@ -111,8 +148,7 @@ class VIinsightsToSegmentsSplitter():
             Exception: An Exception when interval_duration <1 or not of integer type
 
         Returns:
-            OrderedDict: Empty segments where the keys are initialized based on the
-            passed parameters
+            list: Start times in seconds of equal length intervals covering the video
         """
         # validate interval is of numeric type
         self._is_config_valid()
@@ -123,16 +159,7 @@ class VIinsightsToSegmentsSplitter():
             VIinsightsToSegmentsSplitter._return_single_segment(vi_insights, video_duration)
 
         # create numeric intervals with equal size
-        ranges = list(range(0, video_duration + 1, self.interval_duration))
-
-        # initialized segments
-        segments = OrderedDict()
-
-        # attach mutual information to each segment
-        for rng in ranges:
-            segments[rng] = self._attach_mutual_info_to_segments(vi_insights)
-
-        return segments
+        return list(range(0, video_duration + 1, self.interval_duration))
 
     @staticmethod
     def _return_single_segment(vi_insights: dict, video_duration: int) -> OrderedDict:
@@ -154,12 +181,14 @@ class VIinsightsToSegmentsSplitter():
     def _attach_mutual_info_to_segments(self, vi_insights: dict):
         """
             Returns all the VI insights which are static and aren't dependent on timestamps.
+            The result is a skeleton shared by every segment: static fields reference the
+            original insights instead of being copied, so it must be treated as read-only.
         Args:
             vi_insights (dict): Original VI insights
         """
 
-        # copy original dictionary so not to lose content
-        mutual = copy.deepcopy(vi_insights)
+        # shallow copy the original dictionary so not to lose content
+        mutual = dict(vi_insights)
 
         # Remove keys which will be reconstructed or redundant
         mutual.pop('videosRanges', None)
@@ -172,139 +201,177 @@ class VIinsightsToSegmentsSplitter():
             mutual['summarizedInsights'] = dict()
         else:
             mutual_summarized = {key: vi_insights[summ].get(key, None) for key in keep_keys}
-            mutual['summarizedInsights'] = copy.deepcopy(mutual_summarized)
+            mutual['summarizedInsights'] = mutual_summarized
 
         # Reset all keys to be reassigned as segments as empty lists, keeping all
         # static fields untouched
-        videos = mutual['videos'][0]
-        insights = videos.pop('insights', None)
+        mutual['videos'] = list(mutual['videos'])
+        videos = dict(mutual['videos'][0])
+        insights = dict(videos.pop('insights', None))
         for key in self.configuration['INSIGHTS_TO_PARSE']:
             insights[key] = list()
         videos['insights'] = insights
         mutual['videos'][0] = videos
         return mutual
 
-    def _initialize_shot_scene_segments(self, vi_insights: dict, look_at='scenes') -> OrderedDict:
+    def _new_segment(self, mutual_insights: dict) -> dict:
         """
-            The function generates an ordered dictionary containing all the insights split into
-            'shots/scenes'.
+            Creates a segment from the shared mutual skeleton. Only the containers leading to the
+            per-segment insights lists are new objects, all static fields are shared references.
         Args:
-            vi_insights (dict): original vi_insights as generated by Video Indexer
-            look_at (str, optional): Which granulation to extract.
-                                    'shots' for extracting shot segments, 'scene' for scene
-                                    segment extractions. Defaults to 'scenes'.
+            mutual_insights (dict): Skeleton as returned by _attach_mutual_info_to_segments
 
         Returns:
-            OrderedDict: Returns an Ordered dictionary where each key represents the beginning
-            of a new segment.
+            dict: Segment with its own, empty, insights lists
         """
+        segment = dict(mutual_insights)
+        segment['videos'] = list(mutual_insights['videos'])
+        videos = dict(segment['videos'][0])
+        insights = dict(videos['insights'])
+        for key in self.configuration['INSIGHTS_TO_PARSE']:
+            insights[key] = list()
+        videos['insights'] = insights
+        segment['videos'][0] = videos
+        return segment
 
-        intervals = vi_insights['videos'][0]['insights'][look_at]
-        interval_start_time = [x['instances'][0]['start'] for x in intervals]
-        shot_str_to_seconds = [TimeParser.string_time_to_seconds(x) for x in interval_start_time]
+    @staticmethod
+    def materialize(segment: dict) -> dict:
+        """
+            Segments share their static fields and information pieces with the original insights
+            and with each other. Returns a fully independent copy of a single segment, for callers
+            which need to modify it in place.
+        Args:
+            segment (dict): Segment as returned by split_vi_insights
 
-        segments = OrderedDict()
-        # attach mutual information to each segment
-        mutual_insights = self._attach_mutual_info_to_segments(vi_insights)
-        for rng in shot_str_to_seconds:
-            copy_mutual = copy.deepcopy(mutual_insights)
-            segments[rng] = copy_mutual
-        return segments
+        Returns:
+            dict: Deep copy of the segment
+        """
+        return copy.deepcopy(segment)
 
-    def _split_key_insights(self, segments: OrderedDict, vi_insights: dict, key: str):
+    @staticmethod
+    def _shot_scene_segment_starts(vi_insights: dict, look_at='scenes', timeline: TimelineIndex = None) -> list:
         """
-            This function implements assignment of information_pieces into segments using the
-            selected overlap strategy.
         Args:
-            segments (dict): Dictionary representing segments
-            vi_insights (dict): Raw VI insights
+            vi_insights (dict): original vi_insights as generated by Video Indexer
+            look_at (str, optional): 'shots' or 'scenes'. Defaults to 'scenes'.
+            timeline (TimelineIndex, optional): Parsed timestamps of vi_insights
 
         Returns:
-            OrderedDict: Split a single "key" of VI insights into segments
+            list: Start times in seconds of the shots/scenes, without duplicates
         """
+        if timeline is None or look_at not in timeline:
+            timeline = TimelineIndex(vi_insights, keys=[look_at])
 
-        insights_collection = vi_insights['videos'][0]['insights'].get(key, None)
-        # Return segments unchanged if key is missing from vi_insights
-        if insights_collection is None:
-            return segments
-        # Retrieve the start time of each segment
-        segment_keys = list(segments.keys())
-
-        for info_piece in insights_collection:
-            for instance in info_piece['instances']:
-                if self.overlap == 'duplicate':
-                    segments = VIinsightsToSegmentsSplitter._split_key_insights_duplicate(segments, segment_keys, key, instance, info_piece)
-                else:
-                    segments = VIinsightsToSegmentsSplitter._split_key_insights_first(segments, segment_keys, key, instance, info_piece)
-        return segments
+        intervals = vi_insights['videos'][0]['insights'][look_at]
+        starts = [timeline.start(look_at, i, 0) for i in range(len(intervals))]
+        return list(OrderedDict.fromkeys(starts))
 
-    @staticmethod
-    def _split_key_insights_first(segments: OrderedDict, segment_keys: list, key: str, instance: dict, info_piece: dict):
+    def _index_key_assignments(self, vi_insights: dict, key: str, segment_starts: list, timeline: TimelineIndex):
         """
-            This function implements assignment of information_pieces into segments using the
-            'first' overlap strategy.
-            'first' overlap - If an information piece duration spans over multiple segments,
-            it's assigned only to the first relevant segment.
+            Assigns all the instances of a single "key" of VI insights to segments at once.
+            'first' overlap assigns each instance to the segment containing its start, the
+            assignments are sorted by segment.
+            'duplicate' overlap assigns it to every segment between its start and its end. Instead
+            of being expanded over every segment they span, instances are sorted by first and last
+            segment and the segments are swept in order, keeping the set of instances overlapping
+            the current segment. While that set doesn't change, consecutive segments reuse the same
+            list of information pieces.
         Args:
-            segments (dict): Dictionary representing segments
-            segment_keys (list): List of start times (in seconds) of each segment
+            vi_insights (dict): Raw VI insights
             key (str): Name of the insight we're working on
-            instance (dict): The timestamp relevant to the insight
-            info_piece (dict): The insight information and data
+            segment_starts (list): Sorted list of start times (in seconds) of each segment
+            timeline (TimelineIndex): Parsed timestamps of vi_insights
 
         Returns:
-            OrderedDict: Returns segments with "key" instances assigned to relevant bins
+            Callable[[int], list]: Returns, for a segment index, the information pieces assigned
+            to the segment in instance order. It must be called with increasing segment indices,
+            and its result must not be modified. None when the key is missing from vi_insights.
         """
-        # Get start seconds of the information piece instance
-        instance_start_time = TimeParser.string_time_to_seconds(instance['start'])
+        insights_collection = vi_insights['videos'][0]['insights'].get(key, None)
+        if insights_collection is None or key not in timeline or len(segment_starts) == 0:
+            return None
+
+        items = timeline.items(key)
+        first_bins = VIinsightsToSegmentsSplitter._bins(segment_starts, timeline.starts(key))
+
+        if self.overlap == 'duplicate':
+            return VIinsightsToSegmentsSplitter._sweep_duplicate_assignments(
+                insights_collection, items, first_bins,
+                VIinsightsToSegmentsSplitter._bins(segment_starts, timeline.ends(key)), len(segment_starts))
 
-        # Identify the first relevant segment to place the information piece instance
-        bin_index = bisect.bisect_right(segment_keys, instance_start_time) - 1
+        # An instance starting before the first segment lands in the last one, as with list indexing
+        bins = first_bins % len(segment_starts)
+        order = np.argsort(bins, kind='stable')
+        sorted_items = np.frombuffer(items, dtype=np.int64)[order].tolist()
+        boundaries = np.searchsorted(bins[order], np.arange(len(segment_starts) + 1), side='left').tolist()
 
-        # Initialized list of instances
-        if key not in segments[segment_keys[bin_index]]['videos'][0]['insights']:
-            segments[segment_keys[bin_index]]['videos'][0]['insights'][key] = list()
+        def pieces_in_segment(bin_index):
+            return [insights_collection[i] for i in sorted_items[boundaries[bin_index]:boundaries[bin_index + 1]]]
 
-        # Add instances to list
-        segments[segment_keys[bin_index]]['videos'][0]['insights'][key].append(info_piece)
-        return segments
+        return pieces_in_segment
 
     @staticmethod
-    def _split_key_insights_duplicate(segments: OrderedDict, segment_keys: list, key: str, instance: dict, info_piece: dict):
+    def _sweep_duplicate_assignments(insights_collection: list, items, first_bins: np.ndarray, last_bins: np.ndarray,
+                                     segments_count: int):
         """
-            This function implements assignment of information_pieces into segments using the
-            'duplicate' overlap strategy.
-            'duplicate' overlap - If an information piece duration spans over multiple segments,
-            the information is assign to every relevant segment
+            Sorted endpoints sweep over the instances of a key for the 'duplicate' overlap
         Args:
-            segments (dict): Dictionary representing segments
-            segment_keys (list): List of start times (in seconds) of each segment
-            key (str): Name of the insight we're working on
-            instance (dict): The timestamp relevant to the insight
-            info_piece (dict): The insight information and data
+            insights_collection (list): The insights of the key
+            items (array): Index in insights_collection of the item owning each instance
+            first_bins (np.ndarray): First segment of every instance, -1 before the first segment
+            last_bins (np.ndarray): Last segment of every instance
+            segments_count (int): Number of segments
 
         Returns:
-            OrderedDict: Returns segments with "key" instances assigned to relevant bins
+            Callable[[int], list]: See _index_key_assignments
         """
+        last_segment = segments_count - 1
+        entering = np.maximum(first_bins, 0)
+        entering_list = entering.tolist()
+        last_list = last_bins.tolist()
+        by_entering = np.argsort(entering, kind='stable').tolist()
+        by_leaving = np.argsort(last_bins, kind='stable').tolist()
+        # An instance starting before the first segment also lands in the last one, as with list indexing
+        wrapped = np.flatnonzero(first_bins < 0).tolist()
+
+        # active instances are kept sorted by instance, which is the order of the information pieces
+        state = {'entered': 0, 'left': 0, 'active': [], 'pieces': []}
+
+        def pieces_in_segment(bin_index):
+            active = state['active']
+            changed = False
+            while state['entered'] < len(by_entering) and entering_list[by_entering[state['entered']]] <= bin_index:
+                instance = by_entering[state['entered']]
+                if last_list[instance] >= entering_list[instance]:
+                    bisect.insort(active, instance)
+                    changed = True
+                state['entered'] += 1
+            while state['left'] < len(by_leaving) and last_list[by_leaving[state['left']]] < bin_index:
+                instance = by_leaving[state['left']]
+                if last_list[instance] >= entering_list[instance]:
+                    active.remove(instance)
+                    changed = True
+                state['left'] += 1
+
+            if changed:
+                state['pieces'] = [insights_collection[items[i]] for i in active]
+            if bin_index == last_segment and wrapped:
+                return [insights_collection[items[i]] for i in sorted(active + wrapped)]
+            return state['pieces']
+
+        return pieces_in_segment
 
-        # Get start seconds of the information piece instance
-        instance_start_time = TimeParser.string_time_to_seconds(instance['start'])
-        instance_end_time = TimeParser.string_time_to_seconds(instance['end'])
-
-        # Identify the first relevant segment to place the information piece instance
-        bin_index_start = bisect.bisect_right(segment_keys, instance_start_time) - 1
-        bin_index_end = bisect.bisect_right(segment_keys, instance_end_time) - 1
-        relevant_bins = range(bin_index_start, bin_index_end + 1)
-
-        # Initialized list of instances
-        for bin_index in relevant_bins:
-            if key not in segments[segment_keys[bin_index]]['videos'][0]['insights']:
-                segments[segment_keys[bin_index]]['videos'][0]['insights'][key] = list()
-
-            # Add instances to list
-            segments[segment_keys[bin_index]]['videos'][0]['insights'][key].append(info_piece)
-
-        return segments
+    @staticmethod
+    def _bins(segment_starts: list, seconds) -> np.ndarray:
+        """
+            Returns the index of the segment containing each of the times, -1 for times before
+            the first segment
+        Args:
+            segment_starts (list): Sorted list of start times (in seconds) of each segment
+            seconds (array): Times in seconds
+        """
+        return np.searchsorted(np.asarray(segment_starts, dtype=np.float64),
+                               np.frombuffer(seconds, dtype=np.float64), side='right') - 1
 
     def _is_config_valid(self,):
 
@@ -3,8 +3,41 @@ Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
 import time
+from array import array
+from functools import lru_cache
 from os import getenv
-from datetime import datetime
+from typing import Iterable, Tuple
+import numpy as np
+
+# Video Indexer timestamps repeat a lot within a document (the end of an instance is often the
+# start of the next one), parsed values are memoized
+PARSE_CACHE_SIZE = 65536
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_time_string(string_time: str, fractional: bool = False) -> float:
+    """
+    Parses a Video Indexer timestamp of the fixed form H:MM:SS(.fffffff) into seconds by
+    splitting the string, without going through datetime.
+    By default the fractional part is truncated, as TimeParser.string_time_to_seconds always did.
+    :param string_time: timestamp as written by Video Indexer
+    :param fractional: keep the fractional seconds
+    :return: passed time converted to seconds
+    """
+    hours, minutes, seconds = string_time.split(":")
+    if fractional:
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    return float(int(hours) * 3600 + int(minutes) * 60 + int(seconds.split(".")[0]))
+
+
+def parse_many(string_times: Iterable[str], fractional: bool = False) -> array:
+    """
+    Parses many Video Indexer timestamps at once
+    :param string_times: timestamps as written by Video Indexer
+    :param fractional: keep the fractional seconds
+    :return: array of doubles with the passed times converted to seconds
+    """
+    return array('d', [parse_time_string(string_time, fractional) for string_time in string_times])
 
 
 class TimeParser:
@@ -24,7 +57,6 @@ class TimeParser:
             self.interval_in_milliseconds = 10000
 
     def get_related_intervals(self, start, end):
-        # TODO: use binary search
         """
         This method returns a list of intervals based on start  and end time passed
         e.g.
@@ -35,40 +67,61 @@ class TimeParser:
         10 to 20 seconds
         20 to 30 seconds
         30 to 40 seconds
+        The interval boundaries are computed directly, in time proportional to their count.
         :param start: start time in milliseconds
         :param end: end time in milliseconds
         :return: list of intervals based on start  and end time passed
         """
+        interval = self.interval_in_milliseconds
+        start_ms = int(start)
         intervals = []
-        if (
-            end - start < self.interval_in_milliseconds
-        ):  # CASE: when appearance is within time interval
-            intervals.append(int(start) - int(start) % self.interval_in_milliseconds)
-        for i in range(int(start), int(end)):
-            if i % self.interval_in_milliseconds == 0:
-                intervals.append(i)
+        if end - start < interval:  # CASE: when appearance is within time interval
+            intervals.append(start_ms - start_ms % interval)
+        # every multiple of the interval in [start_ms, end)
+        intervals.extend(range(start_ms + (-start_ms) % interval, int(end), interval))
         return intervals
 
+    def get_related_intervals_many(self, starts, ends) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched get_related_intervals over many appearances
+        :param starts: start times in milliseconds
+        :param ends: end times in milliseconds
+        :return: (intervals, offsets), the intervals of the k-th appearance are
+        intervals[offsets[k]:offsets[k + 1]]
+        """
+        interval = self.interval_in_milliseconds
+        starts = np.asarray(starts, dtype=np.float64)
+        ends = np.asarray(ends, dtype=np.float64)
+        start_ms = np.trunc(starts).astype(np.int64)
+        end_ms = np.trunc(ends).astype(np.int64)
+
+        short = (ends - starts < interval).astype(np.int64)
+        first = start_ms + np.mod(-start_ms, interval)
+        multiples = np.maximum(end_ms - first + interval - 1, 0) // interval
+        counts = short + multiples
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        # position of every output value within its appearance, the short case comes first
+        appearance = np.repeat(np.arange(len(counts)), counts)
+        position = np.arange(offsets[-1]) - offsets[appearance] - short[appearance]
+        intervals = np.where(position < 0,
+                             (start_ms - np.mod(start_ms, interval))[appearance],
+                             first[appearance] + position * interval)
+        return intervals, offsets
+
     @staticmethod
     def string_time_to_seconds(string_time):
         """
-        This method converts string time to seconds
-        it uses regex to handle both of the following  cases formats:
+        This method converts string time to seconds, truncating the fractional part
+        it handles both of the following  cases formats:
         - %H:%M:%S
         - %H:%M:%S.%f
         :param string_time:
         :return: passed time converted to seconds
         """
 
-        string_time = string_time.split(".")[0]
-
-        if "." in string_time:
-            date_time = datetime.strptime(string_time, "%H:%M:%S.%f")
-        else:
-            date_time = datetime.strptime(string_time, "%H:%M:%S")
-
-        time_delta = date_time - datetime(1900, 1, 1)
-        return time_delta.total_seconds()  # seconds
+        return parse_time_string(string_time)
 
     @staticmethod
     def seconds_to_time_string(seconds: int) -> str:
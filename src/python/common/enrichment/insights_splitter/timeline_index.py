@@ -0,0 +1,107 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+from array import array
+from typing import Iterable
+from enrichment.insights_splitter.time_parser import parse_time_string
+
+
+class TimelineIndex:
+    """
+        The timeline index parses the "start" and "end" timestamps of every instance in the
+        Video Indexer insights once, and stores them as seconds in compact float arrays.
+        Consumers query the index by (insight key, item index, instance index) instead of
+        parsing the timestamp strings again.
+
+        For every key, instances are stored flat in traversal order (item by item, instance by
+        instance), "offsets" holds the position of the first instance of each item.
+    """
+
+    def __init__(self, vi_insights: dict, keys: Iterable[str] = None):
+        """
+        Args:
+            vi_insights (dict): raw VI insights JSON file
+            keys (Iterable[str], optional): insight keys to index. Defaults to every list of
+                                            insights found in the video.
+        """
+        insights = vi_insights['videos'][0]['insights']
+        if keys is None:
+            keys = insights.keys()
+
+        self._starts = {}
+        self._ends = {}
+        self._items = {}
+        self._offsets = {}
+
+        for key in keys:
+            collection = insights.get(key, None)
+            if not isinstance(collection, list):
+                continue
+            starts = array('d')
+            ends = array('d')
+            items = array('q')
+            offsets = array('q', [0])
+            for item_index, info_piece in enumerate(collection):
+                instances = info_piece.get('instances', []) if isinstance(info_piece, dict) else []
+                for instance in instances:
+                    starts.append(parse_time_string(instance['start']))
+                    ends.append(parse_time_string(instance['end']))
+                    items.append(item_index)
+                offsets.append(len(starts))
+
+            self._starts[key] = starts
+            self._ends[key] = ends
+            self._items[key] = items
+            self._offsets[key] = offsets
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._starts
+
+    def starts(self, key: str) -> array:
+        """
+            Start time in seconds of every instance of the key, in traversal order
+        """
+        return self._starts[key]
+
+    def ends(self, key: str) -> array:
+        """
+            End time in seconds of every instance of the key, in traversal order
+        """
+        return self._ends[key]
+
+    def items(self, key: str) -> array:
+        """
+            Index in the insights collection of the item owning each instance of the key
+        """
+        return self._items[key]
+
+    def offsets(self, key: str) -> array:
+        """
+            Position of the first instance of each item of the key in the flat arrays
+        """
+        return self._offsets[key]
+
+    def start(self, key: str, item_index: int, instance_index: int) -> float:
+        """
+        Args:
+            key (str): Name of the insight
+            item_index (int): Index of the item in the insights collection
+            instance_index (int): Index of the instance in the item's instances
+
+        Returns:
+            float: Start time of the instance in seconds
+        """
+        return self._starts[key][self._offsets[key][item_index] + instance_index]
+
+    def end(self, key: str, item_index: int, instance_index: int) -> float:
+        """
+        Args:
+            key (str): Name of the insight
+            item_index (int): Index of the item in the insights collection
+            instance_index (int): Index of the instance in the item's instances
+
+        Returns:
+            float: End time of the instance in seconds
+        """
+        return self._ends[key][self._offsets[key][item_index] + instance_index]
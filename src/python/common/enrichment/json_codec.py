@@ -0,0 +1,134 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+JSON codec of the pipeline, using the fastest library available, picked at import time: orjson, then ujson,
+then the json module of the standard library.
+- loads accepts str or bytes, as json.loads does.
+- dumps returns compact UTF-8 bytes, ready for a blob upload. Values the encoders do not know, e.g. datetimes,
+  are written as str(value), as json.dumps(value, default=str) does.
+Documents the faster decoders reject, e.g. NaN, are decoded by the json module. Values the faster encoders reject, or
+write differently, are encoded by the json module: orjson writes NaN and Infinity as null and the Enum members as their
+value, so the values holding a non-finite float or an Enum member are written by json.dumps whatever the backend.
+All the backends thus accept the same documents and write documents decoding to the same values. Only the formatting
+of the floats may differ, and orjson decodes the integers of more than 64 bits as floats.
+"""
+from enum import Enum
+import json
+import math
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _json_loads(document: Union[str, bytes]) -> Any:
+    return json.loads(document)
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8", "surrogatepass")
+
+
+# types of the values which hold neither a non-finite float nor an Enum member
+_PLAIN_SCALARS = frozenset({str, int, bool, type(None)})
+
+
+def _needs_json_encoder(value: Any) -> bool:
+    """Tells if the value holds a non-finite float or an Enum member, written differently by the faster encoders."""
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        item_type = type(item)
+        if item_type in _PLAIN_SCALARS:
+            continue
+        if item_type is dict:
+            stack.extend(item.values())
+        elif item_type is list or item_type is tuple:
+            stack.extend(item)
+        elif item_type is float:
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, Enum):
+            return True
+    return False
+
+
+def _orjson_loads(document: Union[str, bytes]) -> Any:
+    try:
+        return orjson.loads(document)
+    except orjson.JSONDecodeError:
+        return _json_loads(document)
+
+
+# datetimes and dataclasses are given to default, as json.dumps does, instead of being serialized by orjson
+_ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+                   if orjson is not None else 0)
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    if _needs_json_encoder(value):
+        return _json_dumps(value)
+    try:
+        return orjson.dumps(value, default=str, option=_ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        return _json_dumps(value)
+
+
+def _ujson_loads(document: Union[str, bytes]) -> Any:
+    try:
+        return ujson.loads(document)
+    except (ujson.JSONDecodeError, ValueError):
+        return _json_loads(document)
+
+
+def _ujson_dumps(value: Any) -> bytes:
+    if _needs_json_encoder(value):
+        return _json_dumps(value)
+    try:
+        return ujson.dumps(value, default=str, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+    except (OverflowError, TypeError, ValueError):
+        return _json_dumps(value)
+
+
+# (loads, dumps) of every available backend, fastest first
+BACKENDS = {}
+if orjson is not None:
+    BACKENDS["orjson"] = (_orjson_loads, _orjson_dumps)
+if ujson is not None:
+    BACKENDS["ujson"] = (_ujson_loads, _ujson_dumps)
+BACKENDS["json"] = (_json_loads, _json_dumps)
+
+BACKEND = next(iter(BACKENDS))
+_loads, _dumps = BACKENDS[BACKEND]
+
+
+def loads(document: Union[str, bytes]) -> Any:
+    """
+        Decodes a JSON document
+    Args:
+        document (Union[str, bytes]): JSON document, bytes in UTF-8
+
+    Returns:
+        Any: the decoded value
+    """
+    return _loads(document)
+
+
+def dumps(value: Any) -> bytes:
+    """
+        Encodes a value as a JSON document, the values the encoder does not know being written as str(value)
+    Args:
+        value (Any): value to encode
+
+    Returns:
+        bytes: UTF-8 JSON document
+    """
+    return _dumps(value)
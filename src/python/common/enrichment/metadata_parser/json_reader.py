@@ -2,11 +2,11 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
-import json
 import logging as log
 from azure.core.exceptions import ResourceNotFoundError
 from azure.storage.blob import ContainerClient
 from typing import Union
+from enrichment import json_codec
 import os
 
 log_text = os.getenv("LOG_PREFIX")
@@ -35,4 +35,4 @@ def json_reader(container_client: ContainerClient, file_name: str) -> Union[dict
         return None
 
     json_file = json_file.readall()
-    return json.loads(json_file)
+    return json_codec.loads(json_file)
@@ -0,0 +1,151 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Process wide lookup tables for language names and codes, built lazily from the assets once per worker.
+
+language_codes.json and vi_supported_languages.csv are the source of truth. They are compiled into
+language_tables.json, holding only the mappings used at runtime, which is loaded instead when present.
+Regenerate it after editing them with
+    python -m enrichment.metadata_parser.language_lookup
+"""
+import csv
+import json
+import os
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import FrozenSet, Mapping
+from enrichment import json_codec
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
+LANGUAGE_CODES_PATH = os.path.join(ASSETS_DIR, "language_codes.json")
+VI_SUPPORTED_LANGUAGES_PATH = os.path.join(ASSETS_DIR, "vi_supported_languages.csv")
+COMPILED_TABLES_PATH = os.path.join(ASSETS_DIR, "language_tables.json")
+
+
+@dataclass(frozen=True)
+class LanguageTables:
+    """Immutable language lookup tables"""
+    # lower case language name -> alpha 2 code, or alpha 3 when there is no alpha 2 code
+    language_codes: Mapping[str, str]
+    # lower case language names
+    language_names: FrozenSet[str]
+    # alpha 2/3 code -> Azure Video Indexer language-locale code
+    vi_language_locales: Mapping[str, str]
+
+
+_tables = None
+_tables_lock = threading.Lock()
+
+
+def _load_language_codes(path: str = LANGUAGE_CODES_PATH) -> dict:
+    """
+        Maps every language name of language_codes.json to its code. There are two types of language codes:
+            - Alpha 2 which is a 2 character code used for very common language e.g. english = en, french = fr
+            - Alpha 3 which is a 3 character code which every language has regardless of how much people speak it e.g tetum = tet
+        The dictionary will take one or the other depending on whether an Alpha 2 code exists.
+    Args:
+        path (str): Path to language_codes.json
+
+    Returns:
+        dict: lower case language name -> language code
+    """
+    with open(path, encoding="utf8") as f:
+        language_codes_json = json.load(f)
+    language_codes = {}
+    for code in language_codes_json['language_codes']:
+        language_codes[code['name'].lower()] = code['alpha_2'] if 'alpha_2' in code else code['alpha_3']
+    return language_codes
+
+
+def _load_vi_language_locales(path: str = VI_SUPPORTED_LANGUAGES_PATH) -> dict:
+    """
+        Maps the 2/3 letter code of every Azure Video Indexer supported language-locale to the language-locale.
+        When a language has several locales, the last one of the file is kept.
+    Args:
+        path (str): Path to vi_supported_languages.csv
+
+    Returns:
+        dict: language code -> language-locale code
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return {row['LanguageCodeLocale'].split('-')[0]: row['LanguageCodeLocale'] for row in csv.DictReader(f)}
+
+
+def _load_source_tables() -> dict:
+    return {'language_codes': _load_language_codes(), 'vi_language_locales': _load_vi_language_locales()}
+
+
+def compile_language_tables(path: str = COMPILED_TABLES_PATH) -> dict:
+    """
+        Compiles the language assets into a JSON artifact, loaded at runtime instead of the assets.
+        One entry per line and sorted keys keep the artifact reviewable in a diff
+    Args:
+        path (str): Destination of the artifact
+
+    Returns:
+        dict: The compiled tables
+    """
+    source_tables = _load_source_tables()
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        json.dump(source_tables, f, ensure_ascii=False, indent=1, sort_keys=True)
+        f.write("\n")
+    return source_tables
+
+
+def _load_compiled_tables(path: str = COMPILED_TABLES_PATH) -> dict:
+    """
+    Returns:
+        dict: The compiled tables, None when there is no artifact
+    """
+    try:
+        with open(path, "rb") as f:
+            return json_codec.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _build_language_tables(from_source: bool = False) -> LanguageTables:
+    raw_tables = None if from_source else _load_compiled_tables()
+    if raw_tables is None:
+        raw_tables = _load_source_tables()
+    language_codes = raw_tables['language_codes']
+    return LanguageTables(language_codes=MappingProxyType(language_codes),
+                          language_names=frozenset(language_codes),
+                          vi_language_locales=MappingProxyType(raw_tables['vi_language_locales']))
+
+
+def get_language_tables() -> LanguageTables:
+    """
+        Returns the language lookup tables, reading the assets on the first call only
+    Returns:
+        LanguageTables: Shared immutable tables
+    """
+    global _tables
+    tables = _tables
+    if tables is None:
+        with _tables_lock:
+            if _tables is None:
+                _tables = _build_language_tables()
+            tables = _tables
+    return tables
+
+
+def reload(from_source: bool = False) -> LanguageTables:
+    """
+        Reads the tables again, e.g. after the assets were updated, and replaces the shared tables
+    Args:
+        from_source (bool): Ignore the compiled artifact and read language_codes.json and vi_supported_languages.csv
+
+    Returns:
+        LanguageTables: The new tables
+    """
+    global _tables
+    with _tables_lock:
+        _tables = _build_language_tables(from_source)
+        return _tables
+
+
+if __name__ == "__main__":
+    compile_language_tables()
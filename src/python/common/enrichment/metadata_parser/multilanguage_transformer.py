@@ -2,62 +2,162 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
-import json
 import re
-import pandas as pd
+from functools import lru_cache
+from typing import Iterable, List
 from .assets.static import DEFAULT_LANGUAGE_VALUES
-import os
+from .language_lookup import get_language_tables
+
+# Every cleanup of the video language strings, applied in a single pass: common misspellings,
+# noise words which are dropped and separators which are replaced by a space
+_CLEANUP_REPLACEMENTS = {
+    'englsih': 'english',
+    'turksih': 'turkish',
+    'speechh': '',
+    'speech': '',
+    'part': '',
+    '-': ' ',
+    ',': ' ',
+    '//': ' ',
+    '/': ' ',
+    '&': ' ',
+}
+_CLEANUP_PATTERN = re.compile('|'.join(re.escape(word) for word in _CLEANUP_REPLACEMENTS))
+
+
+def clean_language_tokens(text: str) -> List[str]:
+    """
+        Lower cases and cleans a language string, then splits it into tokens
+    Args:
+        text (str): Language string
+
+    Returns:
+        List[str]: Cleaned tokens
+    """
+    return _CLEANUP_PATTERN.sub(lambda match: _CLEANUP_REPLACEMENTS[match.group(0)], text.lower()).split()
+
+
+class LanguageNameMatcher:
+    """Finds language names, including multi word ones, in cleaned tokens with a token trie"""
+
+    # key of the trie nodes where a language name ends
+    _NAME = ''
+
+    def __init__(self, language_names: Iterable[str]):
+        self._trie = {}
+        # names cleaned to the same tokens, e.g. 'gana' and '//gana', match as the name equal to its tokens,
+        # else as the first name in sorted order, whatever the order of language_names
+        for name in sorted(language_names):
+            tokens = clean_language_tokens(name)
+            if not tokens:
+                continue
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            if self._NAME not in node or name == " ".join(tokens):
+                node[self._NAME] = name
+
+    def find(self, tokens: List[str]) -> List[str]:
+        """
+            Finds the longest language name starting at every token, left to right
+        Args:
+            tokens (List[str]): Cleaned tokens
+
+        Returns:
+            List[str]: Distinct language names, in order of appearance
+        """
+        found = dict()
+        position = 0
+        while position < len(tokens):
+            node = self._trie
+            name, name_end = None, position + 1
+            for end in range(position, len(tokens)):
+                node = node.get(tokens[end])
+                if node is None:
+                    break
+                if self._NAME in node:
+                    name, name_end = node[self._NAME], end + 1
+            if name is not None:
+                found[name] = None
+            position = name_end
+        return list(found)
+
+
+@lru_cache(maxsize=8)
+def _language_name_matcher(language_names: frozenset) -> LanguageNameMatcher:
+    return LanguageNameMatcher(language_names)
 
 
 class MultilanguageTransformation:
 
     def __init__(self):
         self.language_dict = list()
+        self._language_set = None
+        self._matcher = None
+
+    @property
+    def language_set(self) -> frozenset:
+        """Language names to look for, all the known languages unless set"""
+        if self._language_set is None:
+            self.language_set = get_language_tables().language_names
+        return self._language_set
+
+    @language_set.setter
+    def language_set(self, language_names: Iterable[str]):
+        self._language_set = frozenset(language_names)
+        self._matcher = _language_name_matcher(self._language_set)
 
     def _get_language_codes(self):
         """
-        This method extracts the language codes from the json in the repo and creates a dictionary. There are two types of language codes:
+        This method returns the shared dictionary of languages and their codes, built once per process from
+        the json in the repo. There are two types of language codes:
             - Alpha 2 which is a 2 character code used for very common language e.g. english = en, french = fr
             - Alpha 3 which is a 3 character code which every language has regardless of how much people speak it e.g tetum = tet
         The dictionary will take one or the other depending on whether an Alpha 2 code exists.
-        Creates a list of all the languages that exists
-        returns a dictionary of languages and their codes as well as a list on the languages
+        Sets the set of all the languages that exists
+        returns a read only dictionary of languages and their codes
         """
-        language_codes_path = f"{os.path.dirname(__file__)}/assets/language_codes.json"
-        with open(language_codes_path, encoding="utf8") as f:
-            language_codes_json = json.load(f)
-        lang_dict = {}
-        for code in language_codes_json['language_codes']:
-            code_name = code['alpha_2'] if 'alpha_2' in code else code['alpha_3']
-            lang_dict[code['name'].lower()] = code_name
-
-        self.language_set = list(lang_dict.keys())
-        return lang_dict
+        tables = get_language_tables()
+        self.language_set = tables.language_names
+        return tables.language_codes
 
     def clean_video_language(self, video_language):
         """
         In this method we extract the languages if any from the video_language string that we get from the json file.
-        First by cleaning the string, there are cases where common words such as 'english' are spelt incorrectly.
-        Then we extract the known languages into a list if there are any present using the list of languages (languages_set).
+        First by cleaning the string in a single pass, there are cases where common words such as 'english' are spelt incorrectly.
+        Then we extract the known languages into a list if there are any present using the list of languages (languages_set),
+        multi word names such as 'scottish gaelic' included.
         In the case there is nothing useful in the original string, we create a list with 'No language'
         returns list of strings
         """
-        video_language = video_language.lower()
         if video_language != '':
-            video_language = video_language.lower()
-            video_language = re.sub(
-                'englsih|englsihspeech', 'english', video_language)
-            video_language = re.sub(
-                'turksih', 'turkish', video_language)
-            video_language = re.sub('speechh|speech|part', '', video_language)
-            video_language = re.sub('-|,|//|/|&', ' ', video_language)
-            video_language = re.sub('(.)\1+', '', video_language)
-            list_languages = list(
-                set(video_language.lower().split(' ')) & set(self.language_set))
+            list_languages = self._matcher_for_language_set().find(clean_language_tokens(video_language))
         else:
             list_languages = ['No Language']
         return list_languages
 
+    def clean_video_languages(self, video_languages: Iterable[str]) -> List[List[str]]:
+        """
+            Batch version of clean_video_language, e.g. for backfills. Repeated strings are cleaned once.
+        Args:
+            video_languages (Iterable[str]): Language strings as identified in the metadata files
+
+        Returns:
+            List[List[str]]: The languages of every string
+        """
+        cleaned = dict()
+        results = []
+        for video_language in video_languages:
+            if video_language not in cleaned:
+                cleaned[video_language] = self.clean_video_language(video_language)
+            results.append(list(cleaned[video_language]))
+        return results
+
+    def _matcher_for_language_set(self) -> LanguageNameMatcher:
+        if self._matcher is None:
+            self.language_set = get_language_tables().language_names
+        return self._matcher
+
     def categorizing_multi_language_code(self, list_languages):
         """
         This method categorizes the newly cleaned video_language string so that the Azure Video Indexer api can be updated with the correct language setting:
@@ -84,8 +184,6 @@ class MultilanguageTransformation:
         Returns:
             str: Azure Video Indexer supported language-locale format
         """
-        path_to_avam_supported_languages = f"{os.path.dirname(__file__)}/assets/vi_supported_languages.csv"
-
         # Return the default predefined languages for languages with multiple locals
         if language_code in DEFAULT_LANGUAGE_VALUES:
             return DEFAULT_LANGUAGE_VALUES[language_code]
@@ -93,14 +191,8 @@ class MultilanguageTransformation:
         if language_code in ('auto', 'multi'):
             return language_code
 
-        # For non default values, parse the Azure Video Indexer code
-        vi_supported_languages = pd.read_csv(path_to_avam_supported_languages)
-        # parse language-locale format into 2/3 letter code
-        vi_supported_languages['language_code'] = vi_supported_languages['LanguageCodeLocale'].apply(
-            lambda x: x.split('-')[0])
-        vi_supported_dict = vi_supported_languages[[
-            'language_code', 'LanguageCodeLocale']].set_index('language_code').to_dict()
-        return vi_supported_dict['LanguageCodeLocale'].get(language_code, 'auto')
+        # For non default values, look up the Azure Video Indexer code
+        return get_language_tables().vi_language_locales.get(language_code, 'auto')
 
     def language_string_to_language_code(self, video_language: str) -> str:
         """
@@ -110,7 +202,7 @@ class MultilanguageTransformation:
         Returns:
             str: 2 or 3 letter language code
         """
-        # initialize all available language codes, #TODO: how do we add additional languages to the file?
+        # all available language codes, loaded once per process, see language_lookup.reload
         self.language_dict = self._get_language_codes()
 
         # clean the string
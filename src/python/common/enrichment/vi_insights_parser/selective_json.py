@@ -0,0 +1,123 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+
+Field projection JSON decoder: materializes only the selected paths of a JSON document. The values which are not
+selected are decoded a small piece at a time and dropped right away, so that the peak memory of a large document
+is its text plus the selected values.
+
+A projection describes the values to keep:
+- True keeps the whole value, decoded by the json module.
+- A dictionary keeps only the listed keys of an object, or of every object of a list, each with its own projection.
+  The key '*' gives the projection of the keys which are not listed. Keys without projection are skipped.
+- False skips the value.
+Ex. {"videos": {"insights": {"*": True, "shots": False}}} keeps all the insights of every video, except the shots.
+"""
+import json
+import re
+from json.decoder import scanstring
+from typing import Tuple, Union
+
+ALL_KEYS = "*"
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# projection of the values decoded by the json module and dropped right away
+_DROP = object()
+# projection of the members of a skipped object, decoded and dropped one at a time like the elements of a skipped array,
+# so that skipping a value takes the memory of its largest member only
+_DROP_MEMBERS = {ALL_KEYS: _DROP}
+
+
+def loads_selected(document: Union[str, bytes], projection: Union[dict, bool]):
+    """
+        Decodes only the selected values of a JSON document. The skipped values are decoded too, so a malformed one
+        raises a JSONDecodeError, but one member at a time and dropped right away.
+    Args:
+        document (Union[str, bytes]): JSON document, bytes in UTF-8, UTF-16 or UTF-32 as for json.loads
+        projection (Union[dict, bool]): values to keep, see the module documentation
+
+    Returns:
+        The decoded document, without the skipped values
+    """
+    if isinstance(document, (bytes, bytearray)):
+        document = document.decode(json.detect_encoding(document), "surrogatepass")
+    if document.startswith("\ufeff"):
+        raise json.JSONDecodeError("Unexpected UTF-8 BOM (decode using utf-8-sig)", document, 0)
+    value, end = _decode(document, _WHITESPACE.match(document, 0).end(), projection)
+    end = _WHITESPACE.match(document, end).end()
+    if end != len(document):
+        raise json.JSONDecodeError("Extra data", document, end)
+    return value
+
+
+def _decode(document: str, index: int, projection) -> Tuple[object, int]:
+    """Decodes the selected parts of the value starting at index, returning it with the index following it."""
+    if projection is True:
+        return _decoder.raw_decode(document, index)
+    if projection is _DROP:
+        return None, _decoder.raw_decode(document, index)[1]
+    if projection is False:
+        return None, _skip(document, index)
+    first = document[index:index + 1]
+    if first == "{":
+        return _decode_object(document, index + 1, projection)
+    if first == "[":
+        return _decode_array(document, index + 1, projection)
+    # a projection on a scalar keeps it
+    return _decoder.raw_decode(document, index)
+
+
+def _decode_object(document: str, index: int, projection: dict) -> Tuple[dict, int]:
+    obj = {}
+    index = _WHITESPACE.match(document, index).end()
+    if document[index:index + 1] == "}":
+        return obj, index + 1
+    default = projection.get(ALL_KEYS, False)
+    while True:
+        if document[index:index + 1] != '"':
+            raise json.JSONDecodeError("Expecting property name enclosed in double quotes", document, index)
+        key, index = scanstring(document, index + 1)
+        index = _WHITESPACE.match(document, index).end()
+        if document[index:index + 1] != ":":
+            raise json.JSONDecodeError("Expecting ':' delimiter", document, index)
+        index = _WHITESPACE.match(document, index + 1).end()
+        key_projection = projection.get(key, default)
+        if key_projection is False:
+            index = _skip(document, index)
+        else:
+            obj[key], index = _decode(document, index, key_projection)
+        index = _WHITESPACE.match(document, index).end()
+        delimiter = document[index:index + 1]
+        if delimiter == "}":
+            return obj, index + 1
+        if delimiter != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", document, index)
+        index = _WHITESPACE.match(document, index + 1).end()
+
+
+def _decode_array(document: str, index: int, projection) -> Tuple[list, int]:
+    values = []
+    index = _WHITESPACE.match(document, index).end()
+    if document[index:index + 1] == "]":
+        return values, index + 1
+    while True:
+        value, index = _decode(document, index, projection)
+        values.append(value)
+        index = _WHITESPACE.match(document, index).end()
+        delimiter = document[index:index + 1]
+        if delimiter == "]":
+            return values, index + 1
+        if delimiter != ",":
+            raise json.JSONDecodeError("Expecting ',' delimiter", document, index)
+        index = _WHITESPACE.match(document, index + 1).end()
+
+
+def _skip(document: str, index: int) -> int:
+    """Returns the index following the value starting at index, decoding and dropping its members one at a time."""
+    first = document[index:index + 1]
+    if first == "{":
+        return _decode_object(document, index + 1, _DROP_MEMBERS)[1]
+    if first == "[":
+        return _decode_array(document, index + 1, _DROP)[1]
+    return _decoder.raw_decode(document, index)[1]
@@ -2,23 +2,90 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
-import json
 import re
 from logging import log
 import os
+from typing import Tuple
+from enrichment import json_codec
+from enrichment.vi_insights_parser.selective_json import ALL_KEYS, loads_selected
 
 log_text = os.getenv("LOG_PREFIX")
 
 
+# Paths of the Video Indexer insights read by parse_vi_insights, the only ones decoded by a selective load.
+# Everything else, e.g. faces thumbnails and instances, shots key frames or the visual content moderation, is skipped.
+VI_INSIGHTS_PROJECTION = {
+    "accountId": True,
+    "name": True,
+    "id": True,
+    "durationInSeconds": True,
+    "created": True,
+    "description": True,
+    "videos": {
+        "thumbnailId": True,
+        "insights": {
+            "languageAutoDetectMode": True,
+            "languages": True,
+            "namedPeople": True,
+            "namedLocations": True,
+            "brands": True,
+            "topics": True,
+            "labels": True,
+            "transcript": True,
+            "ocr": True,
+            "faces": {ALL_KEYS: True, "thumbnails": False, "instances": False},
+        },
+    },
+}
+
+
+# Collections of the video insights copied to the parsed insights: (Video Indexer key, parsed insights field)
+VI_COLLECTIONS = [
+    ("namedPeople", "named_people"),
+    ("namedLocations", "named_locations"),
+    ("brands", "brands"),
+    ("topics", "topics"),
+    ("labels", "labels"),
+    ("transcript", "transcript"),
+    ("faces", "faces"),
+    ("ocr", "ocr"),
+]
+
+# Fields of the parsed insights whose names are extracted for semantic search, as field + "_names"
+FIELDS_TO_EXTRACT_NAMES = [
+    "brands",
+    "topics",
+    "labels",
+    "faces",
+    "named_people",
+    "named_locations",
+]
+
+# Keys of the face insights left out of the parsed insights
+FACE_KEYS_TO_REMOVE = ("thumbnails", "instances")
+
+
 class ViInsightsParser:
-    def load_vi_insights(self, filepath):
+    def load_vi_insights(self, filepath, selective=False):
         """
-        This method takes the filepath of the Video Indexer insights json and loads the data as raw_insights
+        This method takes the filepath of the Video Indexer insights json and loads the data as raw_insights.
+        With selective, only the values needed by parse_vi_insights are kept, see loads_vi_insights
         """
-        with open(filepath, "r") as f:
-            raw_insights = json.load(f)
+        with open(filepath, "rb") as f:
+            raw_insights = self.loads_vi_insights(f.read(), selective)
         return raw_insights
 
+    @staticmethod
+    def loads_vi_insights(document, selective=False):
+        """
+        This method decodes the Video Indexer insights json document (str or bytes) as raw_insights.
+        With selective, only the values needed by parse_vi_insights are kept, see VI_INSIGHTS_PROJECTION,
+        which cuts the parse time and the peak memory of large documents
+        """
+        if selective:
+            return loads_selected(document, VI_INSIGHTS_PROJECTION)
+        return json_codec.loads(document)
+
     @staticmethod
     def _check_if_multi_language(video_insights: dict) -> bool:
         """
@@ -47,72 +114,57 @@ class ViInsightsParser:
     @staticmethod
     def extract_faces_insights(video_insights):
         """
-        This method removes the thumbnails and the instances from the face insights
+        This method returns copies of the face insights without the thumbnails and the instances,
+        the video insights are left untouched
         """
-        face_insights = video_insights["faces"]
-        for face in face_insights:
-            if "thumbnails" in face:
-                del face["thumbnails"]
-            if "instances" in face:
-                del face["instances"]
-
-        return face_insights
+        return ViInsightsParser._project_collection(video_insights["faces"], FACE_KEYS_TO_REMOVE)[0]
 
     def check_video_insights_value(self, insights, key):
         """
         This methods checks if the key we are looking for exists or returns an empty list.
         If the language of the video is multi then we will replace the transcript
-        with an empty list.
+        with an empty list. The collection returned is a new list, the insights are left untouched.
         """
         video_insights = insights["videos"][0]["insights"]
-        if key not in video_insights:
-            return list()
-        elif key == "transcript" and self.is_multilanguage_video(video_insights):
+        if key == "transcript" and self.is_multilanguage_video(video_insights):
             return list()
-        elif key == "faces":
-            return self.extract_faces_insights(video_insights)
-        else:
-            return video_insights[key]
+        keys_to_remove = FACE_KEYS_TO_REMOVE if key == "faces" else ()
+        return ViInsightsParser._project_collection(video_insights.get(key), keys_to_remove)[0]
 
     @staticmethod
-    def _extract_names_for_semantic_search(insights: dict, field: str) -> dict:
-        """Extract names from a collection of data structures (insights[field]) and create a new
-            field only with those names (insights[field + "_names"]).
+    def _project_collection(items: list, keys_to_remove: Tuple[str, ...] = ()) -> Tuple[list, list]:
+        """Copies a collection of the video insights, and extracts the names of its elements for semantic search
+            in the same traversal.
 
         Args:
-            insights (dict): Dictionary where to find the collection of complex structures.
-            field (str): Id in the dictionary where the collection of complex structures is (insights[field]).
+            items (list): Collection of complex structures of the video insights, left untouched.
+            keys_to_remove (Tuple[str, ...], optional): Keys removed from the copies of the structures. Defaults to none,
+                the structures themselves are shared by the copy of the collection.
 
         Returns:
-            dict: Original dictionary with one extra entry (insights[field + "_names"]) with the collection
-                of names extracted from the collection of complex structures.
+            Tuple[list, list]: New list with the structures, and the list of their names.
         """
+        projected = []
         names = []
-        for elem in insights.get(field, []):
+        for elem in items or []:
+            if keys_to_remove:
+                elem = {key: value for key, value in elem.items() if key not in keys_to_remove}
+            projected.append(elem)
             name = elem.get("name", None)
             if name is not None:
                 names.append(name)
-        # This assumes that insights[field + "_names"] did not exist before,
-        # which is reasonable given how the insights are reshaped in this class.
-        insights[f"{field}_names"] = names
-        return insights
+        return projected, names
 
     def parse_vi_insights(self, raw_insights):
         """
         This method takes the raw_insights that we have loaded then we check whether each key is
         present (in some cases if not we check if they appear elsewhere we take
         the values from there). It then creates a new dictionary with only the info we want ready
-        to be saved to a new json
+        to be saved to a new json.
+        raw_insights is not modified, and the collections of the new dictionary are new lists, so that the
+        same raw_insights can be shared with the splitter and the combiner
         """
         avam_insights = {}
-        list_of_video_insights = [
-            "brands",
-            "topics",
-            "labels",
-            "transcript",
-            "faces",
-            "ocr",
-        ]
 
         avam_insights["account_id"] = raw_insights.get("accountId", "")
         avam_insights["videoName"] = raw_insights.get("name", "")
@@ -121,29 +173,21 @@ class ViInsightsParser:
         avam_insights["created_at"] = raw_insights.get("created", "")
         avam_insights["description"] = raw_insights.get("description", "")
         avam_insights["thumbnailId"] = raw_insights["videos"][0].get("thumbnailId", "")
-        avam_insights["named_people"] = self.check_video_insights_value(
-            raw_insights, "namedPeople"
-        )
-        avam_insights["named_locations"] = self.check_video_insights_value(
-            raw_insights, "namedLocations"
-        )
 
-        for each in list_of_video_insights:
-            avam_insights[each] = self.check_video_insights_value(raw_insights, each)
-
-        # Extract the string names of each field to enable semantic search.
-        fields_to_extract_names = [
-            "brands",
-            "topics",
-            "labels",
-            "faces",
-            "named_people",
-            "named_locations",
-        ]
-        for field in fields_to_extract_names:
-            avam_insights = ViInsightsParser._extract_names_for_semantic_search(
-                avam_insights, field
-            )
+        video_insights = raw_insights["videos"][0]["insights"]
+        multi_language = self.is_multilanguage_video(video_insights)
+        names = {}
+        # A single traversal of every collection copies it and extracts its names
+        for key, field in VI_COLLECTIONS:
+            items = video_insights.get(key)
+            if key == "transcript" and multi_language:
+                items = None
+            keys_to_remove = FACE_KEYS_TO_REMOVE if key == "faces" else ()
+            avam_insights[field], names[field] = ViInsightsParser._project_collection(items, keys_to_remove)
+
+        # Add the string names of each field to enable semantic search.
+        for field in FIELDS_TO_EXTRACT_NAMES:
+            avam_insights[f"{field}_names"] = names[field]
 
         return avam_insights
 
@@ -153,11 +197,11 @@ class ViInsightsParser:
         a new json
         """
         file_name = re.sub(r".mp4", "", avam_insights["name"])
-        json_object = json.dumps(avam_insights)
+        json_object = json_codec.dumps(avam_insights)
 
         new_filename = file_name + ".json"
 
-        with open(new_filename, "w") as outfile:
+        with open(new_filename, "wb") as outfile:
             outfile.write(json_object)
 
         log.info(f"{log_text} {new_filename} with insights saved")
@@ -8,9 +8,10 @@ setup(
     name='enrichment',
     version='0.0.1',
     author='Microsoft CSE',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     package_data={
-        'metadata_parser.assets': ['language_codes.json', 'vi_supported_languages.csv'],
+        # language_lookup reads its assets next to the module, so they are installed inside the package
+        'enrichment.metadata_parser.assets': ['language_codes.json', 'vi_supported_languages.csv', 'language_tables.json'],
         'entity_extractor.assets:': ['acromyns_lib_congress.json', 'caps_exeptions.json']
 
     },
@@ -21,7 +22,7 @@ setup(
         ('insights_splitter', ['enrichment/insights_splitter/splitter_configuration.jsonc'])
     ],
     install_requires=[
-        "pandas",
+        "numpy",
         "azure-storage-blob",
         "azure-core",
         "python-dateutil",
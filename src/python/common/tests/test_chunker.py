@@ -0,0 +1,82 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import random
+import pytest
+from enrichment.entity_extractor.chunker import Chunk, ChunkSpan, TextChunker
+
+WORDS = ["Paris", "the", "United", "Nations", "met", "in", "a", "verylongwordwithoutanyspaceatall", "on", "Monday"]
+
+
+def random_texts(seed, count=5):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        sentences = []
+        for _ in range(rng.randint(0, 6)):
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 12)))
+            sentences.append(sentence + rng.choice([".", "!", "?", '."', ""]))
+        texts.append(rng.choice([" ", "  ", "\n"]).join(sentences))
+    return texts
+
+
+@pytest.mark.parametrize("max_length", [1, 8, 20, 64, 5120])
+@pytest.mark.parametrize("seed", range(20))
+def test_chunk_invariants(max_length, seed):
+    texts = random_texts(seed)
+    chunks = TextChunker(max_length).chunk(texts, [f"field{i}" for i in range(len(texts))])
+
+    assert all(0 < len(chunk.text) <= max_length for chunk in chunks)
+    # nothing is lost, in order
+    assert "".join("".join(chunk.text.split()) for chunk in chunks) == "".join("".join(text.split()) for text in texts)
+    for chunk in chunks:
+        for span in chunk.spans:
+            source_text = texts[int(span.source[len("field"):])]
+            assert chunk.text[span.chunk_offset:span.chunk_offset + span.length] == \
+                source_text[span.source_offset:span.source_offset + span.length]
+            assert chunk.to_source(span.chunk_offset + span.length - 1) == (span.source, span.source_offset + span.length - 1)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_chunk_keeps_sentences(seed):
+    """Sentences shorter than a chunk are never split"""
+    texts = random_texts(seed)
+    chunks = TextChunker(64).chunk(texts)
+    for text in texts:
+        for sentence in text.replace("\n", " ").replace('." ', '."|').replace(". ", ".|").replace("! ", "!|").replace("? ", "?|").split("|"):
+            sentence = sentence.strip()
+            if 0 < len(sentence) <= 64 and "\n" not in sentence:
+                assert any(sentence in chunk.text.replace("\n", " ") for chunk in chunks)
+
+
+def test_chunk_packs_greedily():
+    chunker = TextChunker(30)
+    chunks = chunker.chunk(["One. Two.", None, "Three is here. Four!", "Five is a sentence too long for a chunk."])
+    assert [chunk.text for chunk in chunks] == ["One. Two. Three is here. Four!", "Five is a sentence too long", "for a chunk."]
+    assert chunks[0].to_source(10) == (2, 0)
+    assert chunks[0].to_source(25) == (2, 15)
+    assert chunks[2].to_source(0) == (3, 28)
+    assert chunks[0].span_containing(10, 5) == chunks[0].spans[1]
+    assert chunks[0].span_containing(5, 4) == chunks[0].spans[0]
+    # "Two. Three" crosses the space joining the texts
+    assert chunks[0].span_containing(5, 10) is None
+
+
+def test_chunk_to_source_many_spans():
+    """to_source bisects the offsets of the spans computed with the chunk, which equality and repr leave out"""
+    spans = tuple(ChunkSpan(source=i, source_offset=10, chunk_offset=4 * i, length=3) for i in range(1000))
+    chunk = Chunk(text=" ".join(["abc"] * 1000), spans=spans)
+    assert [chunk.to_source(4 * i + 2) for i in range(1000)] == [(i, 12) for i in range(1000)]
+    assert chunk == Chunk(text=chunk.text, spans=spans)
+    assert repr(chunk) == f"Chunk(text={chunk.text!r}, spans={spans!r})"
+
+
+@pytest.mark.parametrize("texts", [[], [None], [""], ["  \n "]])
+def test_chunk_empty(texts):
+    assert TextChunker(10).chunk(texts) == []
+
+
+def test_invalid_max_length():
+    with pytest.raises(Exception):
+        TextChunker(0)
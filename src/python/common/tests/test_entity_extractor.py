@@ -2,41 +2,16 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
+import random
+import time
 import pytest
 import enrichment.entity_extractor.entity_extractor as entity_extractor
+import enrichment.entity_extractor.utils as entity_extractor_utils
 from azure.ai.textanalytics import CategorizedEntity
-
-
-@pytest.mark.parametrize("dictionary, interesting_fields, expected_output", [
-    ({}, [], []),
-    ({'key1': 'content1'}, [], []),
-    ({'key1': 'content1'}, ['key2'], []),
-    ({'key1': 'content1', 'key2': 'content2'}, ['key1'], ['content1']),
-    ({'key1': 'content1', 'key2': 'content2', 'key3': 'content3'}, ['key1', 'key3'], ['content1', 'content3']),
-    ({'key1': ['part1', 'part2'], 'key2': 'content2', 'key3': 'content3'}, ['key1', 'key3'], ['part1', 'part2', 'content3']),
-])
-def test_obtain_data_from_parsed_metadata(dictionary, interesting_fields, expected_output):
-    assert entity_extractor.EntityExtractor._obtain_data_from_parsed_metadata(dictionary, interesting_fields) == expected_output
-
-
-@pytest.mark.parametrize("test_input, expected_output", [
-    ([], []),
-    ([None], []),
-    (['valid text', None], ['valid text']),
-    (['valid text', 'more valid text'], ['valid text', 'more valid text'])
-])
-def test_clean_data(test_input, expected_output):
-    assert entity_extractor.EntityExtractor._clean_data(test_input) == expected_output
-
-
-@pytest.mark.parametrize("test_input, threshold, expected_output", [
-    ([], 1, []),
-    ([CategorizedEntity(text='good entity', confidence_score=1)], 0.5, [CategorizedEntity(text='good entity', confidence_score=1)]),
-    ([CategorizedEntity(text='bad entity', confidence_score=0.3)], 0.5, []),
-    ([CategorizedEntity(text='good entity', confidence_score=0.5)], 0.5, [CategorizedEntity(text='good entity', confidence_score=0.5)])
-])
-def test_remove_entities_below_threshold(test_input, threshold, expected_output):
-    assert entity_extractor.EntityExtractor._remove_entities_below_threshold(test_input, threshold) == expected_output
+from azure.core.exceptions import HttpResponseError
+from enrichment.entity_extractor.chunker import TextChunker
+from enrichment.entity_extractor.ner_backend import GazetteerBackend
+from enrichment.entity_extractor.ner_cache import NerCache, SqliteStore
 
 
 @pytest.mark.parametrize("test_input, expected_output", [
@@ -45,15 +20,15 @@ def test_remove_entities_below_threshold(test_input, threshold, expected_output)
     (['valid text'], ['valid text']),
     (['valid long text'], ['valid long', 'text']),
     (['valid', 'text'], ['valid text']),
-    (['valid', 'long text'], ['valid long', 'text']),
+    (['valid', 'long text'], ['valid', 'long text']),
+    (['Short one. A sentence too long', 'text'], ['Short one.', 'A sentence', 'too long', 'text']),
     (['valid', 'long', 'text'], ['valid long', 'text']),
     (['valid', 'long', None, 'text'], ['valid long', 'text'])
 ])
-def test_prepare_data_for_ner_client(test_input, expected_output):
+def test_prepare_chunks_for_ner_client(test_input, expected_output):
     extractor = entity_extractor.EntityExtractor()
     extractor.initialize_client(None, None, max_string_length=10)
-    extractor.client_max_string_length = 10
-    assert extractor._prepare_data_for_ner_client(test_input) == expected_output
+    assert [chunk.text for chunk in extractor._prepare_chunks_for_ner_client(test_input)] == expected_output
 
 
 @pytest.mark.parametrize("test_parsed_metadata, test_entities, expected_output", [
@@ -89,3 +64,290 @@ def test_select_interesting_entities(test_parsed_metadata, test_entities, expect
     config_entity_F = entity_extractor.EntityTypeConfig(id='EntityD', threshold=0.7, capitalize_propernouns=True, add_from_metadata=['extra_field'], remove_substrings=True)
     extractor.initialize_entity_type_configs([config_entity_A, config_entity_B, config_entity_C, config_entity_D, config_entity_E, config_entity_F])
     assert extractor._select_interesting_entities(test_parsed_metadata, test_entities) == expected_output
+
+
+def select_interesting_entities_per_config(extractor, parsed_metadata, entities):
+    """Reference implementation filtering the entities again for every config"""
+    interesting_entities = {}
+    for config in extractor.entity_type_configs:
+        texts = {x.text.lower() for x in entities if x.confidence_score >= config.threshold and x.category == config.id_string}
+        for field in config.add_from_metadata:
+            if field in parsed_metadata:
+                content = parsed_metadata[field]
+                texts |= {x.lower() for x in ([content] if isinstance(content, str) else content)}
+        if config.remove_substrings:
+            texts = entity_extractor_utils.remove_substring_elements(texts)
+        if config.capitalize_propernouns:
+            texts = entity_extractor_utils.perform_capitalize_propernouns(texts)
+        interesting_entities[config.id_string] = texts
+    return interesting_entities
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_select_interesting_entities_single_pass(seed):
+    rng = random.Random(seed)
+    words = ['new', 'york', 'city', 'bank', 'of', 'America', 'Paris']
+    categories = ['Location', 'Person', 'Organization', 'Event', 'Product']
+    entities = [CategorizedEntity(text=" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))),
+                                  category=rng.choice(categories), confidence_score=rng.random())
+                for _ in range(300)]
+    parsed_metadata = {'places': ['New York', 'Lyon'], 'company': 'Bank of America'}
+    extractor = entity_extractor.EntityExtractor()
+    extractor.initialize_entity_type_configs([
+        entity_extractor.EntityTypeConfig(rng.choice(categories + ['Skill']), threshold=rng.random(),
+                                          add_from_metadata=rng.sample(['places', 'company', 'missing'], rng.randint(0, 2)),
+                                          remove_substrings=rng.random() < 0.5, capitalize_propernouns=rng.random() < 0.5)
+        for _ in range(8)
+    ])
+    assert extractor._select_interesting_entities(parsed_metadata, entities) == \
+        select_interesting_entities_per_config(extractor, parsed_metadata, entities)
+
+
+DOCUMENTS = [f"Document{i} mentions Person{i} and nobody" for i in range(17)]
+EXPECTED_TEXTS = [text for i in range(17) for text in (f"Document{i}", f"Person{i}")]
+PEOPLE = EXPECTED_TEXTS + ["Alice", "Bob Smith", "Smith", "Carol", "Zoe"] + [f"Keyword{i}" for i in range(17)] + \
+    [f"Speaker{i}" for i in range(7)] + [f"Guest{i}" for i in range(50)]
+
+
+def gazetteer_backend(**kwargs):
+    """Offline NER extraction engine recognizing the people of the tests, and Paris"""
+    gazetteer = {name: "Person" for name in PEOPLE}
+    gazetteer["Paris"] = "Location"
+    return GazetteerBackend(gazetteer, **kwargs)
+
+
+def offline_extractor(backend, max_processes=2, max_concurrency=1, requests_per_second=None, max_retries=3):
+    extractor = entity_extractor.EntityExtractor()
+    extractor.initialize_client(None, None, max_processes=max_processes, max_concurrency=max_concurrency,
+                                requests_per_second=requests_per_second, max_retries=max_retries, backend=backend)
+    extractor.retry_backoff_seconds = 0.001
+    return extractor
+
+
+def test_extract_all_entities_without_client():
+    assert entity_extractor.EntityExtractor()._extract_all_entities(DOCUMENTS, 'en') == []
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 3, 20])
+def test_extract_all_entities_order(max_concurrency):
+    """Batches answered out of order are reassembled in the order of the data"""
+    backend = gazetteer_backend(latency=lambda documents: 0.02 if documents[0] == DOCUMENTS[0] else 0.001)
+    extractor = offline_extractor(backend, max_concurrency=max_concurrency)
+    entities = extractor._extract_all_entities(DOCUMENTS, 'en')
+    assert [entity.text for entity in entities] == EXPECTED_TEXTS
+    assert len(backend.calls) == 9
+    assert all(len(call) <= 2 for call in backend.calls)
+    assert backend.max_in_flight <= max_concurrency
+
+
+def test_extract_all_entities_concurrency():
+    backend = gazetteer_backend(latency=0.05)
+    extractor = offline_extractor(backend, max_processes=5, max_concurrency=4)
+    entities = extractor._extract_all_entities(DOCUMENTS * 2, 'en')
+    assert len(entities) == 2 * len(EXPECTED_TEXTS)
+    # 7 batches of 5 documents, 4 at a time
+    assert len(backend.calls) == 7
+    assert backend.max_in_flight == 4
+
+
+def test_initialize_client_disables_client_retries(monkeypatch):
+    """call_with_retry is the only retry layer of the queries"""
+    clients = []
+    monkeypatch.setattr(entity_extractor, "TextAnalyticsClient", lambda **kwargs: clients.append(kwargs) or kwargs)
+    extractor = entity_extractor.EntityExtractor()
+    extractor.initialize_client("https://ner.example.com", "key")
+    extractor.initialize_client("https://ner.example.com", "key", transport="transport")
+    assert [client["retry_total"] for client in clients] == [0, 0]
+    assert clients[1]["transport"] == "transport"
+
+
+def test_extract_all_entities_skips_document_errors():
+    backend = gazetteer_backend()
+    entities = offline_extractor(backend)._extract_all_entities(["Alice", " ", "Carol"], 'en')
+    assert [entity.text for entity in entities] == ["Alice", "Carol"]
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+@pytest.mark.parametrize("retry_after", [None, "0"])
+def test_extract_all_entities_retries_throttled_calls(max_concurrency, retry_after):
+    throttled = {DOCUMENTS[0], DOCUMENTS[6], DOCUMENTS[12]}
+    backend = gazetteer_backend(throttle=lambda documents, attempt: documents[0] in throttled and attempt <= 2,
+                                retry_after=retry_after)
+    extractor = offline_extractor(backend, max_concurrency=max_concurrency)
+    entities = extractor._extract_all_entities(DOCUMENTS, 'en')
+    assert [entity.text for entity in entities] == EXPECTED_TEXTS
+    assert backend.throttled_calls == 6
+    assert len(backend.calls) == 9 + 6
+
+
+def test_extract_all_entities_gives_up_when_throttled():
+    backend = gazetteer_backend(throttle=lambda documents, attempt: True)
+    with pytest.raises(HttpResponseError):
+        offline_extractor(backend, max_retries=2)._extract_all_entities(DOCUMENTS, 'en')
+    assert len(backend.calls) == 3
+
+
+def test_extract_all_entities_rate_budget():
+    backend = gazetteer_backend()
+    extractor = offline_extractor(backend, max_concurrency=4, requests_per_second=100)
+    start = time.monotonic()
+    extractor._extract_all_entities(DOCUMENTS, 'en')
+    # 9 requests, at most one every 10 ms
+    assert time.monotonic() - start >= 8 * 0.01
+
+
+def test_extract_all_entities_cache():
+    """Strings already seen skip the client, a changed string is the only one sent again"""
+    backend = gazetteer_backend()
+    extractor = offline_extractor(backend)
+    extractor.initialize_cache(NerCache())
+    assert [entity.text for entity in extractor._extract_all_entities(DOCUMENTS, 'en')] == EXPECTED_TEXTS
+    assert len(backend.calls) == 9
+
+    assert [entity.text for entity in extractor._extract_all_entities(DOCUMENTS, 'en')] == EXPECTED_TEXTS
+    assert len(backend.calls) == 9
+    assert extractor.ner_cache.hit_rate == 0.5
+
+    changed = DOCUMENTS[:5] + ["Nobody but Zoe"] + DOCUMENTS[6:]
+    entities = extractor._extract_all_entities(changed, 'en')
+    assert [entity.text for entity in entities] == EXPECTED_TEXTS[:10] + ["Zoe"] + EXPECTED_TEXTS[12:]
+    assert backend.calls[9:] == [["Nobody but Zoe"]]
+
+    extractor._extract_all_entities(DOCUMENTS[:2], 'fr')
+    assert backend.calls[10:] == [DOCUMENTS[:2]]
+
+
+def test_extract_all_entities_cache_skips_document_errors():
+    backend = gazetteer_backend()
+    extractor = offline_extractor(backend)
+    extractor.initialize_cache(NerCache())
+    extractor._extract_all_entities([" "], 'en')
+    extractor._extract_all_entities([" "], 'en')
+    assert len(backend.calls) == 2
+
+
+def test_initialize_cache_persistent_tier_requires_model_version(tmp_path):
+    cache = NerCache(persistent=SqliteStore(str(tmp_path / "ner_cache.sqlite")))
+    extractor = entity_extractor.EntityExtractor()
+    extractor.initialize_client(None, None)
+    with pytest.raises(Exception):
+        extractor.initialize_cache(cache)
+    extractor.initialize_client(None, None, model_version="2022-10-01")
+    extractor.initialize_cache(cache)
+    assert extractor.ner_cache is cache
+
+
+def test_obtain_fields_from_parsed_metadata():
+    parsed_metadata = {'video_description': 'description', 'keywords': ['one', 'two'], 'other': 'ignored'}
+    fields = entity_extractor.EntityExtractor._obtain_fields_from_parsed_metadata(parsed_metadata, ['video_description', 'keywords'])
+    assert fields == [('video_description', 'description'), ('keywords[0]', 'one'), ('keywords[1]', 'two')]
+
+
+def timed_line(text, *timestamps):
+    return {"text": text, "instances": [{"start": start, "end": end} for start, end in timestamps]}
+
+
+def test_extract_timed_entities():
+    backend = gazetteer_backend()
+    extractor = offline_extractor(backend)
+    extractor.initialize_entity_type_configs([
+        entity_extractor.EntityTypeConfig("Person", threshold=0.5, remove_substrings=True),
+        entity_extractor.EntityTypeConfig("Location", threshold=0.5),
+    ])
+    lines = [
+        timed_line("Alice met Bob Smith.", ("0:00:01", "0:00:02")),
+        timed_line("nobody here", ("0:00:03", "0:00:04")),
+        timed_line("Alice  met Bob Smith. ", ("0:00:05", "0:00:06"), ("0:00:07", "0:00:08")),
+        timed_line("Then Smith left", ("0:00:09", "0:00:10")),
+        timed_line(None),
+        {"text": "untimed Carol"},
+    ]
+    timed_entities = extractor.extract_timed_entities(iter(lines))
+    assert timed_entities == {
+        "Person": {
+            "Alice": {("0:00:01", "0:00:02"), ("0:00:05", "0:00:06"), ("0:00:07", "0:00:08")},
+            "Bob Smith": {("0:00:01", "0:00:02"), ("0:00:05", "0:00:06"), ("0:00:07", "0:00:08")},
+            "Carol": set(),
+        },
+        "Location": {},
+    }
+    # repeated lines are sent once
+    assert [document for call in backend.calls for document in call] == \
+        ["Alice met Bob Smith. nobody here Then Smith left untimed Carol"]
+
+
+def test_extract_timed_entities_drops_entities_across_lines():
+    """'Bob Smith' is recognized where the two lines are joined in a chunk, but neither line contains it"""
+    backend = gazetteer_backend()
+    extractor = offline_extractor(backend)
+    extractor.initialize_entity_type_configs([entity_extractor.EntityTypeConfig("Person", threshold=0.5)])
+    lines = [timed_line("Alice met Bob", ("0:00:01", "0:00:02")), timed_line("Smith left", ("0:00:03", "0:00:04"))]
+    timed_entities = extractor.extract_timed_entities(lines)
+    assert backend.calls == [["Alice met Bob Smith left"]]
+    assert timed_entities == {"Person": {"Alice": {("0:00:01", "0:00:02")}}}
+
+
+def one_hour_transcript():
+    """A line every 4 seconds, and a banner repeated by the OCR every 10 seconds"""
+    transcript = [timed_line(f"Speaker{i % 7} talked with Guest{i % 50} about the news of day {i}.",
+                             (f"0:{i * 4 // 60:02d}:{i * 4 % 60:02d}", f"0:{(i * 4 + 4) // 60:02d}:{(i * 4 + 4) % 60:02d}"))
+                  for i in range(900)]
+    ocr = [timed_line("BREAKING NEWS Paris", (f"0:{i * 10 // 60:02d}:{i * 10 % 60:02d}", f"0:{i * 10 // 60:02d}:{i * 10 % 60 + 9:02d}"))
+           for i in range(360)]
+    return transcript + ocr
+
+
+def test_extract_timed_entities_throughput_budget():
+    """
+    A one-hour transcript with its OCR (1260 lines, 50k distinct characters) stays within 3 requests of 5 chunks
+    of 5120 characters, all in flight at the same time, so about the latency of a single request.
+    """
+    backend = gazetteer_backend(latency=0.05)
+    extractor = offline_extractor(backend, max_processes=5, max_concurrency=4)
+    extractor.initialize_entity_type_configs([entity_extractor.EntityTypeConfig("Person", threshold=0.5),
+                                              entity_extractor.EntityTypeConfig("Location", threshold=0.5)])
+    timed_entities = extractor.extract_timed_entities(one_hour_transcript())
+
+    assert len(backend.calls) <= 3
+    assert all(len(document) <= 5120 for call in backend.calls for document in call)
+    assert backend.max_in_flight == len(backend.calls)
+    assert len(timed_entities["Person"]["Speaker3"]) == 129
+    assert len(timed_entities["Location"]["Paris"]) == 360
+
+
+@pytest.mark.parametrize("max_string_length", [20, 5120])
+@pytest.mark.parametrize("max_concurrency", [1, 3])
+def test_extract_entities_many(max_string_length, max_concurrency):
+    """Same results as extract_entities for every document, with full batches of chunks of several documents"""
+    documents = [{"video_description": DOCUMENTS[i], "keywords": [f"Keyword{i}"] * (i % 3)} for i in range(17)]
+    documents[4] = {"other": "Nothing to send"}
+    documents[9] = {"video_description": None}
+    configs = [entity_extractor.EntityTypeConfig("Person", threshold=0.5, add_from_metadata=["keywords"])]
+
+    backend = gazetteer_backend()
+    extractor = offline_extractor(backend, max_processes=5, max_concurrency=max_concurrency)
+    extractor.initialize_entity_type_configs(configs)
+    extractor.client_max_string_length = max_string_length
+    extractor.text_chunker = TextChunker(max_string_length)
+    expected = [extractor.extract_entities(document, ["video_description", "keywords"]) for document in documents]
+    single_calls = len(backend.calls)
+    backend.calls.clear()
+
+    results = extractor.extract_entities_many(iter(documents), ["video_description", "keywords"])
+    assert list(results) == expected
+    chunks = [document for call in backend.calls for document in call]
+    assert len(backend.calls) == -(-len(chunks) // 5) < single_calls
+    assert all(len(call) == 5 for call in backend.calls[:-1])
+
+
+def test_extract_entities_many_is_lazy():
+    backend = gazetteer_backend()
+    extractor = offline_extractor(backend, max_processes=2)
+    extractor.initialize_entity_type_configs([entity_extractor.EntityTypeConfig("Person", threshold=0.5)])
+    documents = ({"video_description": document} for document in DOCUMENTS)
+
+    results = extractor.extract_entities_many(documents)
+    assert next(results) == {"Person": {"Document0", "Person0"}}
+    assert next(results) == {"Person": {"Document1", "Person1"}}
+    assert backend.calls == [DOCUMENTS[:2]]
+    assert len(list(results)) == 15
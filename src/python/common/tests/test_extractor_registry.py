@@ -0,0 +1,64 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+from enrichment.entity_extractor import entity_extractor, extractor_registry
+from enrichment.entity_extractor.entity_extractor import EntityTypeConfig
+from enrichment.entity_extractor.ner_cache import NerCache
+
+ENDPOINT = "https://fake.cognitiveservices.azure.com/"
+
+
+def client_transport(extractor):
+    """HTTP transport the TextAnalyticsClient of an extractor was built with"""
+    return extractor.client.transport
+
+
+def configs(threshold=0.9):
+    return [EntityTypeConfig('Location', threshold=threshold, add_from_metadata=['video_locations']),
+            EntityTypeConfig('Person', threshold=0.85, remove_substrings=True)]
+
+
+@pytest.fixture(autouse=True)
+def text_analytics_client(monkeypatch):
+    """Stand-in for TextAnalyticsClient, keeping the arguments the clients are built with"""
+    monkeypatch.setattr(entity_extractor, "TextAnalyticsClient", lambda **kwargs: SimpleNamespace(**kwargs))
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    extractor_registry.clear_entity_extractors()
+    yield
+    extractor_registry.clear_entity_extractors()
+
+
+def test_get_entity_extractor_reuses_extractor():
+    extractor = extractor_registry.get_entity_extractor(ENDPOINT, "key", configs(), max_concurrency=2)
+    assert extractor_registry.get_entity_extractor(ENDPOINT, "key", configs(), max_concurrency=2) is extractor
+    assert [config.id_string for config in extractor.entity_type_configs] == ['Location', 'Person']
+    assert extractor.max_concurrency == 2
+    assert extractor.ner_cache is None
+
+
+@pytest.mark.parametrize("endpoint, key, threshold, ner_cache, client_options", [
+    ("https://other.cognitiveservices.azure.com/", "key", 0.9, None, {"max_concurrency": 2}),
+    (ENDPOINT, "other key", 0.9, None, {"max_concurrency": 2}),
+    (ENDPOINT, "key", 0.5, None, {"max_concurrency": 2}),
+    (ENDPOINT, "key", 0.9, NerCache(), {"max_concurrency": 2}),
+    (ENDPOINT, "key", 0.9, None, {"max_concurrency": 4}),
+])
+def test_get_entity_extractor_shares_transport(endpoint, key, threshold, ner_cache, client_options):
+    extractor = extractor_registry.get_entity_extractor(ENDPOINT, "key", configs(), max_concurrency=2)
+    other = extractor_registry.get_entity_extractor(endpoint, key, configs(threshold), ner_cache=ner_cache, **client_options)
+    assert other is not extractor
+    assert other.ner_cache is ner_cache
+    assert client_transport(other) is client_transport(extractor) is extractor_registry.get_shared_transport()
+
+
+def test_get_entity_extractor_concurrently():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        extractors = list(executor.map(lambda _: extractor_registry.get_entity_extractor(ENDPOINT, "key", configs()), range(32)))
+    assert all(extractor is extractors[0] for extractor in extractors)
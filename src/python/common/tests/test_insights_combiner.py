@@ -3,7 +3,8 @@ Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
 from copy import deepcopy
-from enrichment.insights_combiner.insights_combiner import InsightsCombiner
+from enrichment.insights_combiner.configuration_variables import DEFAULT_STRUCTURE
+from enrichment.insights_combiner.insights_combiner import InsightsCombiner, normalize_entity_name
 from enrichment.insights_splitter.time_parser import TimeParser
 import pytest
 
@@ -232,3 +233,123 @@ def test_attach_combine_insights(
         metadata=metadata,
     )
     assert len(enriched_document["named_organizations"]) == expected
+
+
+def test_combine_insights_timed_ner(init_combiner):
+    """Entities found in the transcript get their own appearances, the others the whole video"""
+    combiner = deepcopy(init_combiner)
+    enriched_document = combiner.combine_insights(
+        vi_insights={"videoId": "abc1123", "duration_in_seconds": 45},
+        ner_insights={"Person": {"Alice", "Carol"}},
+        ner_appearances={
+            "Person": {
+                "Alice": {("0:00:05", "0:00:07.5"), ("0:00:01", "0:00:02"), ("0:00:06", "0:00:07")},
+                "Bob": {("0:00:10.25", "0:00:12")},
+                "Carol": set(),
+            },
+        },
+    )
+    appearances = {person["name"]: person["appearances"] for person in enriched_document["named_people"]}
+    assert appearances["Alice"] == [
+        {"startTime": "0:00:01", "endTime": "0:00:02", "startSeconds": 1, "endSeconds": 2},
+        {"startTime": "0:00:05", "endTime": "0:00:07.5", "startSeconds": 5, "endSeconds": 7.5},
+    ]
+    assert appearances["Bob"] == [{"startTime": "0:00:10.25", "endTime": "0:00:12", "startSeconds": 10.25, "endSeconds": 12}]
+    assert appearances["Carol"][0]["endSeconds"] == 45
+    assert len(enriched_document["named_people"]) == 3
+
+
+def test_return_default_timestamps_independent_structures(init_combiner):
+    """Default structures do not share their appearances, nor the DEFAULT_STRUCTURE template"""
+    default_structure = deepcopy(DEFAULT_STRUCTURE)
+    combiner = deepcopy(init_combiner)
+    combiner.vi_insights["duration_in_seconds"] = 10
+    short = combiner._return_default_timestamps("Japan")
+    combiner.vi_insights["duration_in_seconds"] = 20
+    japan, msft = combiner._return_default_timestamps_many(["Japan", "MSFT"])
+
+    assert short["appearances"][0]["endSeconds"] == 10
+    assert short["appearances"][0]["endTime"] == "00:00:10"
+    assert japan["appearances"] == msft["appearances"] == [
+        {"startTime": "0:00:00.00", "endTime": "00:00:20", "startSeconds": 0, "endSeconds": 20}]
+    assert japan["appearances"] is not msft["appearances"]
+    japan["appearances"][0]["endSeconds"] = 5
+    japan["appearances"].append({})
+    assert msft["appearances"] == [{"startTime": "0:00:00.00", "endTime": "00:00:20", "startSeconds": 0, "endSeconds": 20}]
+    assert combiner._return_default_timestamps("Japan")["appearances"][0]["endSeconds"] == 20
+    assert DEFAULT_STRUCTURE == default_structure
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [("New York", "new york"), (" new \t York ", "new york"), ("ＮＡＳＡ", "nasa"), ("Straße", "strasse"), (None, None), (1, None)],
+)
+def test_normalize_entity_name(name, expected):
+    assert normalize_entity_name(name) == expected
+
+
+def test_combine_insights_deduplicates_entities(init_combiner):
+    """Entities found by Video Indexer, in the metadata and by NER are indexed once, with their names"""
+    combiner = deepcopy(init_combiner)
+    enriched_document = combiner.combine_insights(
+        vi_insights={
+            "videoId": "abc1123",
+            "duration_in_seconds": 45,
+            "named_locations": [{"name": "New York", "instances": []}, "unexpected", {"id": 3}],
+            "named_locations_names": ["New York"],
+        },
+        metadata={"video_locations": [" new  york", "Paris", "paris"], "company_names": ["Contoso", "CONTOSO"]},
+        ner_insights={"Location": {"NEW YORK", "Lyon"}, "Organizations": {"contoso"}},
+        ner_appearances={"Location": {"Paris": {("0:00:05", "0:00:07")}, "New York": {("0:00:01", "0:00:02")}}},
+    )
+
+    locations = enriched_document["named_locations"]
+    assert [location.get("name") if isinstance(location, dict) else location for location in locations] == [
+        "New York", "unexpected", None, "Paris", "Lyon"]
+    assert enriched_document["named_locations_names"] == ["New York", "Paris", "Lyon"]
+    assert locations[0]["appearances"] == [{"startTime": "0:00:01", "endTime": "0:00:02", "startSeconds": 1, "endSeconds": 2}]
+    assert locations[0]["instances"] == [{"adjustedStart": "0:00:01", "adjustedEnd": "0:00:02", "start": "0:00:01", "end": "0:00:02"}]
+    # timed appearances replace the default one
+    assert locations[3]["appearances"] == [{"startTime": "0:00:05", "endTime": "0:00:07", "startSeconds": 5, "endSeconds": 7}]
+    assert locations[4]["appearances"][0]["endSeconds"] == 45
+    assert [org["name"] for org in enriched_document["named_organizations"]] == ["Contoso"]
+    assert "named_organizations_names" not in enriched_document
+
+
+def test_attach_ner_to_document_merges_timed_appearances(init_combiner):
+    """Timed appearances of the same entity are merged, a default appearance does not override them"""
+    combiner = deepcopy(init_combiner)
+    document = load_default_document(combiner)
+    combiner.ner_appearances = {"Person": {"Alice": {("0:00:01", "0:00:03")}}}
+    combiner.attach_ner_to_document(document)
+    combiner.ner_appearances = {"Person": {"alice": {("0:00:02", "0:00:04"), ("0:00:10", "0:00:11")}}}
+    combiner.ner_insights = {"Person": {"ALICE"}}
+    combiner.attach_ner_to_document(document)
+
+    assert document["named_people"] == [{**document["named_people"][0], "name": "Alice", "appearances": [
+        {"startTime": "0:00:01", "endTime": "0:00:04", "startSeconds": 1, "endSeconds": 4},
+        {"startTime": "0:00:10", "endTime": "0:00:11", "startSeconds": 10, "endSeconds": 11},
+    ]}]
+
+
+def test_attach_ner_to_document_merges_into_vi_instances(init_combiner):
+    """Appearances found by NER are merged with the instances of a Video Indexer entity, and both fields match"""
+    combiner = deepcopy(init_combiner)
+    document = {"named_people": [{"name": "Alice", "instances": [
+        {"instanceSource": "Ocr", "adjustedStart": "0:00:03", "adjustedEnd": "0:00:05", "start": "0:00:03", "end": "0:00:05"},
+        {"instanceSource": "Transcript", "adjustedStart": "0:00:20", "adjustedEnd": "0:00:21.5", "start": "0:00:20", "end": "0:00:21.5"},
+    ]}], "named_locations": [], "named_organizations": []}
+    combiner.ner_appearances = {"Person": {"alice": {("0:00:04", "0:00:08"), ("0:00:10", "0:00:11")}}}
+    combiner.attach_ner_to_document(document)
+
+    alice, = document["named_people"]
+    assert alice["appearances"] == [
+        {"startTime": "0:00:03", "endTime": "0:00:08", "startSeconds": 3, "endSeconds": 8},
+        {"startTime": "0:00:10", "endTime": "0:00:11", "startSeconds": 10, "endSeconds": 11},
+        {"startTime": "0:00:20", "endTime": "0:00:21.5", "startSeconds": 20, "endSeconds": 21.5},
+    ]
+    assert alice["instances"] == [
+        {"adjustedStart": "0:00:03", "adjustedEnd": "0:00:08", "start": "0:00:03", "end": "0:00:08"},
+        {"adjustedStart": "0:00:10", "adjustedEnd": "0:00:11", "start": "0:00:10", "end": "0:00:11"},
+        {"adjustedStart": "0:00:20", "adjustedEnd": "0:00:21.5", "start": "0:00:20", "end": "0:00:21.5"},
+    ]
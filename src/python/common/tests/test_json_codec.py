@@ -0,0 +1,105 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import json
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timezone
+from enum import Enum, IntEnum
+import pytest
+from enrichment import json_codec
+
+VI_INSIGHTS_SAMPLE = os.path.join(os.path.dirname(__file__), '..', '..', 'functions', 'func_dataproc', 'tests', 'vi_insights.json')
+
+
+@dataclass
+class Record:
+    name: str
+
+
+class Color(Enum):
+    RED = "red"
+
+
+class Level(IntEnum):
+    HIGH = 2
+
+
+VALUES = [
+    {},
+    [],
+    "",
+    0,
+    {"text": "é日本   / \"quoted\" \\ \n", "int": -12, "float": 1.25, "exp": 1e-7, "bools": [True, False, None]},
+    {"nested": [{"a": [[], {}, [{"b": 2 ** 63 - 1}]]}]},
+    {"large": 2 ** 70, "negative": -2 ** 64},
+    {"created": datetime(2022, 3, 8, 17, 58, 54, 228032, tzinfo=timezone.utc), "naive": datetime(2022, 3, 8, 1, 2, 3)},
+    {"day": date(2020, 1, 2), "time": time(1, 2, 3), "id": uuid.UUID(int=5), "record": Record("a")},
+    {1: "int key", None: "none key", 1.5: "float key"},
+]
+
+
+def expected_document(value) -> bytes:
+    return json.dumps(value, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+@pytest.mark.parametrize("backend", list(json_codec.BACKENDS))
+@pytest.mark.parametrize("value", VALUES)
+def test_dumps_like_default_str(backend, value):
+    """Every backend writes a document decoding to the same value as json.dumps(value, default=str)"""
+    loads, dumps = json_codec.BACKENDS[backend]
+    document = dumps(value)
+    assert isinstance(document, bytes)
+    assert json.loads(document) == json.loads(expected_document(value))
+    assert loads(document) == json.loads(document)
+    assert loads(document.decode("utf-8")) == json.loads(document)
+
+
+@pytest.mark.parametrize("backend", list(json_codec.BACKENDS))
+@pytest.mark.parametrize("value", [
+    {"nan": float("nan"), "inf": float("inf"), "-inf": float("-inf")},
+    [1.5, [{"deep": float("nan")}]],
+    {"color": Color.RED, "level": Level.HIGH},
+    [(Color.RED, "tuple")],
+])
+def test_dumps_non_finite_floats_and_enums_like_json(backend, value):
+    """NaN, Infinity and the Enum members are written as json.dumps(value, default=str) does"""
+    _, dumps = json_codec.BACKENDS[backend]
+    _, json_dumps = json_codec.BACKENDS["json"]
+    assert dumps(value) == json_dumps(value) == expected_document(value)
+
+
+@pytest.mark.parametrize("backend", list(json_codec.BACKENDS))
+@pytest.mark.parametrize("document", ['{"a": NaN, "b": Infinity}', "[123456789012345678901234567890]", " [1e400] ", '"\\ud83d\\ude00"'])
+def test_loads_like_json(backend, document):
+    if backend == "orjson" and "1234567890" in document:
+        pytest.skip("orjson decodes the integers of more than 64 bits as floats")
+    loads, _ = json_codec.BACKENDS[backend]
+    assert repr(loads(document)) == repr(json.loads(document))
+    assert repr(loads(document.encode("utf-8"))) == repr(json.loads(document))
+
+
+@pytest.mark.parametrize("backend", list(json_codec.BACKENDS))
+@pytest.mark.parametrize("document", ['{"a": 1', "[1,]", "", "{'a': 1}"])
+def test_loads_invalid(backend, document):
+    loads, _ = json_codec.BACKENDS[backend]
+    with pytest.raises(json.JSONDecodeError):
+        loads(document)
+
+
+@pytest.mark.parametrize("backend", list(json_codec.BACKENDS))
+def test_round_trip_vi_insights(backend):
+    loads, dumps = json_codec.BACKENDS[backend]
+    with open(VI_INSIGHTS_SAMPLE, "rb") as f:
+        document = f.read()
+    vi_insights = loads(document)
+    assert vi_insights == json.loads(document)
+    assert loads(dumps(vi_insights)) == vi_insights
+    assert json.loads(dumps(vi_insights)) == json.loads(expected_document(vi_insights))
+
+
+def test_default_backend():
+    assert json_codec.BACKEND == next(iter(json_codec.BACKENDS))
+    assert json_codec.loads(json_codec.dumps({"a": [1]})) == {"a": [1]}
@@ -0,0 +1,59 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import pytest
+from enrichment.metadata_parser import language_lookup
+from enrichment.metadata_parser.multilanguage_transformer import MultilanguageTransformation
+
+
+def test_language_tables_are_shared():
+    tables = language_lookup.get_language_tables()
+    assert language_lookup.get_language_tables() is tables
+    assert MultilanguageTransformation()._get_language_codes() is tables.language_codes
+
+
+def test_language_tables_content():
+    tables = language_lookup.get_language_tables()
+    assert tables.language_codes['english'] == 'en'
+    assert tables.language_codes['tetum'] == 'tet'
+    assert tables.language_names == frozenset(tables.language_codes)
+    assert tables.vi_language_locales['fr'].startswith('fr-')
+    assert 'language' not in tables.vi_language_locales
+
+
+def test_language_tables_are_immutable():
+    tables = language_lookup.get_language_tables()
+    with pytest.raises(TypeError):
+        tables.language_codes['klingon'] = 'tlh'
+    with pytest.raises(TypeError):
+        tables.vi_language_locales['tlh'] = 'tlh-QO'
+    with pytest.raises(AttributeError):
+        tables.language_names.add('klingon')
+
+
+def test_reload():
+    tables = language_lookup.get_language_tables()
+    reloaded = language_lookup.reload()
+    assert reloaded is not tables
+    assert reloaded == tables
+    assert language_lookup.get_language_tables() is reloaded
+
+
+def test_compiled_tables_match_source():
+    """The compiled artifact must be regenerated when the language assets change:
+    python -m enrichment.metadata_parser.language_lookup
+    """
+    assert language_lookup._load_compiled_tables() == language_lookup._load_source_tables()
+
+
+def test_compile_language_tables(tmp_path):
+    path = str(tmp_path / "language_tables.json")
+    assert language_lookup._load_compiled_tables(path) is None
+    compiled = language_lookup.compile_language_tables(path)
+    assert language_lookup._load_compiled_tables(path) == compiled
+
+
+def test_reload_from_source():
+    compiled = language_lookup.reload()
+    assert language_lookup.reload(from_source=True) == compiled
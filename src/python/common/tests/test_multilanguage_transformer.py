@@ -2,8 +2,11 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
+import random
+import re
 import pytest
-from enrichment.metadata_parser.multilanguage_transformer import MultilanguageTransformation
+from enrichment.metadata_parser.language_lookup import get_language_tables
+from enrichment.metadata_parser.multilanguage_transformer import MultilanguageTransformation, clean_language_tokens
 
 
 @pytest.mark.parametrize("mock_content,mock_language_set, expected", [("natural with englsih and urdu speech ", ["english", "urdu", 'ukrainian', 'russian', 'french'], ["english", "urdu"]),
@@ -75,3 +78,80 @@ def test_language_string_to_language_code(mock_string, expected):
 
     parsed = parser.language_string_to_language_code(mock_string)
     assert parsed == expected
+
+
+@pytest.mark.parametrize("mock_content, expected", [("scottish gaelic", ["scottish gaelic"]),
+                                                    ("Scottish-Gaelic and english speech", ["scottish gaelic", "english"]),
+                                                    ("swiss german/french", ["swiss german", "french"]),
+                                                    ("german", ["german"]),
+                                                    ("afro-seminole creole", ["afro-seminole creole"])
+                                                    ])
+def test_clean_video_language_multi_word(mock_content, expected):
+    """Multi word language names are matched, longest name first
+    """
+    parser = MultilanguageTransformation()
+    parsed = parser.clean_video_language(mock_content)
+    assert parsed == expected
+
+
+def test_language_set_assignment():
+    parser = MultilanguageTransformation()
+    parser.language_set = ["english"]
+    assert parser.clean_video_language("english and french") == ["english"]
+    parser.language_set = ["english", "french"]
+    assert parser.clean_video_language("english and french") == ["english", "french"]
+
+
+def test_language_names_cleaned_to_the_same_tokens():
+    """The name matched among names cleaned to the same tokens doesn't depend on their order"""
+    for language_set in (["//gana", "gana"], ["gana", "//gana"]):
+        parser = MultilanguageTransformation()
+        parser.language_set = language_set
+        assert parser.clean_video_language("gana") == ["gana"]
+
+
+def test_clean_video_languages():
+    parser = MultilanguageTransformation()
+    parser.language_set = ["english", "urdu", "french"]
+    video_languages = ["englsih speech", "", "urdu & french", "englsih speech"]
+    assert parser.clean_video_languages(video_languages) == [["english"], ["No Language"], ["urdu", "french"], ["english"]]
+    assert parser.clean_video_languages([]) == []
+
+
+def per_language_regex_clean_video_language(video_language, language_set):
+    """Previous implementation of clean_video_language: one regex pass per cleanup, then a set intersection"""
+    video_language = video_language.lower()
+    if video_language != '':
+        video_language = re.sub('englsih|englsihspeech', 'english', video_language)
+        video_language = re.sub('turksih', 'turkish', video_language)
+        video_language = re.sub('speechh|speech|part', '', video_language)
+        video_language = re.sub('-|,|//|/|&', ' ', video_language)
+        video_language = re.sub('(.)\1+', '', video_language)
+        return list(set(video_language.lower().split(' ')) & set(language_set))
+    return ['No Language']
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_clean_video_languages_matches_per_language_regex(seed):
+    """Random strings of single word language names, noise and separators give the same languages as before.
+    Names changed by the cleanup, or starting a multi word name, are matched differently on purpose and left out.
+    """
+    language_names = get_language_tables().language_names
+    multi_word_starts = {name.split()[0] for name in language_names if len(clean_language_tokens(name)) > 1}
+    single_word_names = sorted(name for name in language_names
+                               if clean_language_tokens(name) == [name] and name not in multi_word_starts)
+    words = ['englsih', 'turksih', 'speech', 'speechh', 'part', 'narration', 'natural', 'mute', 'with', 'report', '']
+    separators = [' ', ', ', '/', '//', ' & ', '-', ' and ']
+
+    rng = random.Random(seed)
+    video_languages = []
+    for _ in range(200):
+        tokens = [rng.choice(single_word_names) if rng.random() < 0.4 else rng.choice(words)
+                  for _ in range(rng.randint(0, 6))]
+        text = ''.join(token + rng.choice(separators) for token in tokens)
+        video_languages.append(text.upper() if rng.random() < 0.2 else text)
+
+    parser = MultilanguageTransformation()
+    for video_language, languages in zip(video_languages, parser.clean_video_languages(video_languages)):
+        expected = per_language_regex_clean_video_language(video_language, language_names)
+        assert sorted(languages) == sorted(expected), video_language
@@ -0,0 +1,73 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import pytest
+from azure.core.exceptions import HttpResponseError
+from enrichment.entity_extractor.entity_extractor import EntityExtractor, EntityTypeConfig
+from enrichment.entity_extractor.ner_backend import GazetteerBackend, NerBackend
+from enrichment.entity_extractor.ner_cache import NerCache
+
+GAZETTEER = {"New York": "Location", "New York City": "Location", "York": "Location", "Alice Smith": "Person"}
+
+
+@pytest.mark.parametrize("document, expected", [
+    ("", None),
+    ("nothing to see", []),
+    ("Alice Smith lives in New York City.", [("Alice Smith", "Person", 0), ("New York City", "Location", 21)]),
+    ("New York, then York", [("New York", "Location", 0), ("York", "Location", 15)]),
+    ("new york and Alice  Smith", [("Alice  Smith", "Person", 13)]),
+    ("Newark is not New", []),
+])
+def test_gazetteer_backend(document, expected):
+    result, = GazetteerBackend(GAZETTEER).recognize_entities([document], language="en")
+    if expected is None:
+        assert result.is_error
+    else:
+        assert [(entity.text, entity.category, entity.offset) for entity in result.entities] == expected
+        assert all(document[entity.offset:entity.offset + entity.length] == entity.text for entity in result.entities)
+
+
+def test_gazetteer_backend_from_assets():
+    backend = GazetteerBackend.from_assets({"Paris": "Location"}, confidence_score=0.9)
+    result, = backend.recognize_entities(["NASA and the UN met in Paris, not the nasa"])
+    assert [(entity.text, entity.category, entity.confidence_score) for entity in result.entities] == [
+        ("NASA", "Organization", 0.9), ("UN", "Organization", 0.9), ("Paris", "Location", 0.9)]
+
+
+def test_extractor_with_gazetteer_backend():
+    """The whole NER pipeline runs offline, with concurrent batches and the cache"""
+    backend = GazetteerBackend.from_assets({"Alice Smith": "Person"}, latency=0.05)
+    extractor = EntityExtractor()
+    extractor.initialize_client(None, None, max_processes=2, max_string_length=30, max_concurrency=4, backend=backend)
+    extractor.initialize_entity_type_configs([EntityTypeConfig("Person", threshold=0.5),
+                                              EntityTypeConfig("Organization", threshold=0.5)])
+    extractor.initialize_cache(NerCache())
+    metadata = {"video_description": " ".join(f"Alice Smith met NATO {i}." for i in range(7)) + " The FBI and NASA."}
+
+    assert extractor.extract_entities(metadata) == {"Person": {"Alice Smith"}, "Organization": {"NATO", "FBI", "NASA"}}
+    # 8 chunks in 4 batches, sent at the same time
+    assert len(backend.calls) == 4
+    assert backend.max_in_flight == 4
+
+    extractor.extract_entities(metadata)
+    assert len(backend.calls) == 4
+
+
+@pytest.mark.parametrize("retry_after", [None, "3"])
+def test_gazetteer_backend_throttle(retry_after):
+    backend = GazetteerBackend(GAZETTEER, throttle=lambda documents, attempt: attempt <= 2, retry_after=retry_after)
+    for _ in range(2):
+        with pytest.raises(HttpResponseError) as error:
+            backend.recognize_entities(["Alice Smith"])
+        assert error.value.status_code == 429
+        assert getattr(error.value.response, "headers", {}).get("Retry-After") == retry_after
+    result, = backend.recognize_entities(["Alice Smith"])
+    assert [entity.text for entity in result.entities] == ["Alice Smith"]
+    assert backend.calls == [["Alice Smith"]] * 3
+    assert backend.throttled_calls == 2
+
+
+def test_ner_backend_is_abstract():
+    with pytest.raises(TypeError):
+        NerBackend()
@@ -0,0 +1,140 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import time
+import pytest
+from azure.ai.textanalytics import CategorizedEntity
+from enrichment.entity_extractor import ner_cache
+
+ENTITIES = [CategorizedEntity(text="Paris", category="Location", subcategory="City", length=5, offset=3, confidence_score=0.99),
+            CategorizedEntity(text="UN", category="Organization", subcategory=None, length=2, offset=12, confidence_score=0.8)]
+
+
+def test_cache_key():
+    key = ner_cache.cache_key("text", "en")
+    assert key == ner_cache.cache_key("text", "en", "latest")
+    assert key != ner_cache.cache_key("text", "fr")
+    assert key != ner_cache.cache_key("text", "en", "2022-10-01")
+    assert key != ner_cache.cache_key("text ", "en")
+
+
+def test_serialize_entities():
+    assert ner_cache.deserialize_entities(ner_cache.serialize_entities(ENTITIES)) == ENTITIES
+    assert ner_cache.deserialize_entities(ner_cache.serialize_entities([])) == []
+
+
+def test_lru_store_eviction():
+    store = ner_cache.LruStore(max_entries=2)
+    store.set("a", ENTITIES)
+    store.set("b", [])
+    assert store.get("a") == ENTITIES
+    store.set("c", [])
+    assert store.get("b") is None
+    assert store.get("a") == ENTITIES
+    assert len(store) == 2
+
+
+@pytest.mark.parametrize("store_type", ["memory", "sqlite"])
+def test_store_ttl(store_type, tmp_path):
+    if store_type == "memory":
+        store = ner_cache.LruStore(ttl_seconds=0.01)
+    else:
+        store = ner_cache.SqliteStore(str(tmp_path / "ner_cache.sqlite"), ttl_seconds=0.01)
+    store.set("a", ENTITIES)
+    assert store.get("a") == ENTITIES
+    time.sleep(0.02)
+    assert store.get("a") is None
+    assert len(store) == 0
+
+
+def test_sqlite_store_persistence(tmp_path):
+    path = str(tmp_path / "ner_cache.sqlite")
+    store = ner_cache.SqliteStore(path)
+    store.set("a", ENTITIES)
+    store.set("b", [])
+    store.close()
+    store = ner_cache.SqliteStore(path)
+    assert store.get("a") == ENTITIES
+    assert store.get("b") == []
+    assert store.get("c") is None
+
+
+def test_sqlite_store_eviction(tmp_path):
+    store = ner_cache.SqliteStore(str(tmp_path / "ner_cache.sqlite"), max_entries=2)
+    store.set("a", ENTITIES)
+    time.sleep(0.001)
+    store.set("b", [])
+    time.sleep(0.001)
+    assert store.get("a") == ENTITIES
+    time.sleep(0.001)
+    store.set("c", [])
+    assert len(store) == 2
+    assert store.get("b") is None
+    assert store.get("a") == ENTITIES
+
+
+def test_sqlite_store_counts_entries_once(tmp_path):
+    """The entries are counted when the database is opened, not on every insert"""
+    path = str(tmp_path / "ner_cache.sqlite")
+    store = ner_cache.SqliteStore(path, max_entries=3)
+    for key in ("a", "b", "a"):
+        store.set(key, [])
+        time.sleep(0.001)
+    store.close()
+
+    store = ner_cache.SqliteStore(path, max_entries=3)
+    statements = []
+    store._connection.set_trace_callback(statements.append)
+    store.set("c", [])
+    time.sleep(0.001)
+    store.set("d", [])
+    assert not any("COUNT" in statement for statement in statements)
+    assert len(store) == 3
+    assert store.get("b") is None
+    assert [store.get(key) for key in ("a", "c", "d")] == [[], [], []]
+
+
+def test_ner_cache_tiers(tmp_path):
+    persistent = ner_cache.SqliteStore(str(tmp_path / "ner_cache.sqlite"))
+    cache = ner_cache.NerCache(persistent=persistent)
+    assert cache.get("text", "en", "2022-10-01") is None
+    cache.put("text", "en", ENTITIES, "2022-10-01")
+    assert cache.get("text", "en", "2022-10-01") == ENTITIES
+    assert cache.get("text", "fr", "2022-10-01") is None
+
+    # a new process only has the persistent tier, hits are promoted to memory
+    cache = ner_cache.NerCache(persistent=persistent)
+    assert cache.get("text", "en", "2022-10-01") == ENTITIES
+    assert len(cache.memory) == 1
+    assert cache.stats() == {"hits": 1, "misses": 0, "hit_rate": 1.0}
+    # entries of another model are not served
+    assert cache.get("text", "en", "2023-04-01") is None
+
+
+def test_ner_cache_persistent_tier_requires_model_version(tmp_path):
+    cache = ner_cache.NerCache(persistent=ner_cache.SqliteStore(str(tmp_path / "ner_cache.sqlite")))
+    with pytest.raises(Exception):
+        cache.get("text", "en")
+    with pytest.raises(Exception):
+        cache.put("text", "en", ENTITIES)
+
+
+def test_ner_cache_store_interface():
+    class IncompleteStore(ner_cache.NerCacheStore):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteStore()
+
+
+def test_ner_cache_hit_rate():
+    cache = ner_cache.NerCache()
+    assert cache.hit_rate == 0
+    cache.put("a", "en", [])
+    cache.get("a", "en")
+    cache.get("b", "en")
+    cache.get("a", "en")
+    cache.get("c", "en")
+    assert (cache.hits, cache.misses, cache.hit_rate) == (2, 2, 0.5)
@@ -0,0 +1,74 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import json
+import random
+import pytest
+from enrichment.vi_insights_parser.selective_json import ALL_KEYS, loads_selected
+
+STRINGS = ["", "plain", "with \"quotes\" and \\ backslash", "brackets ]}[{ inside", "unicode é 日本  ", "\\\"", "{\"not\": [\"json\"]}"]
+KEYS = ["a", "b", "c", "[", "\"k\""]
+
+
+def random_value(rng, depth=0):
+    kind = rng.randint(0, 6 if depth < 4 else 3)
+    if kind == 0:
+        return rng.choice(STRINGS)
+    if kind == 1:
+        return rng.choice([0, -1.5, 1e20, 3])
+    if kind == 2:
+        return rng.choice([True, False, None])
+    if kind == 3:
+        return rng.choice(STRINGS) + str(rng.random())
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {key: random_value(rng, depth + 1) for key in rng.sample(KEYS, rng.randint(0, len(KEYS)))}
+
+
+def random_projection(rng, depth=0):
+    if depth > 3 or rng.random() < 0.3:
+        return rng.choice([True, False])
+    projection = {key: random_projection(rng, depth + 1) for key in rng.sample(KEYS, rng.randint(0, 3))}
+    if rng.random() < 0.5:
+        projection[ALL_KEYS] = random_projection(rng, depth + 1)
+    return projection
+
+
+def project(value, projection):
+    """Reference projection of a decoded value"""
+    if projection is True or not isinstance(value, (dict, list)):
+        return value
+    if isinstance(value, list):
+        return [project(element, projection) for element in value]
+    selected = {}
+    for key, element in value.items():
+        key_projection = projection.get(key, projection.get(ALL_KEYS, False))
+        if key_projection is not False:
+            selected[key] = project(element, key_projection)
+    return selected
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_loads_selected(seed):
+    rng = random.Random(seed)
+    value = random_value(rng)
+    projection = random_projection(rng)
+    document = json.dumps(value, indent=rng.choice([None, 2]), ensure_ascii=rng.random() < 0.5)
+    if isinstance(value, dict) and projection is not False:
+        assert loads_selected(document, projection) == project(value, projection)
+    assert loads_selected(document, True) == value
+    assert loads_selected(document.encode("utf-16"), True) == value
+
+
+@pytest.mark.parametrize("document", ['{"a": [1, 2}', '{"a": "x', '{"a" 1}', '{"a": 1} 2', '{"a": 1,}', '{a: 1}', '', '{"b": [1, {"c": "]"}'])
+def test_loads_selected_malformed(document):
+    with pytest.raises(json.JSONDecodeError):
+        loads_selected(document, {"a": True})
+
+
+def test_loads_selected_skips_values():
+    """Skipped values are dropped, brackets within their strings don't end them"""
+    document = '{"keep": {"x": 1, "drop": [{"big": [1, 2, "]"]}, "\\"}"]}, "drop": {"nested": [[[]]]}}'
+    assert loads_selected(document, {"keep": {"x": True}}) == {"keep": {"x": 1}}
+    assert loads_selected(document, {ALL_KEYS: {"x": True, "drop": False}}) == {"keep": {"x": 1}, "drop": {}}
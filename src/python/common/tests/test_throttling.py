@@ -0,0 +1,112 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import pytest
+from azure.core.exceptions import HttpResponseError, ServiceRequestError
+from enrichment.entity_extractor import throttling
+from enrichment.entity_extractor.ner_backend import throttled_error
+from enrichment.entity_extractor.throttling import RateLimiter, call_with_retry
+
+
+class FakeClock:
+    """Stand-in for the time module: sleeping advances the clock instantly and is recorded"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttling, "time", clock)
+    return clock
+
+
+def test_rate_limiter_without_budget(clock):
+    rate_limiter = RateLimiter()
+    for _ in range(100):
+        rate_limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_rate_limiter_spaces_requests(clock):
+    rate_limiter = RateLimiter(requests_per_second=50)
+    for _ in range(6):
+        rate_limiter.acquire()
+    assert clock.sleeps == pytest.approx([0.02] * 5)
+    assert clock.now - 1000.0 == pytest.approx(5 * 0.02)
+
+
+def test_rate_limiter_budget_recovers(clock):
+    rate_limiter = RateLimiter(requests_per_second=10)
+    rate_limiter.acquire()
+    clock.now += 1
+    rate_limiter.acquire()
+    assert clock.sleeps == []
+
+
+def test_call_with_retry():
+    errors = [throttled_error(), throttled_error("0")]
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return "result"
+    assert call_with_retry(func, backoff_seconds=0.001) == "result"
+    assert errors == []
+
+
+def test_call_with_retry_backoff(clock):
+    errors = [throttled_error(), throttled_error(), throttled_error("5"), throttled_error()]
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return "result"
+    assert call_with_retry(func, max_retries=4, backoff_seconds=1) == "result"
+    # doubled on every retry, unless the response has a Retry-After header
+    assert clock.sleeps == [1, 2, 5, 8]
+
+
+def test_call_with_retry_transient_errors(clock):
+    unavailable = HttpResponseError(message="Service Unavailable")
+    unavailable.status_code = 503
+    errors = [unavailable, ServiceRequestError("Connection refused")]
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return "result"
+    assert call_with_retry(func, backoff_seconds=1) == "result"
+    assert clock.sleeps == [1, 2]
+
+
+def test_call_with_retry_gives_up(clock):
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise throttled_error()
+    with pytest.raises(HttpResponseError):
+        call_with_retry(func, max_retries=2, backoff_seconds=1)
+    assert len(calls) == 3
+
+
+def test_call_with_retry_does_not_retry_other_errors():
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise HttpResponseError(message="Bad Request")
+    with pytest.raises(HttpResponseError):
+        call_with_retry(func, backoff_seconds=0.001)
+    assert len(calls) == 1
@@ -0,0 +1,112 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+from array import array
+from datetime import datetime
+import random
+import pytest
+from enrichment.insights_splitter.time_parser import TimeParser, parse_time_string, parse_many
+
+STRING_TIMES = ["0:00:00", "0:00:01.001", "0:00:12.0", "0:01:02.1234567", "1:00:00", "23:59:59.9999999"]
+
+
+def strptime_seconds(string_time):
+    """strptime based reference parser, keeping the fractional seconds"""
+    time_format = "%H:%M:%S.%f" if "." in string_time else "%H:%M:%S"
+    if "." in string_time:
+        # strptime accepts at most 6 fractional digits
+        whole, fraction = string_time.split(".")
+        string_time = f"{whole}.{fraction[:6]}"
+    return (datetime.strptime(string_time, time_format) - datetime(1900, 1, 1)).total_seconds()
+
+
+@pytest.mark.parametrize("string_time", STRING_TIMES)
+def test_parse_time_string(string_time):
+    """The fixed format parser truncates the fractional part by default"""
+    assert parse_time_string(string_time) == int(strptime_seconds(string_time))
+    assert TimeParser.string_time_to_seconds(string_time) == int(strptime_seconds(string_time))
+
+
+@pytest.mark.parametrize("string_time", STRING_TIMES)
+def test_parse_time_string_fractional(string_time):
+    assert parse_time_string(string_time, fractional=True) == pytest.approx(strptime_seconds(string_time), abs=1e-6)
+
+
+def test_parse_time_string_over_a_day():
+    assert parse_time_string("25:00:01.5") == 90001
+    assert parse_time_string("25:00:01.5", fractional=True) == 90001.5
+
+
+@pytest.mark.parametrize("fractional", [False, True])
+def test_parse_many(fractional):
+    seconds = parse_many(STRING_TIMES, fractional=fractional)
+    assert isinstance(seconds, array) and seconds.typecode == 'd'
+    assert list(seconds) == [parse_time_string(string_time, fractional) for string_time in STRING_TIMES]
+    assert len(parse_many([])) == 0
+
+
+@pytest.mark.parametrize("string_time", ["", "0:00", "a:00:00", "0:00:00:00"])
+@pytest.mark.parametrize("fractional", [False, True])
+def test_parse_time_string_invalid(string_time, fractional):
+    with pytest.raises(ValueError):
+        parse_time_string(string_time, fractional)
+
+
+def test_parse_time_string_invalid_fraction():
+    with pytest.raises(ValueError):
+        parse_time_string("0:00:00.1.2", fractional=True)
+
+
+def reference_related_intervals(interval, start, end):
+    """The original millisecond by millisecond implementation of get_related_intervals"""
+    intervals = []
+    if end - start < interval:
+        intervals.append(int(start) - int(start) % interval)
+    for i in range(int(start), int(end)):
+        if i % interval == 0:
+            intervals.append(i)
+    return intervals
+
+
+def random_appearances(seed, count=100):
+    rng = random.Random(seed)
+    appearances = []
+    for _ in range(count):
+        start = rng.choice([rng.randint(0, 100000), rng.uniform(0, 100000), rng.randrange(0, 100000, 1000)])
+        span = rng.choice([0, rng.randint(0, 1000), rng.uniform(0, 30000), rng.randrange(0, 30000, 1000), -rng.randint(1, 500)])
+        appearances.append((start, start + span))
+    return appearances
+
+
+@pytest.fixture
+def time_parser(monkeypatch, request):
+    monkeypatch.setenv("MILLISECONDS_INTERVAL", str(request.param))
+    return TimeParser()
+
+
+@pytest.mark.parametrize("time_parser", [1, 7, 1000, 10000], indirect=True)
+@pytest.mark.parametrize("seed", range(5))
+def test_get_related_intervals(time_parser, seed):
+    """Arithmetic intervals are equal to the ones of the original loop on random appearances"""
+    for start, end in random_appearances(seed):
+        assert time_parser.get_related_intervals(start, end) == \
+            reference_related_intervals(time_parser.interval_in_milliseconds, start, end)
+
+
+@pytest.mark.parametrize("time_parser", [1, 7, 1000, 10000], indirect=True)
+@pytest.mark.parametrize("seed", range(5))
+def test_get_related_intervals_many(time_parser, seed):
+    appearances = random_appearances(seed)
+    intervals, offsets = time_parser.get_related_intervals_many([start for start, _ in appearances],
+                                                                [end for _, end in appearances])
+    assert len(offsets) == len(appearances) + 1
+    for k, (start, end) in enumerate(appearances):
+        assert intervals[offsets[k]:offsets[k + 1]].tolist() == time_parser.get_related_intervals(start, end)
+
+
+@pytest.mark.parametrize("time_parser", [10000], indirect=True)
+def test_get_related_intervals_many_empty(time_parser):
+    intervals, offsets = time_parser.get_related_intervals_many([], [])
+    assert len(intervals) == 0
+    assert offsets.tolist() == [0]
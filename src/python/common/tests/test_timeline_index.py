@@ -0,0 +1,58 @@
+"""
+Copyright (c) Microsoft Corporation.
+Licensed under the MIT license.
+"""
+import pytest
+from enrichment.insights_splitter.timeline_index import TimelineIndex
+from enrichment.insights_splitter.time_parser import TimeParser
+
+VI_INSIGHTS = {
+    "videos": [
+        {
+            "insights": {
+                "languages": ["en-US"],
+                "labels": [
+                    {"id": 1, "instances": [{"start": "0:00:00", "end": "0:00:04.04"},
+                                            {"start": "0:00:10.5", "end": "0:01:02.1234567"}]},
+                    {"id": 2, "instances": []},
+                    {"id": 3, "instances": [{"start": "1:00:00", "end": "1:00:05"}]},
+                ],
+                "shots": [
+                    {"id": 1, "instances": [{"start": "0:00:00", "end": "0:00:30"}]},
+                    {"id": 2, "instances": [{"start": "0:00:30", "end": "0:01:10"}]},
+                ],
+            }
+        }
+    ]
+}
+
+
+@pytest.fixture
+def timeline():
+    return TimelineIndex(VI_INSIGHTS)
+
+
+@pytest.mark.parametrize("key, item_index, instance_index", [("labels", 0, 0), ("labels", 0, 1), ("labels", 2, 0),
+                                                             ("shots", 0, 0), ("shots", 1, 0)])
+def test_timeline_matches_time_parser(timeline, key, item_index, instance_index):
+    """Every indexed timestamp is equal to the one parsed by TimeParser"""
+    instance = VI_INSIGHTS["videos"][0]["insights"][key][item_index]["instances"][instance_index]
+    assert timeline.start(key, item_index, instance_index) == TimeParser.string_time_to_seconds(instance["start"])
+    assert timeline.end(key, item_index, instance_index) == TimeParser.string_time_to_seconds(instance["end"])
+
+
+def test_timeline_flat_arrays(timeline):
+    """Instances are stored flat in traversal order together with the index of their item"""
+    assert list(timeline.starts("labels")) == [0, 10, 3600]
+    assert list(timeline.ends("labels")) == [4, 62, 3605]
+    assert list(timeline.items("labels")) == [0, 0, 2]
+    assert list(timeline.offsets("labels")) == [0, 2, 2, 3]
+
+
+def test_timeline_keys():
+    """Only the requested lists of insights are indexed, items without instances are skipped"""
+    timeline = TimelineIndex(VI_INSIGHTS, keys=["shots", "missing"])
+    assert "shots" in timeline
+    assert "labels" not in timeline
+    assert "missing" not in timeline
+    assert len(TimelineIndex(VI_INSIGHTS).starts("languages")) == 0
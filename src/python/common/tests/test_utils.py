@@ -2,7 +2,9 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
+import random
 import pytest
+from enrichment.entity_extractor import utils
 from enrichment.entity_extractor.utils import remove_substring_elements
 from enrichment.entity_extractor.utils import perform_capitalize_propernouns
 
@@ -50,3 +52,58 @@ def test_remove_substring_elements(test_input, expected_output):
 )
 def test_smart_capitalize_entities(test_input, expected_output):
     assert perform_capitalize_propernouns(test_input) == expected_output
+
+
+def reference_remove_substring_elements(elements):
+    """The original quadratic implementation of remove_substring_elements"""
+    sorted_elements = sorted(elements, key=lambda elem: (len(elem), elem))
+    return set(
+        [
+            j
+            for i, j in enumerate(sorted_elements)
+            if all(j not in k for k in sorted_elements[i + 1:])
+        ]
+    )
+
+
+def random_elements(seed, max_count=40):
+    """Random set over a small alphabet, where many items are substrings of others"""
+    rng = random.Random(seed)
+    alphabet = rng.choice(["ab", "abc", "ab ", "abcdefgh"])
+    return set("".join(rng.choice(alphabet) for _ in range(rng.randint(0, 8))) for _ in range(rng.randint(0, max_count)))
+
+
+@pytest.mark.parametrize("seed", range(200))
+@pytest.mark.parametrize("implementation", [utils._remove_substring_elements_by_scan,
+                                            utils._remove_substring_elements_by_automaton])
+def test_remove_substring_elements_matches_reference(seed, implementation):
+    elements = random_elements(seed)
+    assert implementation(elements) == reference_remove_substring_elements(elements)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_remove_substring_elements_large_sets(seed):
+    elements = random_elements(seed, max_count=2000) | {str(i) for i in range(utils.AHO_CORASICK_MIN_ELEMENTS)}
+    assert remove_substring_elements(elements) == reference_remove_substring_elements(elements)
+
+
+@pytest.mark.parametrize("implementation", [utils._remove_substring_elements_by_scan,
+                                            utils._remove_substring_elements_by_automaton])
+@pytest.mark.parametrize("test_input, expected_output", [(set(), set()), ({""}, {""}), ({"", "a"}, {"a"})])
+def test_remove_substring_elements_empty_strings(implementation, test_input, expected_output):
+    assert implementation(test_input) == expected_output
+
+
+def test_capitalizer():
+    capitalizer = utils.Capitalizer({"nato": "NATO", "a-100": "A-100"}, ["of", "the"])
+    assert capitalizer.capitalize("secretary of the nato") == "Secretary of the NATO"
+    assert capitalizer.capitalize("a-100 o'neil") == "A-100 O'neil"
+    assert capitalizer.capitalize_many(["paris", "UN office", "paris", ""]) == ["Paris", "UN Office", "Paris", ""]
+    assert capitalizer.capitalize.cache_info().hits == 1
+    assert isinstance(capitalizer.exceptions, frozenset)
+
+
+def test_get_capitalizer():
+    capitalizer = utils.get_capitalizer()
+    assert utils.get_capitalizer() is capitalizer
+    assert capitalizer.capitalize("ministry of defense") == "Ministry of Defense"
@@ -2,6 +2,8 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
+import json
+from copy import deepcopy
 import pytest
 from enrichment.vi_insights_parser.vi_insights_parser import ViInsightsParser
 from tests.assets.tests_vi_insights_parser import *
@@ -55,3 +57,66 @@ def test_extract_names_without_any_missing(mock_content, expected):
     parsed = parser.parse_vi_insights(mock_content)
 
     assert set(parsed) == set(expected)
+
+
+@pytest.mark.parametrize(
+    "mock_content", [content for content, _ in EXPECTED_INSIGHTS + NO_CONTENT + MULTI_LANGUAGE + INSIGHTS_WITH_ALL_NAMES_TO_EXTRACT])
+def test_selective_load(mock_content):
+    """Parsing the selectively loaded insights gives the same result as parsing the whole insights"""
+    document = json.dumps(mock_content)
+    raw_insights = ViInsightsParser.loads_vi_insights(document, selective=True)
+    assert "thumbnails" not in json.dumps(raw_insights)
+    parser = ViInsightsParser()
+    assert parser.parse_vi_insights(raw_insights) == parser.parse_vi_insights(json.loads(document))
+
+
+def test_parse_vi_insights_does_not_modify_input():
+    """The raw insights can be shared: they are left untouched and the parsed collections are new lists"""
+    raw_insights = {
+        "id": "abc",
+        "videos": [{"insights": {
+            "faces": [{"name": "Alice", "thumbnails": [{"id": "t"}], "instances": [{"start": "0:00:00"}]}, {"id": 2}],
+            "namedPeople": [{"name": "Bob"}],
+            "transcript": [{"text": "hello"}],
+        }}],
+    }
+    expected_raw_insights = deepcopy(raw_insights)
+    parsed = ViInsightsParser().parse_vi_insights(raw_insights)
+    assert raw_insights == expected_raw_insights
+
+    assert parsed["faces"] == [{"name": "Alice"}, {"id": 2}]
+    assert parsed["faces_names"] == ["Alice"]
+    assert parsed["named_people_names"] == ["Bob"]
+    parsed["named_people"].append({"name": "Carol"})
+    parsed["transcript"].clear()
+    assert raw_insights == expected_raw_insights
+
+
+def test_extract_faces_insights():
+    video_insights = {"faces": [{"name": "Alice", "thumbnails": [{"id": "t"}], "instances": [{"start": "0:00:00"}]}, {"id": 2}]}
+    expected_video_insights = deepcopy(video_insights)
+    assert ViInsightsParser.extract_faces_insights(video_insights) == [{"name": "Alice"}, {"id": 2}]
+    assert video_insights == expected_video_insights
+
+
+@pytest.mark.parametrize("mock_content", [content for content, _ in EXPECTED_INSIGHTS + NO_CONTENT + MULTI_LANGUAGE])
+@pytest.mark.parametrize("key, field", [("namedPeople", "named_people"), ("namedLocations", "named_locations"),
+                                        ("transcript", "transcript"), ("faces", "faces"), ("ocr", "ocr"), ("missing", None)])
+def test_check_video_insights_value(mock_content, key, field):
+    """The collections are the ones of the parsed insights, new lists, and the insights are left untouched"""
+    raw_insights = deepcopy(mock_content)
+    parser = ViInsightsParser()
+    value = parser.check_video_insights_value(raw_insights, key)
+    assert value == (parser.parse_vi_insights(raw_insights)[field] if field is not None else [])
+    value.append({"name": "extra"})
+    assert raw_insights == mock_content
+
+
+def test_load_vi_insights_decodes_everything_by_default(tmp_path):
+    document = json.dumps(EXPECTED_INSIGHTS[0][0])
+    filepath = tmp_path / "insights.json"
+    filepath.write_text(document)
+    assert ViInsightsParser.loads_vi_insights(document) == json.loads(document)
+    assert ViInsightsParser().load_vi_insights(str(filepath)) == json.loads(document)
+    assert ViInsightsParser().load_vi_insights(str(filepath), selective=True) == \
+        ViInsightsParser.loads_vi_insights(document, selective=True)
@@ -2,11 +2,14 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
+import bisect
 from copy import deepcopy
 from typing import OrderedDict
 import pytest
 from enrichment.insights_splitter.insights_to_segments_splitter import VIinsightsToSegmentsSplitter
+from enrichment.insights_splitter.time_parser import TimeParser
 import json
+import random
 from tests.assets.tests_vi_insights_parser import EXPECTED_INSIGHTS, SPLIT_SCENES, INFO_PIECE
 
 
@@ -84,17 +87,26 @@ def test_return_single_element(load_splitter):
                                                                        ('shots', 65, 2)  # There are 2 shots in the example
                                                                        ]
                          )
-def test_initialize_segments(load_splitter, segment_type, interval_duration, expected):
+def test_segments_count(load_splitter, segment_type, interval_duration, expected):
     """
-        This code initializes the segments into the correct number of bins.
+        This code splits the insights into the correct number of bins.
         The expected number represents the number of bins which should be created based on the provided vi_insights template
     """
 
     vi_insights = deepcopy(SPLIT_SCENES)
     splitter = deepcopy(load_splitter)
-    splitter.interval_duration = interval_duration
-    res = splitter._initialize_segments(vi_insights, segment_type)
-    assert len(list(res.keys())) == expected
+    res = list(splitter.iter_segments(vi_insights, segment_type, interval_duration=interval_duration))
+    assert len(res) == expected
+
+
+def single_instance_segments(splitter, segment_keys, instance, overlap):
+    """Splits insights made of a single label instance into intervals of 5 seconds starting at segment_keys"""
+    info_piece = dict(INFO_PIECE, instances=[instance])
+    vi_insights = {"id": "single", "durationInSeconds": segment_keys[-1] + 4,
+                   "videos": [{"insights": {"labels": [info_piece]}}]}
+    segments = OrderedDict(splitter.iter_segments(vi_insights, 'interval', overlap=overlap, interval_duration=5))
+    assert list(segments.keys()) == segment_keys
+    return segments, info_piece
 
 
 @pytest.mark.parametrize("segment_keys, instance, expected", [
@@ -106,30 +118,20 @@ def test_initialize_segments(load_splitter, segment_type, interval_duration, exp
                         ([0, 5, 10], {"start": "0:00:04.03", "end": "0:00:08.0"}, 0),
 ]
 )
-def test_split_key_insights_first(load_splitter, segment_keys, instance, expected):
+def test_split_first(load_splitter, segment_keys, instance, expected):
     """The code verifies the assignment of instances into the first relevant bin
     """
     splitter = deepcopy(load_splitter)
     key_name = 'labels'
-    info_piece = INFO_PIECE
-
-    # initialize segments with segment keys
-    segments = OrderedDict()
-    for key in segment_keys:
-        segments[key] = {'videos': [{'insights': {}}]}
-
-    result = splitter._split_key_insights_first(segments=segments,
-                                                segment_keys=segment_keys,
-                                                key=key_name,
-                                                instance=instance,
-                                                info_piece=info_piece)
+    result, info_piece = single_instance_segments(splitter, segment_keys, instance, 'first')
+
     # make sure only the first relevant bin is filled
-    assert result[expected]['videos'][0]['insights'][key_name][0] == info_piece
+    assert result[expected]['videos'][0]['insights'][key_name] == [info_piece]
 
     # make sure all other bins are empty
     other_keys = set(segment_keys) - set([expected])
     for other_key in other_keys:
-        assert key_name not in result[other_key]['videos'][0]['insights']
+        assert result[other_key]['videos'][0]['insights'][key_name] == []
 
 
 @pytest.mark.parametrize("segment_keys, instance, expected", [
@@ -141,29 +143,130 @@ def test_split_key_insights_first(load_splitter, segment_keys, instance, expecte
                         ([0, 5, 10], {"start": "0:00:04.03", "end": "0:00:08.0"}, [0, 5]),
 ]
 )
-def test_split_key_insights_duplicate(load_splitter, segment_keys, instance, expected):
+def test_split_duplicate(load_splitter, segment_keys, instance, expected):
     """The code verifies the assignment of instances into the all relevant bins spanning over the instance
     """
     splitter = deepcopy(load_splitter)
     key_name = 'labels'
-    info_piece = INFO_PIECE
-
-    # initialize segments with segment keys
-    segments = OrderedDict()
-    for key in segment_keys:
-        segments[key] = {'videos': [{'insights': {}}]}
-
-    result = splitter._split_key_insights_duplicate(segments=segments,
-                                                    segment_keys=segment_keys,
-                                                    key=key_name,
-                                                    instance=instance,
-                                                    info_piece=info_piece)
+    result, info_piece = single_instance_segments(splitter, segment_keys, instance, 'duplicate')
 
     for bin_ind in expected:
         # make sure all relevant bins are filled
-        assert result[bin_ind]['videos'][0]['insights'][key_name][0] == info_piece
+        assert result[bin_ind]['videos'][0]['insights'][key_name] == [info_piece]
 
     # make sure all other bins are empty
     other_keys = set(segment_keys) - set(expected)
     for other_key in other_keys:
-        assert key_name not in result[other_key]['videos'][0]['insights']
+        assert result[other_key]['videos'][0]['insights'][key_name] == []
+
+
+@pytest.mark.parametrize("segment_type", [('interval'), ('scenes'), ('shots')])
+def test_segments_share_static_fields(load_splitter, segment_type):
+    """Segments reference the static fields of the original insights and only own their insights lists
+    """
+    vi_insights = deepcopy(SPLIT_SCENES)
+    splitter = deepcopy(load_splitter)
+    res = [segment for _, segment in splitter.iter_segments(vi_insights, segment_type, interval_duration=60)]
+
+    first_insights = res[0]['videos'][0]['insights']
+    for segment in res[1:]:
+        insights = segment['videos'][0]['insights']
+        # static fields are shared, not copied
+        assert insights['languages'] is first_insights['languages']
+        # per segment insights are independent
+        for key in splitter.configuration['INSIGHTS_TO_PARSE']:
+            assert insights[key] is not first_insights[key]
+
+    # the original insights are left untouched
+    assert vi_insights == SPLIT_SCENES
+
+
+def test_materialize(load_splitter):
+    """Materialized segments are equal to the original segment but don't share any content
+    """
+    vi_insights = deepcopy(SPLIT_SCENES)
+    splitter = deepcopy(load_splitter)
+    _, segment = next(splitter.iter_segments(vi_insights, 'scenes'))
+    materialized = splitter.materialize(segment)
+
+    assert materialized == segment
+    materialized['videos'][0]['insights']['languages'].append('fr-FR')
+    assert vi_insights['videos'][0]['insights']['languages'] == ['en-US']
+
+
+def random_vi_insights(seed, duration=300, shots=25):
+    """Generates a VI insights document with random instances, some spanning many segments"""
+    rng = random.Random(seed)
+
+    def to_time(seconds):
+        minutes, secs = divmod(seconds, 60)
+        return f"0:{int(minutes):02d}:{secs:06.3f}"
+
+    insights = {"shots": [{"id": i, "instances": [{"start": to_time(i * duration / shots),
+                                                   "end": to_time((i + 1) * duration / shots)}]} for i in range(shots)]}
+    for key in ("labels", "topics", "ocr"):
+        insights[key] = []
+        for item_id in range(rng.randint(0, 30)):
+            instances = []
+            for _ in range(rng.randint(1, 4)):
+                start = rng.uniform(0, duration - 1)
+                instances.append({"start": to_time(start), "end": to_time(min(duration - 1, start + rng.expovariate(1 / 40)))})
+            insights[key].append({"id": item_id, "instances": instances})
+    return {"id": "random", "durationInSeconds": duration, "videos": [{"insights": insights}]}
+
+
+def reference_split(splitter, vi_insights, segment_type, keys_to_extract, overlap, interval_duration):
+    """
+        Baseline splitting algorithm: every instance is parsed and assigned on its own, with a bisect over the
+        segment start times, to the first segment ('first') or to every segment it spans ('duplicate')
+    """
+    splitter.overlap = overlap
+    splitter.interval_duration = interval_duration
+    mutual_insights = splitter._attach_mutual_info_to_segments(vi_insights)
+    segments = OrderedDict((start, splitter._new_segment(mutual_insights))
+                           for start in splitter._segment_starts(vi_insights, segment_type))
+    segment_keys = list(segments.keys())
+    for key in keys_to_extract:
+        for info_piece in vi_insights['videos'][0]['insights'].get(key, []):
+            for instance in info_piece['instances']:
+                first = bisect.bisect_right(segment_keys, TimeParser.string_time_to_seconds(instance['start'])) - 1
+                last = first
+                if overlap == 'duplicate':
+                    last = bisect.bisect_right(segment_keys, TimeParser.string_time_to_seconds(instance['end'])) - 1
+                for bin_index in range(first, last + 1):
+                    insights = segments[segment_keys[bin_index]]['videos'][0]['insights']
+                    insights.setdefault(key, []).append(info_piece)
+    return segments
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("segment_type", [('interval'), ('scenes'), ('shots')])
+@pytest.mark.parametrize("overlap", [('first'), ('duplicate')])
+def test_iter_segments_matches_per_instance_assignment(load_splitter, seed, segment_type, overlap):
+    """Streamed segments come in time order and are identical to assigning instances one at a time
+    """
+    vi_insights = random_vi_insights(seed)
+    vi_insights['videos'][0]['insights']['scenes'] = vi_insights['videos'][0]['insights']['shots'][::5]
+    keys_to_extract = ['labels', 'topics', 'ocr', 'missing']
+    splitter = deepcopy(load_splitter)
+    streamed = list(splitter.iter_segments(vi_insights, segment_type, overlap=overlap, interval_duration=7,
+                                           keys_to_extract=keys_to_extract))
+
+    starts = [start for start, _ in streamed]
+    assert starts == sorted(starts)
+    expected = reference_split(deepcopy(load_splitter), vi_insights, segment_type, keys_to_extract, overlap, 7)
+    assert OrderedDict(streamed) == expected
+
+
+def test_duplicate_segments_own_their_lists(load_splitter):
+    """Consecutive segments overlapped by the same instances get equal but distinct insights lists
+    """
+    vi_insights = random_vi_insights(1)
+    segments = list(load_splitter.split_vi_insights(vi_insights, 'interval', overlap='duplicate',
+                                                    interval_duration=1).values())
+    for previous, current in zip(segments, segments[1:]):
+        previous_insights = previous['videos'][0]['insights']
+        current_insights = current['videos'][0]['insights']
+        for key in set(previous_insights) & set(current_insights):
+            if isinstance(current_insights[key], list):
+                assert current_insights[key] is not previous_insights[key]
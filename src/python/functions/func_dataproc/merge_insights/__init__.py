@@ -10,22 +10,61 @@ The following insights are merged:
 - Video Indexer Insights JSON
 - Parsed NewsML JSON
 - NER extracts from the Metadata
+- NER extracts from the Video Indexer transcript and OCR, when enabled
 
 The function returns the new merged JSON document.
 """
-import json
 import logging
 import os
 import re
+import threading
+from itertools import chain
 
 from azure.identity import DefaultAzureCredential
 from azure.storage.blob import BlobClient, BlobServiceClient
-from enrichment.entity_extractor.entity_extractor import (EntityExtractor,
-                                                          EntityTypeConfig)
+from enrichment import json_codec
+from enrichment.entity_extractor.entity_extractor import EntityTypeConfig
+from enrichment.entity_extractor.extractor_registry import get_entity_extractor
+from enrichment.entity_extractor.ner_cache import NerCache, SqliteStore
 from enrichment.insights_combiner.insights_combiner import InsightsCombiner
 from enrichment.vi_insights_parser.vi_insights_parser import ViInsightsParser
 from shared.constants import LOG_PREFIX, STORAGE_ENV_VAR, STORAGE_TIER_SILVER
 
+# Entries expire so that updates of the latest NER model are picked up
+NER_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+
+def create_ner_cache():
+    """
+    Returns the cache of the entities of the metadata chunks, shared by the invocations of a worker. When
+    NER_CACHE_PATH is set, the entities are also kept on local disk, keyed by the NER model version pinned by
+    TEXTANALYTICS_MODEL_VERSION: entries of the latest model would otherwise outlive its updates until they expire.
+    """
+    path = os.getenv('NER_CACHE_PATH')
+    if not path:
+        return NerCache(ttl_seconds=NER_CACHE_TTL_SECONDS)
+    if not os.getenv('TEXTANALYTICS_MODEL_VERSION'):
+        raise Exception('NER_CACHE_PATH requires TEXTANALYTICS_MODEL_VERSION to be set')
+    return NerCache(ttl_seconds=NER_CACHE_TTL_SECONDS,
+                    persistent=SqliteStore(path, ttl_seconds=NER_CACHE_TTL_SECONDS))
+
+
+_ner_cache = None
+_ner_cache_lock = threading.Lock()
+
+
+def get_ner_cache():
+    """
+    Returns the NER cache shared by the invocations of the worker, created on the first call only, so that a
+    misconfigured cache fails the invocations instead of the import of the function app.
+    """
+    global _ner_cache
+    if _ner_cache is None:
+        with _ner_cache_lock:
+            if _ner_cache is None:
+                _ner_cache = create_ner_cache()
+    return _ner_cache
+
 
 def find_latest_metadata(blobs):
     """Find the latest metadata file in a list of blobs."""
@@ -43,12 +82,14 @@ def find_latest_metadata(blobs):
     return latest_blob
 
 
-def extract_ner(metadata):
-    """Run the NER extraction process."""
-    ner_extractor = EntityExtractor()
+def get_ner_extractor():
+    """Returns the NER extractor shared by the invocations of the worker."""
     endpoint = os.environ['TEXTANALYTICS_ENDPOINT']
     key = os.environ['TEXTANALYTICS_KEY']
-    ner_extractor.initialize_client(endpoint, key)
+    # Optional, number of NER requests in flight at the same time
+    max_concurrency = int(os.getenv('TEXTANALYTICS_MAX_CONCURRENCY', '1'))
+    # Optional, the latest model by default. Required by the NER cache kept on local disk
+    model_version = os.getenv('TEXTANALYTICS_MODEL_VERSION') or None
 
     locations_ner_config = EntityTypeConfig('Location',
                                             threshold=0.9,
@@ -64,17 +105,37 @@ def extract_ner(metadata):
                                                 add_from_metadata=['company_names'],
                                                 remove_substrings=True)
 
-    ner_extractor.initialize_entity_type_configs([locations_ner_config, people_ner_config, organizations_ner_config])
-    ner_insights = ner_extractor.extract_entities(metadata)
+    return get_entity_extractor(endpoint, key,
+                                [locations_ner_config, people_ner_config, organizations_ner_config],
+                                ner_cache=get_ner_cache(), max_concurrency=max_concurrency, model_version=model_version)
+
+
+def extract_ner(metadata):
+    """Run the NER extraction process, with the extractor shared by the invocations of the worker."""
+    ner_insights = get_ner_extractor().extract_entities(metadata)
 
     return ner_insights
 
 
+def extract_timed_ner(parsed_vi_insights):
+    """
+    Run the NER extraction process over the timed lines of the Video Indexer insights listed in
+    TEXTANALYTICS_VI_FIELDS (e.g. 'transcript,ocr'), returning the entities with their appearances.
+    Returns None when TEXTANALYTICS_VI_FIELDS is not set.
+    """
+    fields = [field.strip() for field in os.getenv('TEXTANALYTICS_VI_FIELDS', '').split(',') if field.strip()]
+    if not fields:
+        return None
+
+    lines = chain.from_iterable(parsed_vi_insights.get(field) or [] for field in fields)
+    return get_ner_extractor().extract_timed_entities(lines)
+
+
 def main(message):
     """merge_insights Activity Function: merge all insights into a single document."""
 
     try:
-        message_dict = json.loads(message)
+        message_dict = json_codec.loads(message)
 
         # Assemble base information
         storage_uri = os.environ[f'{STORAGE_ENV_VAR}__blobServiceUri']
@@ -98,18 +159,21 @@ def main(message):
         vi_insights = vi_blob_client.download_blob().readall()
 
         metadata_blob_client = BlobClient.from_blob_url(metadata_uri, DefaultAzureCredential())
-        metadata = json.loads(metadata_blob_client.download_blob().readall())
+        metadata = json_codec.loads(metadata_blob_client.download_blob().readall())
 
-        # Parse the Video Indexer insights
+        # Parse the Video Indexer insights, decoding only the values kept by the parser
         vi_parser = ViInsightsParser()
-        parsed_vi_insights = vi_parser.parse_vi_insights(json.loads(vi_insights))
+        parsed_vi_insights = vi_parser.parse_vi_insights(vi_parser.loads_vi_insights(vi_insights, selective=True))
 
         # NER extraction
         ner_insights = extract_ner(metadata)
+        ner_appearances = extract_timed_ner(parsed_vi_insights)
+        timed_insights = {} if ner_appearances is None else {'ner_appearances': ner_appearances}
 
         # Execute the merge
         combiner = InsightsCombiner()
-        final_doc = combiner.combine_insights(vi_insights=parsed_vi_insights, metadata=metadata, ner_insights=ner_insights)
+        final_doc = combiner.combine_insights(vi_insights=parsed_vi_insights, metadata=metadata, ner_insights=ner_insights,
+                                              **timed_insights)
 
         logging.info(f"{LOG_PREFIX} merged document")
 
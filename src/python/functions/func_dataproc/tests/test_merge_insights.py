@@ -2,6 +2,7 @@
 Copyright (c) Microsoft Corporation.
 Licensed under the MIT license.
 """
+import importlib
 import json
 import os
 from unittest import mock
@@ -9,8 +10,11 @@ from unittest import mock
 import pytest
 from azure.storage.blob import BlobClient, BlobProperties
 
+from enrichment.entity_extractor.extractor_registry import clear_entity_extractors, get_entity_extractor, get_shared_transport
+
 with mock.patch.dict(os.environ, {'LOG_PREFIX': 'prefix'}):
-    from merge_insights import main
+    import merge_insights
+    from merge_insights import create_ner_cache, extract_ner, extract_timed_ner, get_ner_cache, main
 
 MOCK_BLOBS_1 = [
     BlobProperties(name='FOOBAR/parsed_1.json'),
@@ -49,3 +53,68 @@ def test_merge_insights(mock_blob, mock_service, blob_list, blob_expected):
     mock_service.assert_called_once()
     assert mock_blob.call_count == 2
     assert mock_blob.call_args.args[0] == blob_expected
+
+
+@mock.patch.dict(os.environ, {'TEXTANALYTICS_ENDPOINT': 'https://fake.cognitiveservices.azure.com/'})
+@mock.patch.dict(os.environ, {'TEXTANALYTICS_KEY': 'foo'})
+def test_extract_ner_reuses_transport():
+    """Repeated invocations use the same NER client, over the shared HTTP transport"""
+    extractors = []
+
+    def record_extractor(*args, **kwargs):
+        extractors.append(get_entity_extractor(*args, **kwargs))
+        return extractors[-1]
+
+    clear_entity_extractors()
+    try:
+        with mock.patch('merge_insights.get_entity_extractor', side_effect=record_extractor), \
+                mock.patch('enrichment.entity_extractor.entity_extractor.TextAnalyticsClient') as client_class:
+            extract_ner({})
+            extract_ner({})
+    finally:
+        clear_entity_extractors()
+
+    first, second = extractors
+    assert first is second
+    client_class.assert_called_once()
+    assert client_class.call_args.kwargs['transport'] is get_shared_transport()
+
+
+@mock.patch.dict(os.environ, {'TEXTANALYTICS_ENDPOINT': 'https://fake.cognitiveservices.azure.com/'})
+@mock.patch.dict(os.environ, {'TEXTANALYTICS_KEY': 'foo'})
+def test_extract_timed_ner_is_opt_in():
+    parsed_vi_insights = {'transcript': [{'text': 'Alice', 'instances': []}], 'ocr': [{'text': 'Bob', 'instances': []}]}
+    extractor = mock.Mock()
+    with mock.patch('merge_insights.get_entity_extractor', return_value=extractor):
+        assert extract_timed_ner(parsed_vi_insights) is None
+        with mock.patch.dict(os.environ, {'TEXTANALYTICS_VI_FIELDS': 'transcript, ocr'}):
+            assert extract_timed_ner(parsed_vi_insights) is extractor.extract_timed_entities.return_value
+
+    lines, = extractor.extract_timed_entities.call_args.args
+    assert [line['text'] for line in lines] == ['Alice', 'Bob']
+
+
+def test_create_ner_cache(tmp_path):
+    with mock.patch.dict(os.environ, {'NER_CACHE_PATH': ''}):
+        assert create_ner_cache().persistent is None
+    with mock.patch.dict(os.environ, {'NER_CACHE_PATH': str(tmp_path / 'ner_cache.sqlite'), 'TEXTANALYTICS_MODEL_VERSION': ''}):
+        with pytest.raises(Exception):
+            create_ner_cache()
+    with mock.patch.dict(os.environ, {'NER_CACHE_PATH': str(tmp_path / 'ner_cache.sqlite'),
+                                      'TEXTANALYTICS_MODEL_VERSION': '2022-10-01'}):
+        assert create_ner_cache().persistent is not None
+
+
+@mock.patch.dict(os.environ, {'TEXTANALYTICS_ENDPOINT': 'https://fake.cognitiveservices.azure.com/'})
+@mock.patch.dict(os.environ, {'TEXTANALYTICS_KEY': 'foo'})
+def test_ner_cache_is_created_by_the_first_invocation(tmp_path):
+    """A persistent cache without model version fails the invocations, not the import of the function app"""
+    with mock.patch.dict(os.environ, {'LOG_PREFIX': 'prefix', 'NER_CACHE_PATH': str(tmp_path / 'ner_cache.sqlite'),
+                                      'TEXTANALYTICS_MODEL_VERSION': ''}), \
+            mock.patch.object(merge_insights, '_ner_cache', None):
+        importlib.reload(merge_insights)
+        with pytest.raises(Exception, match='TEXTANALYTICS_MODEL_VERSION'):
+            extract_ner({})
+    with mock.patch.dict(os.environ, {'NER_CACHE_PATH': ''}), mock.patch.object(merge_insights, '_ner_cache', None):
+        assert get_ner_cache() is get_ner_cache()
+        assert get_ner_cache().persistent is None
@@ -25,13 +25,13 @@ The trigger will modify the following fields:
 - matching_video_name: will append the article_id to make sure it is unique.
 """
 
-import json
 import logging
 import os
 
 import azure.functions as func
 from azure.identity import DefaultAzureCredential
 from azure.storage.blob import BlobClient
+from enrichment import json_codec
 from enrichment.metadata_parser.metadata_parser import MetadataParser
 
 PREFIX = os.environ['LOG_PREFIX']
@@ -54,7 +54,7 @@ def main(blob: func.InputStream, msg: func.Out[str]):
 
     try:
         # Read the incoming blob data
-        json_data = json.loads(blob.read())
+        json_data = json_codec.loads(blob.read())
 
         logging.info(f"{LOG_PREFIX} loaded JSON file: {blob.name}")
 
@@ -97,19 +97,19 @@ def main(blob: func.InputStream, msg: func.Out[str]):
     # Add properties required for data processing
     json_data['matching_video_url'] = f'{source_storage}{upload_container}/{datasource}/{source_folder}/{video_file_name}'
 
-    # Save data to storage
-    json_data_str = json.dumps(json_data, default=str)
+    # Save data to storage, values such as datetimes being written as str(value)
+    json_data_bytes = json_codec.dumps(json_data)
 
     try:
         # Write the parsed JSON
         dest_blob_uri = f'{dest_storage}{silver_container}/{unique_video_name}/parsed_{video_version}.json'
         blob_client = BlobClient.from_blob_url(dest_blob_uri, DefaultAzureCredential())
-        blob_client.upload_blob(json_data_str, overwrite=True)
+        blob_client.upload_blob(json_data_bytes, overwrite=True)
 
         logging.info(f"{LOG_PREFIX} wrote JSON file: {dest_blob_uri}")
 
         # Set the parser result as the queue message
-        msg.set(json_data_str)
+        msg.set(json_data_bytes.decode('utf-8'))
 
     except Exception:
         logging.exception(f"{LOG_PREFIX} file save failed for {video_file_name}")